@@ -1,16 +1,27 @@
 import os
 import io
+import sys
 import time
 import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
 from typing import List, Dict, Any, Tuple
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Shared PDF helpers live in python_app (mounted read-only at /brandchecker_app, see docker-compose.yml)
+for _shared_dir in (os.getenv("BRANDCHECKER_APP_DIR", "/brandchecker_app"),
+                    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python_app")):
+    if os.path.isdir(_shared_dir) and _shared_dir not in sys.path:
+        sys.path.append(_shared_dir)
+
 
 def render_page_to_image(pdf_path: str, page_index: int, zoom: float = 2.0) -> Tuple[Any, float]:
     import fitz
@@ -88,53 +99,70 @@ def label_quality(dpi_x: float, dpi_y: float) -> str:
     return "very_low"
 
 
+def _placement_key(width_px, height_px, width_pts: float, height_pts: float) -> Tuple:
+    return (int(width_px or 0), int(height_px or 0), round(width_pts), round(height_pts))
+
+
+def _content_stream_placements(pdf_path: str) -> Dict[int, List[Tuple]]:
+    """Placement keys per page index of every image the content streams paint (inline images and
+    images inside Form XObjects included)"""
+    import pikepdf
+    from pdf_content_stream import iter_image_placements
+    placements: Dict[int, List[Tuple]] = {}
+    with pikepdf.open(pdf_path) as pdf:
+        for page_index, page in enumerate(pdf.pages):
+            placements[page_index] = [
+                _placement_key(pl["width_px"], pl["height_px"], pl["width_pts"], pl["height_pts"])
+                for pl in iter_image_placements(page)]
+    return placements
+
+
 def detect_images_highlevel_with_dpi(pdf_path: str) -> List[Dict[str, Any]]:
-    """High-level PyMuPDF: match image XObjects (pixel dims) to placed image blocks (bbox) and compute DPI."""
+    """High-level PyMuPDF: image placements via get_image_info(xrefs=True) - xref, pixel dims and
+    transform per placement, without extracting any text - and compute DPI from the placed size.
+
+    get_image_info also reports shadings (sh operator) as images with xref 0; an xref-0 entry is only
+    kept when the content stream paints an image of the same pixel and placed size there (an inline
+    image or an image nested in a Form XObject)."""
     import fitz
     results: List[Dict[str, Any]] = []
+    stream_placements = None
     doc = fitz.open(pdf_path)
     try:
         for page_index in range(len(doc)):
             page = doc[page_index]
-            # Map of image xref -> (width_px, height_px)
-            xref_dims: Dict[int, Tuple[int, int]] = {}
-            for img in page.get_images(full=True):
-                try:
-                    xref = int(img[0])
-                    # width_px, height_px indexes: see PyMuPDF docs → (width, height) at positions 2,3
-                    wpx = int(img[2]); hpx = int(img[3])
-                    xref_dims[xref] = (wpx, hpx)
-                except Exception:
-                    continue
-
-            # Find placed image blocks with bbox
-            raw = page.get_text("rawdict")
-            for block in raw.get("blocks", []):
-                if block.get("type") != 1:
-                    continue
-                bbox = block.get("bbox", None)
-                if not (isinstance(bbox, list) and len(bbox) == 4):
+            for info in page.get_image_info(xrefs=True):
+                bbox = info.get("bbox")
+                if not (isinstance(bbox, (list, tuple)) and len(bbox) == 4):
                     continue
-                x1, y1, x2, y2 = bbox
-                width_pts = float(x2 - x1)
-                height_pts = float(y2 - y1)
-
-                # Heuristic: choose the largest xref on this page as candidate when unknown
-                # PyMuPDF rawdict does not expose xref per block reliably, so approximate
-                wpx = hpx = None
-                if xref_dims:
-                    # pick the pixel dims with closest aspect ratio
-                    aspect_block = width_pts / max(1e-6, height_pts)
-                    best = None; best_diff = 1e9
-                    for (pw, ph) in xref_dims.values():
-                        ar = pw / max(1e-6, ph)
-                        diff = abs(ar - aspect_block)
-                        if diff < best_diff:
-                            best = (pw, ph); best_diff = diff
-                    if best:
-                        wpx, hpx = best
-
-                # If we have pixel dims, compute DPI
+                if not info.get("xref"):
+                    if stream_placements is None:
+                        try:
+                            stream_placements = _content_stream_placements(pdf_path)
+                        except Exception as e:
+                            logger.warning(f"Content-stream placements unavailable, skipping xref-0 entries: {e}")
+                            stream_placements = {}
+                    transform = info.get("transform") or (0, 0, 0, 0)
+                    key = _placement_key(info.get("width"), info.get("height"),
+                                         (transform[0] ** 2 + transform[1] ** 2) ** 0.5,
+                                         (transform[2] ** 2 + transform[3] ** 2) ** 0.5)
+                    page_placements = stream_placements.get(page_index, [])
+                    if key not in page_placements:
+                        continue
+                    # every placement backs one entry only
+                    page_placements.remove(key)
+                x1, y1, x2, y2 = [float(v) for v in bbox]
+                width_pts = x2 - x1
+                height_pts = y2 - y1
+                # Placed size of the image unit square: exact for rotated/sheared placements too
+                transform = info.get("transform")
+                if transform and len(transform) == 6:
+                    a, b, c, d = [float(v) for v in transform[:4]]
+                    width_pts = (a * a + b * b) ** 0.5
+                    height_pts = (c * c + d * d) ** 0.5
+
+                wpx = int(info.get("width") or 0) or None
+                hpx = int(info.get("height") or 0) or None
                 dpi_x = dpi_y = None
                 quality = None
                 if wpx and hpx and width_pts > 0 and height_pts > 0:
@@ -152,7 +180,10 @@ def detect_images_highlevel_with_dpi(pdf_path: str) -> List[Dict[str, Any]]:
                     "dpi_x": round(dpi_x, 1) if dpi_x else None,
                     "dpi_y": round(dpi_y, 1) if dpi_y else None,
                     "quality": quality,
-                    "method": "highlevel-xobject+rawdict",
+                    # xref 0: image without its own object (inline image or nested resource)
+                    "xref": int(info.get("xref") or 0) or None,
+                    "transform": [round(float(v), 4) for v in transform] if transform else None,
+                    "method": "highlevel-imageinfo",
                     "coord_sys": "pdf_tl"
                 })
         return results
@@ -161,188 +192,388 @@ def detect_images_highlevel_with_dpi(pdf_path: str) -> List[Dict[str, Any]]:
 
 
 def detect_images_lowlevel_with_dpi(pdf_path: str) -> List[Dict[str, Any]]:
-    """Low-level pikepdf: enumerate /XObject /Image, parse content stream for placement matrix (Do + CTM)."""
+    """Low-level pikepdf: interpret content streams (q/Q stack, cm concatenation, Form XObjects) to place image XObjects."""
     import pikepdf
-    import re
+    from pdf_content_stream import iter_image_placements, placement_dpi
     results: List[Dict[str, Any]] = []
     try:
         with pikepdf.open(pdf_path) as pdf:
             for page_index, page in enumerate(pdf.pages, start=1):
-                resources = page.get("/Resources")
-                if resources is None:
-                    continue
-                xobjects = resources.get("/XObject")
-                if not isinstance(xobjects, pikepdf.Dictionary):
-                    # still try content stream for Do operators
-                    pass
-
-                # Extract content stream bytes
-                contents = page.get("/Contents")
-                if contents is None:
-                    continue
-                if isinstance(contents, pikepdf.Stream):
-                    streams = [contents]
-                elif isinstance(contents, pikepdf.Array):
-                    streams = [obj for obj in contents if isinstance(obj, pikepdf.Stream)]
-                else:
-                    streams = []
-
-                # Parse a very simplified graphics state: track CTM and image Do calls
-                # We assume placements like: q a b c d e f cm /ImX Do Q
-                # This is a heuristic and may miss complex cases, but often works.
-                content_bytes = b"".join(s.read_bytes() for s in streams)
-                text = content_bytes.decode('latin-1', errors='ignore')
-                tokens = text.replace('\n', ' ').split()
-                # current matrix a b c d e f
-                ctm = [1, 0, 0, 1, 0, 0]
-                i = 0
-                while i < len(tokens):
-                    tok = tokens[i]
-                    if tok == 'q':
-                        i += 1
-                        continue
-                    elif tok == 'Q':
-                        i += 1
-                        continue
-                    elif tok == 'cm' and i >= 6:
-                        try:
-                            a = float(tokens[i-6]); b = float(tokens[i-5]); c = float(tokens[i-4]); d = float(tokens[i-3]); e = float(tokens[i-2]); f = float(tokens[i-1])
-                            ctm = [a, b, c, d, e, f]
-                        except Exception:
-                            pass
-                        i += 1
-                        continue
-                    elif tok == 'Do' and i >= 1:
-                        name = tokens[i-1]
-                        if name.startswith('/'):
-                            # Try to fetch image XObject by name
-                            if isinstance(xobjects, pikepdf.Dictionary) and name in xobjects:
-                                xobj = xobjects[name]
-                                if isinstance(xobj, pikepdf.Stream):
-                                    sub = xobj.get('/Subtype')
-                                    if str(sub) == '/Image':
-                                        wpx = int(xobj.get('/Width', 0))
-                                        hpx = int(xobj.get('/Height', 0))
-                                        # placed size from CTM (|a d|)
-                                        width_pts = abs(ctm[0])
-                                        height_pts = abs(ctm[3])
-                                        dpi_x = (wpx * 72.0) / width_pts if width_pts > 0 else None
-                                        dpi_y = (hpx * 72.0) / height_pts if height_pts > 0 else None
-                                        quality = label_quality(dpi_x or 0, dpi_y or 0) if (dpi_x and dpi_y) else None
-                                        # bbox in page coords approx (translate e,f with size a,d)
-                                        x1 = float(ctm[4]); y1 = float(ctm[5])
-                                        x2 = x1 + width_pts; y2 = y1 + height_pts
-                                        results.append({
-                                            'page': page_index,
-                                            'bbox': [round(x1, 2), round(y1, 2), round(x2, 2), round(y2, 2)],
-                                            'width_pts': round(width_pts, 2),
-                                            'height_pts': round(height_pts, 2),
-                                            'width_px': wpx,
-                                            'height_px': hpx,
-                                            'dpi_x': round(dpi_x, 1) if dpi_x else None,
-                                            'dpi_y': round(dpi_y, 1) if dpi_y else None,
-                                            'quality': quality,
-                                            'method': 'lowlevel-xobject+ctm',
-                                            'coord_sys': 'pdf_bl'
-                                        })
-                        i += 1
-                        continue
-                    else:
-                        i += 1
-                # end token loop
+                for pl in iter_image_placements(page):
+                    dpi_x, dpi_y = placement_dpi(pl)
+                    quality = label_quality(dpi_x, dpi_y) if (dpi_x and dpi_y) else None
+                    # bbox of the placed unit square in PDF user space (origin bottom-left)
+                    x1, y1, x2, y2 = pl["bbox"]
+                    results.append({
+                        'page': page_index,
+                        'bbox': [round(x1, 2), round(y1, 2), round(x2, 2), round(y2, 2)],
+                        'width_pts': round(pl["width_pts"], 2),
+                        'height_pts': round(pl["height_pts"], 2),
+                        'width_px': pl["width_px"],
+                        'height_px': pl["height_px"],
+                        'dpi_x': round(dpi_x, 1) if dpi_x else None,
+                        'dpi_y': round(dpi_y, 1) if dpi_y else None,
+                        'quality': quality,
+                        'xref': pl["xref"],
+                        'matrix': [round(v, 4) for v in pl["matrix"]],
+                        'form_path': pl["form_path"],
+                        'inline': pl["inline"],
+                        'method': 'lowlevel-xobject+ctm',
+                        'coord_sys': 'pdf_bl'
+                    })
         return results
-    except Exception:
+    except Exception as e:
+        logger.warning(f"Low-level image detection failed: {e}")
         return []
+
+
+SEGMENTATION_TILE_OVERLAP_PX = 32
+
+
+def _low_edge_mask(small):
+    """Mask of low edge-density regions (photo-like blobs) of a downscaled BGR render."""
+    import numpy as np
+    import cv2
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    # edge map + blur
+    edges = cv2.Canny(gray, 50, 150)
+    edges = cv2.GaussianBlur(edges, (5, 5), 1.2)
+    # threshold on low edge density (photo regions are often low edge-density blobs)
+    _, low_edges = cv2.threshold(edges, 20, 255, cv2.THRESH_BINARY_INV)
+    # morphology open/close to unify regions
+    kernel = np.ones((5, 5), np.uint8)
+    mask = cv2.morphologyEx(low_edges, cv2.MORPH_OPEN, kernel, iterations=1)
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=2)
+
+
+def _segmentation_candidate(x: int, y: int, w: int, h: int, H: int, W: int) -> bool:
+    if w * h < (H * W * 0.02):  # skip tiny regions
+        return False
+    aspect = w / max(1, h)
+    return 0.5 <= aspect <= 10
+
+
+def _segmentation_detection(page_index: int, box: List[int], zoom: float, var: float) -> Dict[str, Any]:
+    x, y, w, h = box
+    # map back to PDF pt coordinates (reverse downscale and zoom)
+    sx1 = int(round(x / 0.5)); sy1 = int(round(y / 0.5))
+    sx2 = int(round((x + w) / 0.5)); sy2 = int(round((y + h) / 0.5))
+    px1 = round(sx1 / zoom, 2); py1 = round(sy1 / zoom, 2)
+    px2 = round(sx2 / zoom, 2); py2 = round(sy2 / zoom, 2)
+    return {
+        "page": page_index + 1,
+        "bbox": [px1, py1, px2, py2],
+        "method": "render-segmentation",
+        "coord_sys": "pdf_tl",
+        "color_variance": round(var, 1)
+    }
+
+
+def _segment_page_tiled(page, page_index: int, zoom: float) -> List[Dict[str, Any]]:
+    """Segmentation of a page too large to render at once.
+
+    Masks are computed per clip tile (with an overlap margin for the edge/morphology kernels),
+    region boxes are merged across tile seams and filtered on the merged extent; the colour
+    variance of surviving regions is accumulated over a second pass of tiles.
+    """
+    import numpy as np
+    import cv2
+    from tiled_render import iter_tiles, SeamMerger
+
+    def small_tiles():
+        # tiles are even-sized, so the 2x downscale maps seams to whole pixels
+        for tile in iter_tiles(page, zoom, overlap_px=SEGMENTATION_TILE_OVERLAP_PX, align=2):
+            bgr = cv2.cvtColor(np.ascontiguousarray(tile["array"]), cv2.COLOR_RGB2BGR)
+            small = cv2.resize(bgr, (0, 0), fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+            yield tile, small
+
+    merger = SeamMerger()
+    W = H = 0
+    for tile, small in small_tiles():
+        W, H = (tile["size"][0] + 1) // 2, (tile["size"][1] + 1) // 2
+        contours, _ = cv2.findContours(_low_edge_mask(small), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        merger.add(contours, small.shape, (tile["origin"][0] // 2, tile["origin"][1] // 2),
+                   tuple(v // 2 for v in tile["core"]))
+    boxes = [[x0, y0, x1 - x0, y1 - y0] for x0, y0, x1, y1 in merger.merged()]
+    boxes = [b for b in boxes if _segmentation_candidate(*b, H, W)]
+    if not boxes:
+        return []
+
+    # colour variance over each merged box; each tile contributes only its core so nothing is counted twice
+    stats = [[0.0, 0.0, 0] for _ in boxes]
+    for tile, small in small_tiles():
+        cx0, cy0, cx1, cy1 = [v // 2 for v in tile["core"]]
+        ox, oy = tile["origin"][0] // 2, tile["origin"][1] // 2
+        for box, acc in zip(boxes, stats):
+            x, y, w, h = box
+            ix0, iy0 = max(x, cx0), max(y, cy0)
+            ix1, iy1 = min(x + w, cx1), min(y + h, cy1)
+            if ix0 >= ix1 or iy0 >= iy1:
+                continue
+            part = small[iy0 - oy:iy1 - oy, ix0 - ox:ix1 - ox].astype(np.float64)
+            acc[0] += float(part.sum()); acc[1] += float(np.square(part).sum()); acc[2] += part.size
+
+    dets = []
+    for box, (total, total_sq, count) in zip(boxes, stats):
+        if not count:
+            continue
+        mean = total / count
+        var = total_sq / count - mean * mean
+        if var < 200:  # too flat, likely background
+            continue
+        dets.append(_segmentation_detection(page_index, box, zoom, var))
+    return dets
+
+
 def detect_images_by_render_segmentation(pdf_path: str, zoom: float = 2.0) -> List[Dict[str, Any]]:
     """Render pages and segment large photo-like regions using edge density + color variance heuristics."""
     import numpy as np
     import cv2
     import fitz
+    from tiled_render import fits_budget
     dets: List[Dict[str, Any]] = []
     doc = fitz.open(pdf_path)
     try:
         for page_index in range(len(doc)):
             page = doc[page_index]
+            if not fits_budget(page, zoom):
+                dets.extend(_segment_page_tiled(page, page_index, zoom))
+                continue
             mat = fitz.Matrix(zoom, zoom)
             pix = page.get_pixmap(matrix=mat)
             np_img = cv2.cvtColor(np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)[:, :, :3], cv2.COLOR_RGB2BGR)
 
             # downscale for speed
             small = cv2.resize(np_img, (0, 0), fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
-            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
-            # edge map + blur
-            edges = cv2.Canny(gray, 50, 150)
-            edges = cv2.GaussianBlur(edges, (5, 5), 1.2)
-            # threshold on low edge density (photo regions are often low edge-density blobs)
-            _, low_edges = cv2.threshold(edges, 20, 255, cv2.THRESH_BINARY_INV)
-            # morphology open/close to unify regions
-            kernel = np.ones((5, 5), np.uint8)
-            mask = cv2.morphologyEx(low_edges, cv2.MORPH_OPEN, kernel, iterations=1)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel, iterations=2)
             # find contours of low-edge regions
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            contours, _ = cv2.findContours(_low_edge_mask(small), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             H, W = small.shape[:2]
             for cnt in contours:
                 x, y, w, h = cv2.boundingRect(cnt)
-                area = w * h
-                if area < (H * W * 0.02):  # skip tiny regions
-                    continue
-                aspect = w / max(1, h)
-                if aspect < 0.5 or aspect > 10:
+                if not _segmentation_candidate(x, y, w, h, H, W):
                     continue
                 # compute color variance to avoid flat backgrounds
                 roi = small[y:y+h, x:x+w]
                 var = float(np.var(roi))
                 if var < 200:  # too flat, likely background
                     continue
-                # map back to PDF pt coordinates (reverse downscale and zoom)
-                sx1 = int(round(x / 0.5)); sy1 = int(round(y / 0.5))
-                sx2 = int(round((x + w) / 0.5)); sy2 = int(round((y + h) / 0.5))
-                px1 = round(sx1 / zoom, 2); py1 = round(sy1 / zoom, 2)
-                px2 = round(sx2 / zoom, 2); py2 = round(sy2 / zoom, 2)
-                dets.append({
-                    "page": page_index + 1,
-                    "bbox": [px1, py1, px2, py2],
-                    "method": "render-segmentation",
-                    "coord_sys": "pdf_tl",
-                    "color_variance": round(var, 1)
-                })
+                dets.append(_segmentation_detection(page_index, [x, y, w, h], zoom, var))
     finally:
         doc.close()
     return dets
 
+# ==== Concurrent detector fan-out ====
+
+DETECTOR_ORDER = ["highlevel", "lowlevel", "segmentation"]
+DEFAULT_DETECTOR_BUDGET_S = float(os.getenv("DETECTOR_BUDGET_S", "60"))
+DETECTOR_THREADS = int(os.getenv("DETECTOR_THREADS", "4"))
+
+_thread_pool = None
+_process_pool = None
+_pool_lock = threading.Lock()
+# thread detectors past their budget that are still running (threads cannot be stopped)
+_overrunning_threads = 0
+
+
+def _get_pools() -> Tuple[ThreadPoolExecutor, ProcessPoolExecutor]:
+    """Lazily create the shared pools: threads for PyMuPDF/pikepdf parsing, a process for OpenCV segmentation."""
+    global _thread_pool, _process_pool
+    with _pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=DETECTOR_THREADS, thread_name_prefix="detector")
+        if _process_pool is None:
+            # spawn: never fork a process that holds MuPDF/OpenCV state from other threads
+            _process_pool = ProcessPoolExecutor(max_workers=int(os.getenv("SEGMENTATION_PROCESSES", "2")),
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return _thread_pool, _process_pool
+
+
+def _reset_process_pool(pool: ProcessPoolExecutor = None, kill: bool = False) -> None:
+    """Drop the process pool; the next request creates a fresh one.
+
+    For a broken pool (e.g. a worker was OOM-killed) shutting it down is enough. kill=True also
+    terminates its workers, which is the only way to stop a runaway segmentation; segmentations
+    of other requests on that pool then fail with BrokenProcessPool. With `pool`, nothing happens
+    if that pool was already replaced.
+    """
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None or (pool is not None and pool is not _process_pool):
+            return
+        if kill:
+            for process in list((_process_pool._processes or {}).values()):
+                process.terminate()
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _submit_segmentation(pdf_path: str, zoom: float):
+    """Submit a segmentation; returns (pool, future)."""
+    pool = _get_pools()[1]
+    try:
+        return pool, pool.submit(_timed, detect_images_by_render_segmentation, pdf_path, zoom)
+    except BrokenProcessPool:
+        _reset_process_pool(pool)
+        pool = _get_pools()[1]
+        return pool, pool.submit(_timed, detect_images_by_render_segmentation, pdf_path, zoom)
+
+
+def _thread_overrun_done(_future) -> None:
+    global _overrunning_threads
+    with _pool_lock:
+        _overrunning_threads -= 1
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, (time.perf_counter() - t0) * 1000.0
+
+
+def run_detectors(pdf_path: str, zoom: float = 2.0, detectors: List[str] = None,
+                  budgets: Dict[str, float] = None) -> Dict[str, Dict[str, Any]]:
+    """Run the detectors concurrently; each gets its own time budget (seconds) measured from submission.
+
+    Returns {name: {"status": "ok"|"timeout"|"error", "images": [...], "elapsed_ms", "error"?}}.
+    Detectors still running at their deadline are reported as "timeout" and their results dropped.
+    A segmentation past its budget is killed by recycling the process pool. Thread detectors
+    cannot be stopped: they keep their pool thread until they finish, and while overrunning
+    ones occupy all DETECTOR_THREADS threads, new thread detectors are reported as "error"
+    right away instead of queueing behind them.
+    """
+    global _overrunning_threads
+    detectors = [d for d in (detectors or DETECTOR_ORDER) if d in DETECTOR_ORDER]
+    budgets = budgets or {}
+    threads = _get_pools()[0]
+    start = time.perf_counter()
+    futures = {}
+    results: Dict[str, Dict[str, Any]] = {}
+    segmentation_pool = None
+    for name in detectors:
+        if name in ("highlevel", "lowlevel"):
+            with _pool_lock:
+                busy = _overrunning_threads >= DETECTOR_THREADS
+            if busy:
+                results[name] = {"status": "error", "images": [], "elapsed_ms": 0.0,
+                                 "error": "all detector threads are busy with overrunning detectors"}
+                logger.warning(f"Detector {name} skipped: all detector threads are overrunning")
+                continue
+            detect = detect_images_highlevel_with_dpi if name == "highlevel" else detect_images_lowlevel_with_dpi
+            futures[name] = threads.submit(_timed, detect, pdf_path)
+        elif name == "segmentation":
+            segmentation_pool, futures[name] = _submit_segmentation(pdf_path, zoom)
+
+    for name, fut in futures.items():
+        budget = float(budgets.get(name, DEFAULT_DETECTOR_BUDGET_S))
+        remaining = max(0.0, start + budget - time.perf_counter())
+        try:
+            images, elapsed_ms = fut.result(timeout=remaining)
+            results[name] = {"status": "ok", "images": images, "elapsed_ms": round(elapsed_ms, 1)}
+        except FutureTimeout:
+            if not fut.cancel():
+                if name == "segmentation":
+                    _reset_process_pool(segmentation_pool, kill=True)
+                else:
+                    with _pool_lock:
+                        _overrunning_threads += 1
+                    fut.add_done_callback(_thread_overrun_done)
+            results[name] = {"status": "timeout", "images": [], "budget_s": budget,
+                             "elapsed_ms": round((time.perf_counter() - start) * 1000.0, 1)}
+            logger.warning(f"Detector {name} exceeded its {budget}s budget")
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                _reset_process_pool(segmentation_pool)
+            results[name] = {"status": "error", "images": [], "error": str(e),
+                             "elapsed_ms": round((time.perf_counter() - start) * 1000.0, 1)}
+            logger.warning(f"Detector {name} failed: {e}")
+    return results
+
+
+def _upright(m) -> bool:
+    return bool(m) and len(m) == 6 and abs(m[1]) < 1e-6 and abs(m[2]) < 1e-6 and m[0] > 0 and m[3] > 0
+
+
+def embedded_image_bytes(doc, page, det: Dict[str, Any]):
+    """Encoded bytes of the image stream behind a detection, or None when a crop has to be rendered.
+
+    Only upright, unmirrored placements on unrotated pages qualify, so the stream pixels look
+    exactly like the placed image. JPEG/PNG/JPX streams without soft mask are returned as stored;
+    CMYK, soft-masked and other encodings are converted to PNG at native resolution.
+    """
+    import fitz  # PyMuPDF
+    xref = det.get("xref")
+    if not xref or page.rotation or not _upright(det.get("transform") or det.get("matrix")):
+        return None
+    info = doc.extract_image(int(xref))
+    if not info or not info.get("image"):
+        return None
+    smask = info.get("smask") or 0
+    if not smask and info.get("ext") in ("jpeg", "png", "jpx") and info.get("colorspace") in (1, 3):
+        return info["image"], ("jpg" if info["ext"] == "jpeg" else info["ext"])
+    pix = fitz.Pixmap(doc, int(xref))
+    if pix.colorspace is None:
+        # stencil masks only make sense painted in their fill colour
+        return None
+    if pix.colorspace.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    if smask:
+        pix = fitz.Pixmap(pix, fitz.Pixmap(doc, smask))
+    return pix.tobytes("png"), "png"
+
+
 def save_image_crops(pdf_path: str, detections: List[Dict[str, Any]], zoom: float = 2.0, save_dir: str = "/shared/images") -> List[Dict[str, Any]]:
-    """Render precise crops using PyMuPDF clip rectangles (in pt) to avoid pixel rounding errors."""
+    """Store crops in the content-addressed crop store.
+
+    Detections backed by an image XObject are cut from the embedded stream at native resolution;
+    everything else is rendered with a PyMuPDF clip rectangle (in pt) to avoid pixel rounding errors.
+    """
     import fitz  # PyMuPDF
-    os.makedirs(save_dir, exist_ok=True)
+    from crop_store import store_bytes
 
     out: List[Dict[str, Any]] = []
+    stream_crops: Dict[int, Tuple[bytes, str]] = {}
     doc = fitz.open(pdf_path)
     try:
         for det in detections:
             try:
                 page_num = int(det["page"]) - 1
-                x1, y1, x2, y2 = [float(v) for v in det["bbox"]]
-                # Normalize bbox to PyMuPDF coordinate system (origin top-left)
-                # If detection coord_sys is pdf_bl (origin bottom-left), convert Y using page height
                 page = doc[page_num]
-                page_height = float(page.rect.height)
-                coord_sys = det.get("coord_sys", "pdf_tl")
-                if coord_sys == "pdf_bl":
-                    # convert bottom-left to top-left: y' = page_height - y
-                    y1_conv = page_height - y2
-                    y2_conv = page_height - y1
-                    y1, y2 = y1_conv, y2_conv
-                # Clip rect in page points (top-left coords)
-                rect = fitz.Rect(x1, y1, x2, y2)
-                mat = fitz.Matrix(zoom, zoom)
-                pix = page.get_pixmap(matrix=mat, clip=rect)
-                fname = f"image_{int(time.time())}_{page_num+1}.png"
-                fpath = os.path.join(save_dir, fname)
-                pix.save(fpath)
+                encoded = None
+                try:
+                    xref = det.get("xref")
+                    if xref in stream_crops:
+                        encoded = stream_crops[xref]
+                    else:
+                        encoded = embedded_image_bytes(doc, page, det)
+                        if encoded is not None:
+                            stream_crops[xref] = encoded
+                except Exception as e:
+                    logger.debug(f"Embedded image {det.get('xref')} not usable, rendering instead: {e}")
+                if encoded is not None:
+                    source = "embedded"
+                else:
+                    x1, y1, x2, y2 = [float(v) for v in det["bbox"]]
+                    # Normalize bbox to PyMuPDF coordinate system (origin top-left)
+                    # If detection coord_sys is pdf_bl (origin bottom-left), convert Y using page height
+                    page_height = float(page.rect.height)
+                    coord_sys = det.get("coord_sys", "pdf_tl")
+                    if coord_sys == "pdf_bl":
+                        # convert bottom-left to top-left: y' = page_height - y
+                        y1_conv = page_height - y2
+                        y2_conv = page_height - y1
+                        y1, y2 = y1_conv, y2_conv
+                    # Clip rect in page points (top-left coords)
+                    rect = fitz.Rect(x1, y1, x2, y2)
+                    mat = fitz.Matrix(zoom, zoom)
+                    pix = page.get_pixmap(matrix=mat, clip=rect)
+                    encoded = (pix.tobytes("png"), "png")
+                    source = "rendered"
+                stored = store_bytes(save_dir, encoded[0], ext=encoded[1])
                 det_copy = {**det}
-                det_copy["image_path"] = fpath
-                det_copy["image_url_path"] = f"/files/{fname}"
+                det_copy["image_path"] = stored["path"]
+                det_copy["image_url_path"] = f"/files/{stored['name']}"
+                det_copy["image_sha256"] = stored["sha256"]
+                det_copy["crop_source"] = source
                 out.append(det_copy)
             except Exception as e:
                 logger.warning(f"Crop save failed: {e}")
@@ -370,15 +601,20 @@ def images_from_path():
         if not pdf_path.lower().endswith(".pdf"):
             return jsonify({"success": False, "error": "File must be a PDF"}), 400
 
-        # Strategy: High-level first (with DPI), then low-level CTM parsing, then render segmentation fallback
-        hl = detect_images_highlevel_with_dpi(pdf_path)
-        detections = hl
-        if not detections:
-            ll = detect_images_lowlevel_with_dpi(pdf_path)
-            detections = ll
-        if not detections:
-            seg = detect_images_by_render_segmentation(pdf_path, zoom=zoom)
-            detections = seg
+        # All detectors run concurrently under per-detector budgets; the result keeps the old priority:
+        # high-level (with DPI), then low-level CTM parsing, then render segmentation
+        budgets = data.get("detector_budgets_s") or {}
+        if data.get("detector_budget_s") is not None:
+            budgets = {**{name: float(data["detector_budget_s"]) for name in DETECTOR_ORDER}, **budgets}
+        runs = run_detectors(pdf_path, zoom=zoom, detectors=data.get("detectors"), budgets=budgets)
+        detections = []
+        for name in DETECTOR_ORDER:
+            if name in runs and runs[name]["images"]:
+                detections = runs[name]["images"]
+                break
+        detector_status = {name: {**{k: v for k, v in run.items() if k != "images"}, "count": len(run["images"])}
+                           for name, run in runs.items()}
+        partial = any(run["status"] != "ok" for run in runs.values())
 
         # Build det summary for response consistency
         per_page_counts: Dict[int, int] = {}
@@ -406,6 +642,8 @@ def images_from_path():
             "total_images": det.get("total_images", 0),
             "per_page_counts": det.get("per_page_counts", {}),
             "embedded_counts": det.get("embedded_counts", []),
+            "detectors": detector_status,
+            "partial": partial,
             "images": detections
         })
 
@@ -416,8 +654,9 @@ def images_from_path():
 
 @app.route('/files/<path:filename>', methods=['GET'])
 def serve_saved_file(filename):
+    from crop_store import send_stored_file
     directory = os.getenv("IMAGES_SAVE_DIR", "/shared/images")
-    return send_from_directory(directory, filename)
+    return send_stored_file(directory, filename)
 
 
 if __name__ == "__main__":
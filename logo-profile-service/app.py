@@ -1,16 +1,23 @@
 import os
 import io
+import sys
 import json
 import logging
 from typing import List, Dict, Any, Tuple
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Shared helpers live in python_app (mounted read-only at /brandchecker_app, see docker-compose.yml)
+for _shared_dir in (os.getenv("BRANDCHECKER_APP_DIR", "/brandchecker_app"),
+                    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python_app")):
+    if os.path.isdir(_shared_dir) and _shared_dir not in sys.path:
+        sys.path.append(_shared_dir)
+
 
 def _extract_page_image(pdf_path: str, page_index: int = 0, zoom: float = 2.0) -> Tuple[Any, Tuple[int, int]]:
     import fitz
@@ -36,15 +43,26 @@ def _detect_top_right_bosch_logo(np_img) -> List[Dict[str, Any]]:
     Returns list of candidate bboxes in page coordinates of the cropped region mapped back.
     """
     import cv2
-    import numpy as np
 
     h, w, _ = np_img.shape
+    crop_w, crop_h, x0, y0 = _top_right_roi(w, h)
+    roi = np_img[y0:y0+crop_h, x0:x0+crop_w]
+
+    # Find contours of red blobs
+    contours, _ = cv2.findContours(_red_mask(roi), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return _red_candidates([cv2.boundingRect(cnt) for cnt in contours], crop_w, crop_h, x0, y0)
+
+
+def _top_right_roi(w: int, h: int) -> Tuple[int, int, int, int]:
+    """Top-right 35% width x 25% height search region: (crop_w, crop_h, x0, y0) in px."""
     crop_w = int(w * 0.35)
     crop_h = int(h * 0.25)
-    x0 = w - crop_w
-    y0 = 0
-    roi = np_img[y0:y0+crop_h, x0:x0+crop_w]
+    return crop_w, crop_h, w - crop_w, 0
 
+
+def _red_mask(roi):
+    import cv2
+    import numpy as np
     # Convert to HSV for robust red mask
     hsv = cv2.cvtColor(roi, cv2.COLOR_RGB2HSV)
     # red has two ranges in HSV
@@ -57,13 +75,13 @@ def _detect_top_right_bosch_logo(np_img) -> List[Dict[str, Any]]:
     # Morphology to clean
     kernel = np.ones((3, 3), np.uint8)
     red_mask = cv2.morphologyEx(red_mask, cv2.MORPH_OPEN, kernel, iterations=1)
-    red_mask = cv2.morphologyEx(red_mask, cv2.MORPH_CLOSE, kernel, iterations=2)
+    return cv2.morphologyEx(red_mask, cv2.MORPH_CLOSE, kernel, iterations=2)
 
-    # Find contours of red blobs
-    contours, _ = cv2.findContours(red_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+def _red_candidates(blobs: List[Tuple[int, int, int, int]], crop_w: int, crop_h: int, x0: int, y0: int) -> List[Dict[str, Any]]:
+    """Filter, pad and merge red blob boxes (x, y, w, h in ROI px) into page-px detections."""
     candidates = []
-    for cnt in contours:
-        x, y, cw, ch = cv2.boundingRect(cnt)
+    for x, y, cw, ch in blobs:
         area = cw * ch
         if area < 200:  # filter noise
             continue
@@ -117,26 +135,30 @@ def _detect_top_right_bosch_logo(np_img) -> List[Dict[str, Any]]:
 def _detect_monochrome_logo(np_img) -> List[Dict[str, Any]]:
     """Detect dark monochrome logo marks in the same top-right ROI by edge/shape cues."""
     import cv2
-    import numpy as np
     h, w, _ = np_img.shape
-    crop_w = int(w * 0.35)
-    crop_h = int(h * 0.25)
-    x0 = w - crop_w
-    y0 = 0
+    crop_w, crop_h, x0, y0 = _top_right_roi(w, h)
     roi = np_img[y0:y0+crop_h, x0:x0+crop_w]
 
+    contours, _ = cv2.findContours(_dark_mask(roi), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return _mono_candidates([cv2.boundingRect(cnt) for cnt in contours], x0, y0)
+
+
+def _dark_mask(roi):
+    import cv2
+    import numpy as np
     gray = cv2.cvtColor(roi, cv2.COLOR_RGB2GRAY)
     # adaptive threshold to catch dark elements
     thr = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
                                 cv2.THRESH_BINARY_INV, 31, 10)
     kernel = np.ones((3, 3), np.uint8)
     thr = cv2.morphologyEx(thr, cv2.MORPH_OPEN, kernel, iterations=1)
-    thr = cv2.morphologyEx(thr, cv2.MORPH_CLOSE, kernel, iterations=1)
+    return cv2.morphologyEx(thr, cv2.MORPH_CLOSE, kernel, iterations=1)
 
-    contours, _ = cv2.findContours(thr, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+def _mono_candidates(blobs: List[Tuple[int, int, int, int]], x0: int, y0: int) -> List[Dict[str, Any]]:
+    """Filter dark blob boxes (x, y, w, h in ROI px) into page-px detections."""
     results = []
-    for cnt in contours:
-        x, y, cw, ch = cv2.boundingRect(cnt)
+    for x, y, cw, ch in blobs:
         area = cw * ch
         if area < 250:
             continue
@@ -152,14 +174,16 @@ def _detect_monochrome_logo(np_img) -> List[Dict[str, Any]]:
     return results
 
 
-def _ocr_check_bosch(np_img, bbox: List[float]) -> float:
-    """OCR on bbox region; return confidence boost if 'BOSCH' found."""
-    import pytesseract
-    from PIL import Image
-    import numpy as np
+def _crop_px(np_img, bbox: List[float]):
     x1, y1, x2, y2 = [int(round(v)) for v in bbox]
     x1 = max(0, x1); y1 = max(0, y1); x2 = max(x1+1, x2); y2 = max(y1+1, y2)
-    crop = np_img[y1:y2, x1:x2]
+    return np_img[y1:y2, x1:x2]
+
+
+def _ocr_check_bosch(crop) -> float:
+    """OCR on a bbox crop; return confidence boost if 'BOSCH' found."""
+    import pytesseract
+    from PIL import Image
     if crop.size == 0:
         return 0.0
     pil = Image.fromarray(crop)
@@ -186,15 +210,15 @@ def _union_bbox(boxes: List[List[float]]) -> List[float]:
 
 def _detect_circular_mark(np_img) -> List[Dict[str, Any]]:
     """Detect circular mark (gear/icon) in top-right ROI using HoughCircles and contour circularity."""
-    import cv2
-    import numpy as np
     h, w, _ = np_img.shape
-    crop_w = int(w * 0.35)
-    crop_h = int(h * 0.25)
-    x0 = w - crop_w
-    y0 = 0
-    roi = np_img[y0:y0+crop_h, x0:x0+crop_w]
+    crop_w, crop_h, x0, y0 = _top_right_roi(w, h)
+    return _circle_candidates(np_img[y0:y0+crop_h, x0:x0+crop_w], x0, y0)
+
 
+def _circle_candidates(roi, x0: int, y0: int) -> List[Dict[str, Any]]:
+    import cv2
+    import numpy as np
+    crop_h, crop_w = roi.shape[:2]
     gray = cv2.cvtColor(roi, cv2.COLOR_RGB2GRAY)
     gray = cv2.GaussianBlur(gray, (5, 5), 1.2)
     circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1.2, minDist=15,
@@ -259,6 +283,79 @@ def _detect_circular_mark(np_img) -> List[Dict[str, Any]]:
         if not exists:
             dedup.append(r)
     return dedup
+
+
+LOGO_TILE_OVERLAP_PX = 32
+
+
+def _page_fits_budget(pdf_path: str, zoom: float, page_index: int = 0) -> bool:
+    import fitz
+    from tiled_render import fits_budget
+    doc = fitz.open(pdf_path)
+    try:
+        return fits_budget(doc[page_index], zoom)
+    finally:
+        doc.close()
+
+
+def _detect_logo_candidates_tiled(pdf_path: str, zoom: float, page_index: int = 0):
+    """Red, mono and circle detections for a page too large to render at once.
+
+    Only the top-right ROI is rendered, in clip tiles: red and dark masks run per tile and
+    their blobs are merged across tile seams before filtering, so results match a full
+    render. The circle search needs the ROI in one piece and runs on an ROI render scaled
+    down to the memory budget. Returns (red, mono, circle, (page_w_px, page_h_px)).
+    """
+    import cv2
+    import fitz
+    import numpy as np
+    from tiled_render import iter_tiles, render_clip, render_size, zoom_within_budget, SeamMerger
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc[page_index]
+        w, h = render_size(page.rect, zoom)
+        crop_w, crop_h, x0, y0 = _top_right_roi(w, h)
+        clip = fitz.Rect(page.rect.x0 + x0 / zoom, page.rect.y0 + y0 / zoom,
+                         page.rect.x0 + (x0 + crop_w) / zoom, page.rect.y0 + (y0 + crop_h) / zoom)
+
+        red, dark = SeamMerger(), SeamMerger()
+        for tile in iter_tiles(page, zoom, clip=clip, overlap_px=LOGO_TILE_OVERLAP_PX):
+            roi = np.ascontiguousarray(tile["array"])
+            for merger, mask in ((red, _red_mask(roi)), (dark, _dark_mask(roi))):
+                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                merger.add(contours, mask.shape, tile["origin"], tile["core"])
+        red_detections = _red_candidates([(bx0, by0, bx1 - bx0, by1 - by0) for bx0, by0, bx1, by1 in red.merged()],
+                                         crop_w, crop_h, x0, y0)
+        mono_detections = _mono_candidates([(bx0, by0, bx1 - bx0, by1 - by0) for bx0, by0, bx1, by1 in dark.merged()],
+                                           x0, y0)
+
+        circle_zoom = zoom_within_budget(page, zoom, clip=clip)
+        circle_detections = _circle_candidates(np.ascontiguousarray(render_clip(page, circle_zoom, clip)), 0, 0)
+        scale = zoom / circle_zoom
+        for d in circle_detections:
+            bx1, by1, bx2, by2 = d["bbox"]
+            d["bbox"] = [round(x0 + bx1 * scale, 2), round(y0 + by1 * scale, 2),
+                         round(x0 + bx2 * scale, 2), round(y0 + by2 * scale, 2)]
+        return red_detections, mono_detections, circle_detections, (w, h)
+    finally:
+        doc.close()
+
+
+def _render_px_box(pdf_path: str, zoom: float, bbox: List[float], page_index: int = 0):
+    """Render a box given in page px at zoom as a clip, scaled down if the box alone exceeds the memory budget."""
+    import fitz
+    from tiled_render import render_clip, zoom_within_budget
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc[page_index]
+        x1, y1, x2, y2 = [float(v) for v in bbox]
+        clip = fitz.Rect(page.rect.x0 + x1 / zoom, page.rect.y0 + y1 / zoom,
+                         page.rect.x0 + max(x2, x1 + 1) / zoom, page.rect.y0 + max(y2, y1 + 1) / zoom)
+        return render_clip(page, zoom_within_budget(page, zoom, clip=clip), clip)
+    finally:
+        doc.close()
+
+
 def _select_single_logo(dets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Select a single best logo per page. Strategy:
     - Prefer detections with brand == BOSCH and highest confidence
@@ -315,16 +412,29 @@ def logos_from_path():
         results: Dict[str, Any] = {"success": True, "filepath": pdf_path, "logos": []}
 
         # New approach: purely heuristic, no legacy dependencies
-        np_img, _ = _extract_page_image(pdf_path, page_index=0, zoom=float(data.get("zoom", 2.0)))
-        red_detections = _detect_top_right_bosch_logo(np_img)
-        mono_detections = _detect_monochrome_logo(np_img)
-        circle_detections = _detect_circular_mark(np_img)
+        zoom = float(data.get("zoom", 2.0))
+        if _page_fits_budget(pdf_path, zoom):
+            np_img, _ = _extract_page_image(pdf_path, page_index=0, zoom=zoom)
+            red_detections = _detect_top_right_bosch_logo(np_img)
+            mono_detections = _detect_monochrome_logo(np_img)
+            circle_detections = _detect_circular_mark(np_img)
+            ph, pw = np_img.shape[:2]
+
+            def crop_region(bbox):
+                return _crop_px(np_img, bbox)
+        else:
+            # Poster-size page: never hold the full render, work on clip tiles and clip crops
+            red_detections, mono_detections, circle_detections, (pw, ph) = _detect_logo_candidates_tiled(pdf_path, zoom)
+            results["tiled"] = True
+
+            def crop_region(bbox):
+                return _render_px_box(pdf_path, zoom, bbox)
 
         # Merge and apply OCR check
         merged = red_detections + mono_detections + circle_detections
         for d in merged:
             try:
-                boost = _ocr_check_bosch(np_img, d["bbox"])
+                boost = _ocr_check_bosch(crop_region(d["bbox"]))
                 d["confidence"] = round(min(1.0, d.get("confidence", 0.5) + boost), 2)
                 if boost > 0 and not d.get("brand"):
                     d["brand"] = "BOSCH"
@@ -363,7 +473,6 @@ def logos_from_path():
             px2 = x2 + bw * pad_other
             py2 = y2 + bh * pad_other
             # clip to image bounds
-            ph, pw = np_img.shape[:2]
             px1 = max(0.0, px1); py1 = max(0.0, py1)
             px2 = min(float(pw - 1), px2); py2 = min(float(ph - 1), py2)
             single[0]['bbox_padded'] = [round(px1, 2), round(py1, 2), round(px2, 2), round(py2, 2)]
@@ -373,26 +482,21 @@ def logos_from_path():
             # Save under configurable dir, defaulting to /shared/logos
             save_dir = os.getenv("LOGO_SAVE_DIR", "/shared/logos")
             try:
-                # Ensure path exists
-                os.makedirs(save_dir, exist_ok=True)
-                # Save crop image
+                # Save crop image into the content-addressed crop store
                 from PIL import Image
-                import numpy as np
+                from crop_store import store_bytes
                 # Prefer padded bbox if present
                 crop_box = single[0].get("bbox_padded", single[0]["bbox"])
-                x1, y1, x2, y2 = [int(round(v)) for v in crop_box]
-                x1 = max(0, x1); y1 = max(0, y1)
-                x2 = max(x1 + 1, x2); y2 = max(y1 + 1, y2)
-                crop = np_img[y1:y2, x1:x2]
-                import time
-                filename = f"logo_{int(time.time())}.png"
-                file_path = os.path.join(save_dir, filename)
-                Image.fromarray(crop).save(file_path, format='PNG')
+                crop = crop_region(crop_box)
+                buf = io.BytesIO()
+                Image.fromarray(crop).save(buf, format='PNG')
+                stored = store_bytes(save_dir, buf.getvalue(), ext="png")
 
                 # Build URL
-                url_path = f"/files/{filename}"
+                url_path = f"/files/{stored['name']}"
                 base = request.host_url[:-1] if request.host_url.endswith('/') else request.host_url
-                single[0]["image_path"] = file_path
+                single[0]["image_path"] = stored["path"]
+                single[0]["image_sha256"] = stored["sha256"]
                 single[0]["image_url"] = f"{base}{url_path}"
                 single[0]["image_url_path"] = url_path
             except Exception as e:
@@ -417,7 +521,8 @@ if __name__ == "__main__":
 @app.route('/files/<path:filename>', methods=['GET'])
 def serve_saved_file(filename):
     """Serve saved logo crops from the LOGO_SAVE_DIR."""
+    from crop_store import send_stored_file
     directory = os.getenv("LOGO_SAVE_DIR", "/shared/logos")
-    return send_from_directory(directory, filename)
+    return send_stored_file(directory, filename)
 
 
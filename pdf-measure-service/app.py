@@ -1,6 +1,11 @@
 import os
+import sys
 import json
+import math
+import time
 import logging
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any
 
 from flask import Flask, request, jsonify, send_from_directory
@@ -10,6 +15,12 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Shared PDF helpers live in python_app (mounted read-only at /brandchecker_app, see docker-compose.yml)
+for _shared_dir in (os.getenv("BRANDCHECKER_APP_DIR", "/brandchecker_app"),
+                    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python_app")):
+    if os.path.isdir(_shared_dir) and _shared_dir not in sys.path:
+        sys.path.append(_shared_dir)
+
 
 # ==== Minimal pdfmeasure implementation (modular) ====
 
@@ -45,7 +56,52 @@ def _get_image_px(doc, xref: int):
     except Exception:
         return [None, None]
 
-def extract_images(page, ctx):
+def read_image_placements(pdf, page_no: int):
+    """Exact image placements (CTM incl. Form XObjects) from the shared content-stream interpreter."""
+    if pdf is None:
+        return None
+    try:
+        from pdf_content_stream import iter_image_placements
+        return list(iter_image_placements(pdf.pages[page_no - 1]))
+    except Exception as e:
+        logger.warning(f"Content-stream image placement failed on page {page_no}: {e}")
+        return None
+
+def _open_placement_source(doc_path: str):
+    try:
+        import pikepdf
+        import pdf_content_stream  # noqa: F401
+    except ImportError:
+        return None
+    try:
+        return pikepdf.open(doc_path)
+    except Exception as e:
+        logger.warning(f"pikepdf could not open {doc_path}: {e}")
+        return None
+
+def _images_from_placements(page, placements):
+    import fitz
+    # placements are in PDF user space; map to PyMuPDF's (unrotated, top-left) page space
+    tm = page.transformation_matrix
+    items = []
+    for pl in placements:
+        r = fitz.Rect(pl["bbox"]) * tm
+        items.append({
+            "type": "image",
+            "bbox_pt": [float(r.x0), float(r.y0), float(r.x1), float(r.y1)],
+            "matrix": pl["matrix"],
+            "properties": {
+                "image_xref": pl["xref"],
+                "image_pixel_size": [pl["width_px"], pl["height_px"]],
+                "inline": pl["inline"],
+                "form_path": pl["form_path"],
+            }
+        })
+    return items
+
+def extract_images(page, ctx, placements=None):
+    if placements is not None:
+        return _images_from_placements(page, placements)
     items = []
     doc = page.parent
     for entry in page.get_images(full=True):
@@ -156,10 +212,13 @@ def _normalize_rotation(bbox, w, h, rot):
         return [h - y1, x0, h - y0, x1]
     return [x0, y0, x1, y1]
 
+def item_id(page_no: int, index: int) -> str:
+    # Deterministic id derived from (page, index) so re-runs produce identical outputs
+    return f"p{page_no:04d}-{index:06d}"
+
 def finalize_items(doc_path: str, page_no: int, ctx: Dict[str, Any], items: List[Dict[str, Any]]):
-    import uuid
     out = []
-    for it in items:
+    for idx, it in enumerate(items):
         bbox_pt = _normalize_rotation(it["bbox_pt"], ctx["media_w"], ctx["media_h"], ctx["rotate"])
         out.append({
             "doc_path": doc_path,
@@ -167,7 +226,7 @@ def finalize_items(doc_path: str, page_no: int, ctx: Dict[str, Any], items: List
             "page_number": page_no,
             "page_size_pt": [ctx["media_w"], ctx["media_h"]],
             "type": it["type"],
-            "id": str(uuid.uuid4()),
+            "id": item_id(page_no, idx),
             "bbox_pt": bbox_pt,
             "bbox_mm": bbox_pt_to_mm(bbox_pt, ctx["user_unit"]),
             "visible_bbox_pt": it.get("visible_bbox_pt"),
@@ -180,90 +239,323 @@ def finalize_items(doc_path: str, page_no: int, ctx: Dict[str, Any], items: List
     return out
 
 
+# pdfmeasure/columnar.py
+# Compact per-page representation: one structured array row per item, with
+# type and font stored as codes into small lookup tables.
+ITEM_TYPES = ["image", "rectangle", "vector_path", "text_line", "text_glyph",
+              "form_xobject_expanded", "text_block", "image_block"]
+TYPE_CODES = {t: i for i, t in enumerate(ITEM_TYPES)}
+
+COLUMNAR_DTYPE = [
+    ("page_number", "<u4"),
+    ("index", "<u4"),
+    ("type", "u1"),
+    ("font", "<i4"),          # index into fonts table, -1 if not a glyph
+    ("font_size_pt", "<f4"),
+    ("glyph", "<u4"),         # unicode code point, 0 if not a glyph
+    ("bbox_pt", "<f8", (4,)),
+    ("bbox_mm", "<f8", (4,)),
+]
+
+def to_columnar(page_no: int, items: List[Dict[str, Any]], fonts: Dict[str, int]):
+    """Convert finalized page items to a NumPy structured array; `fonts` is the shared name->code table."""
+    import numpy as np
+    arr = np.zeros(len(items), dtype=COLUMNAR_DTYPE)
+    if not items:
+        return arr
+    arr["page_number"] = page_no
+    arr["index"] = np.arange(len(items), dtype=np.uint32)
+    arr["type"] = [TYPE_CODES.get(it.get("type"), 255) for it in items]
+    arr["bbox_pt"] = [it["bbox_pt"] for it in items]
+    arr["bbox_mm"] = [it["bbox_mm"] for it in items]
+    font_col = arr["font"]
+    font_col[:] = -1
+    for k, it in enumerate(items):
+        if it.get("type") != "text_glyph":
+            continue
+        props = it.get("properties", {})
+        name = props.get("font_name") or ""
+        font_col[k] = fonts.setdefault(name, len(fonts))
+        arr["font_size_pt"][k] = props.get("font_size_pt") or 0.0
+        g = props.get("glyph")
+        arr["glyph"][k] = ord(g[0]) if g else 0
+    return arr
+
+def _font_table(fonts: Dict[str, int]) -> List[str]:
+    table = [""] * len(fonts)
+    for name, code in fonts.items():
+        table[code] = name
+    return table
+
+class NpzColumnarWriter:
+    """Incremental .npz writer: one page_NNNN array per page, written into the archive as it arrives.
+
+    Same layout as np.savez_compressed (plus the types/fonts tables, written on close),
+    so np.load reads it as before.
+    """
+    def __init__(self, path):
+        import zipfile
+        self.path = path
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+
+    def _add(self, name, arr):
+        import numpy as np
+        with self._zip.open(name + ".npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(arr), allow_pickle=False)
+
+    def write(self, page_no: int, arr):
+        self._add(f"page_{page_no:04d}", arr)
+
+    def close(self, fonts: Dict[str, int]):
+        import numpy as np
+        self._add("types", np.array(ITEM_TYPES))
+        self._add("fonts", np.array(_font_table(fonts), dtype=str))
+        self._zip.close()
+
+class ParquetColumnarWriter:
+    """Parquet writer with one row group per page.
+
+    The fonts table belongs into the schema metadata but is only complete after the last
+    page, so pages are spilled to a temporary file as they arrive and converted on close,
+    one page at a time.
+    """
+    def __init__(self, path):
+        import tempfile
+        import pyarrow  # noqa: F401 -- fail before measuring if pyarrow is missing
+        self.path = path
+        self._spill = tempfile.TemporaryFile()
+        self._pages = 0
+
+    def write(self, page_no: int, arr):
+        import numpy as np
+        if not len(arr):
+            return
+        np.save(self._spill, arr, allow_pickle=False)
+        self._pages += 1
+
+    def close(self, fonts: Dict[str, int]):
+        import numpy as np
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([
+            ("page_number", pa.uint32()), ("index", pa.uint32()),
+            ("type", pa.dictionary(pa.int32(), pa.string())),
+            ("font", pa.int32()), ("font_size_pt", pa.float32()), ("glyph", pa.uint32()),
+        ] + [(name + suffix, pa.float64()) for name in ("x0", "y0", "x1", "y1") for suffix in ("", "mm")],
+            metadata={"fonts": json.dumps(_font_table(fonts))})
+        try:
+            self._spill.seek(0)
+            with pq.ParquetWriter(self.path, schema, compression="zstd") as writer:
+                for _ in range(self._pages):
+                    arr = np.load(self._spill, allow_pickle=False)
+                    cols = {
+                        "page_number": arr["page_number"],
+                        "index": arr["index"],
+                        "type": pa.DictionaryArray.from_arrays(arr["type"].astype(np.int32), ITEM_TYPES),
+                        "font": arr["font"],
+                        "font_size_pt": arr["font_size_pt"],
+                        "glyph": arr["glyph"],
+                    }
+                    for k, name in enumerate(("x0", "y0", "x1", "y1")):
+                        cols[name] = arr["bbox_pt"][:, k]
+                        cols[name + "mm"] = arr["bbox_mm"][:, k]
+                    writer.write_table(pa.table(cols, schema=schema))
+        finally:
+            self._spill.close()
+
+def open_columnar_writer(base: str, fmt: str):
+    """Columnar writer next to the JSONL/CSV files; falls back to .npz if pyarrow is missing."""
+    if fmt == "parquet":
+        try:
+            return ParquetColumnarWriter(base + ".parquet")
+        except ImportError:
+            logger.warning("pyarrow not available, writing columnar output as .npz")
+    return NpzColumnarWriter(base + ".npz")
+
+
 # writers
-def write_jsonl(path, items):
-    with open(path, "w", encoding="utf-8") as f:
+CSV_COLUMNS = ["page_number", "type", "x0", "y0", "x1", "y1", "x0mm", "y0mm", "x1mm", "y1mm"]
+
+class JsonlWriter:
+    """Incremental JSONL writer; items are written as they arrive, never buffered."""
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "w", encoding="utf-8")
+
+    def write(self, items):
         for it in items:
-            f.write(json.dumps(it, ensure_ascii=False) + "\n")
-
-def write_csv(path, items):
-    import csv
-    cols = ["page_number", "type", "x0", "y0", "x1", "y1", "x0mm", "y0mm", "x1mm", "y1mm"]
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(cols)
+            self._f.write(json.dumps(it, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._f.close()
+
+class CsvWriter:
+    def __init__(self, path):
+        import csv
+        self.path = path
+        self._f = open(path, "w", newline="", encoding="utf-8")
+        self._w = csv.writer(self._f)
+        self._w.writerow(CSV_COLUMNS)
+
+    def write(self, items):
         for it in items:
             x0, y0, x1, y1 = it["bbox_pt"]
             x0m, y0m, x1m, y1m = it["bbox_mm"]
-            w.writerow([it["page_number"], it["type"], x0, y0, x1, y1, x0m, y0m, x1m, y1m])
+            self._w.writerow([it["page_number"], it["type"], x0, y0, x1, y1, x0m, y0m, x1m, y1m])
+
+    def close(self):
+        self._f.close()
+
+class OutputPair:
+    """JSONL + CSV writers sharing a base path. Files are only created on the first non-empty write."""
+    def __init__(self, base: str):
+        self.base = base
+        self._writers = None
+
+    def write(self, items):
+        if not items:
+            return
+        if self._writers is None:
+            self._writers = [JsonlWriter(self.base + ".jsonl"), CsvWriter(self.base + ".csv")]
+        for w in self._writers:
+            w.write(items)
+
+    def close(self) -> List[str]:
+        if self._writers is None:
+            return []
+        for w in self._writers:
+            w.close()
+        return [w.path for w in self._writers]
+
+
+def layout_items_for_page(doc_path: str, page_no: int, ctx: Dict[str, Any],
+                          layout_boxes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Attach layout boxes as synthetic items for output (type: text_block/image_block)
+    out = []
+    for lb in layout_boxes:
+        out.append({
+            "doc_path": doc_path,
+            "page_index": page_no - 1,
+            "page_number": page_no,
+            "page_size_pt": [ctx["media_w"], ctx["media_h"]],
+            "type": lb["type"],
+            "id": f"layout-{page_no}-{lb['type']}-{lb['bbox_pt'][0]}-{lb['bbox_pt'][1]}",
+            "bbox_pt": lb["bbox_pt"],
+            "bbox_mm": lb["bbox_mm"],
+            "visible_bbox_pt": None,
+            "stroke_width_pt": None,
+            "matrix": None,
+            "rotation_deg": ctx["rotate"],
+            "user_unit": ctx["user_unit"],
+            "properties": {"children_count": lb["children_count"]}
+        })
+    return out
+
+
+def iter_page_items(doc, doc_path: str, max_pages: int = None):
+    """Yield (page_number, ctx, items, layout_items) one page at a time."""
+    pdf = _open_placement_source(doc_path)
+    try:
+        for i, page in enumerate(doc, start=1):
+            if max_pages and i > max_pages:
+                break
+            ctx = read_page_context(page)
+            page_items: List[Dict[str, Any]] = []
+            page_items += extract_vectors(page, ctx)
+            page_items += extract_images(page, ctx, placements=read_image_placements(pdf, i))
+            page_items += extract_text(page, ctx, glyph_level=True)
+            fin = finalize_items(doc_path, i, ctx, page_items)
+            del page_items
+            layout_items = layout_items_for_page(doc_path, i, ctx, compute_layout_boxes(fin, ctx))
+            yield i, ctx, fin, layout_items
+    finally:
+        if pdf is not None:
+            pdf.close()
 
 
 def measure_pdf(doc_path: str, out_dir: str = None, per_page: bool = False, max_pages: int = None,
-                layout_only_outputs: bool = False) -> Dict[str, Any]:
+                layout_only_outputs: bool = False, columnar: str = None, collect_items: bool = True,
+                overlay_path: str = None, overlay_stroke_pt: float = 1.0) -> Dict[str, Any]:
+    """Measure a PDF page by page, streaming each page to the writers (and overlay) before the next one.
+
+    Peak memory is bounded by the largest page unless collect_items is set, in which case
+    every item is also kept and returned under "items".
+    """
     import fitz
     os.makedirs(out_dir, exist_ok=True) if out_dir else None
 
     doc = fitz.open(doc_path)
-    all_items: List[Dict[str, Any]] = []
-    layout_only_all: List[Dict[str, Any]] = []
-    for i, page in enumerate(doc, start=1):
-        if max_pages and i > max_pages:
-            break
-        ctx = read_page_context(page)
-        page_items: List[Dict[str, Any]] = []
-        page_items += extract_vectors(page, ctx)
-        page_items += extract_images(page, ctx)
-        page_items += extract_text(page, ctx, glyph_level=True)
-        fin = finalize_items(doc_path, i, ctx, page_items)
-        all_items.extend(fin)
-        # layout boxes per page
-        layout_boxes = compute_layout_boxes(fin, ctx)
-        # Attach as synthetic items for output (type: text_block/image_block)
-        layout_items_page: List[Dict[str, Any]] = []
-        for lb in layout_boxes:
-            layout_item = {
-                "doc_path": doc_path,
-                "page_index": i - 1,
-                "page_number": i,
-                "page_size_pt": [ctx["media_w"], ctx["media_h"]],
-                "type": lb["type"],
-                "id": f"layout-{i}-{lb['type']}-{lb['bbox_pt'][0]}-{lb['bbox_pt'][1]}",
-                "bbox_pt": lb["bbox_pt"],
-                "bbox_mm": lb["bbox_mm"],
-                "visible_bbox_pt": None,
-                "stroke_width_pt": None,
-                "matrix": None,
-                "rotation_deg": ctx["rotate"],
-                "user_unit": ctx["user_unit"],
-                "properties": {"children_count": lb["children_count"]}
-            }
-            all_items.append(layout_item)
-            layout_items_page.append(layout_item)
-
-        # optional per-page layout-only outputs
-        if out_dir and per_page and layout_only_outputs and layout_items_page:
-            base = os.path.join(out_dir, f"{os.path.basename(doc_path)}.page-{i:04d}_layout")
-            write_jsonl(base + ".jsonl", layout_items_page)
-            write_csv(base + ".csv", layout_items_page)
-
-        if per_page and out_dir:
-            base = os.path.join(out_dir, f"{os.path.basename(doc_path)}.page-{i:04d}")
-            write_jsonl(base + ".jsonl", fin)
-            write_csv(base + ".csv", fin)
-
-    if not per_page and out_dir:
-        base = os.path.join(out_dir, f"{os.path.basename(doc_path)}")
-        write_jsonl(base + ".jsonl", all_items)
-        write_csv(base + ".csv", all_items)
-        if layout_only_outputs:
-            # Write layout-only aggregates
-            layout_only_all = [it for it in all_items if it.get("type") in ("text_block", "image_block")]
-            if layout_only_all:
-                write_jsonl(base + "_layout.jsonl", layout_only_all)
-                write_csv(base + "_layout.csv", layout_only_all)
-
-    doc.close()
-    return {"total_items": len(all_items), "items": all_items}
+    overlay_doc = fitz.open(doc_path) if overlay_path else None
+    all_items: List[Dict[str, Any]] = [] if collect_items else None
+    counts_by_type: Dict[str, int] = {}
+    total_items = 0
+    pages_processed = 0
+    output_paths: List[str] = []
+    fonts: Dict[str, int] = {}
+
+    doc_base = os.path.join(out_dir, f"{os.path.basename(doc_path)}") if out_dir else None
+    doc_out = OutputPair(doc_base) if out_dir and not per_page else None
+    doc_layout_out = OutputPair(doc_base + "_layout") if doc_out and layout_only_outputs else None
+    columnar_out = open_columnar_writer(doc_base, columnar) if out_dir and columnar else None
+    columnar_path = None
+    try:
+        for i, ctx, fin, layout_items in iter_page_items(doc, doc_path, max_pages=max_pages):
+            page_all = fin + layout_items
+            pages_processed += 1
+            total_items += len(page_all)
+            for it in page_all:
+                counts_by_type[it["type"]] = counts_by_type.get(it["type"], 0) + 1
+            if all_items is not None:
+                all_items.extend(page_all)
+
+            if overlay_doc is not None:
+                draw_overlay_page(overlay_doc[i - 1], page_all, stroke_pt=overlay_stroke_pt)
+
+            if columnar_out is not None:
+                columnar_out.write(i, to_columnar(i, page_all, fonts))
+
+            if doc_out is not None:
+                doc_out.write(page_all)
+            if doc_layout_out is not None:
+                doc_layout_out.write(layout_items)
+
+            if per_page and out_dir:
+                page_base = os.path.join(out_dir, f"{os.path.basename(doc_path)}.page-{i:04d}")
+                # optional per-page layout-only outputs
+                if layout_only_outputs:
+                    layout_out = OutputPair(page_base + "_layout")
+                    layout_out.write(layout_items)
+                    output_paths += layout_out.close()
+                page_out = OutputPair(page_base)
+                page_out.write(fin)
+                output_paths += page_out.close()
+
+        if overlay_doc is not None:
+            os.makedirs(os.path.dirname(overlay_path), exist_ok=True)
+            overlay_doc.save(overlay_path, garbage=3, deflate=True)
+    finally:
+        for out in (doc_out, doc_layout_out):
+            if out is not None:
+                output_paths += out.close()
+        if columnar_out is not None:
+            columnar_out.close(fonts)
+            columnar_path = columnar_out.path
+            output_paths.append(columnar_path)
+        if overlay_doc is not None:
+            overlay_doc.close()
+        doc.close()
+
+    result = {
+        "total_items": total_items,
+        "pages_processed": pages_processed,
+        "counts_by_type": counts_by_type,
+        "output_paths": output_paths,
+        "columnar_path": columnar_path,
+        "overlay_path": overlay_path,
+    }
+    if all_items is not None:
+        result["items"] = all_items
+    return result
 
 
 def _rect_union(a, b):
@@ -362,7 +654,9 @@ def measure_from_path():
         save_outputs = bool(data.get("save_outputs", True))
         make_overlay = bool(data.get("make_overlay", False))
         overlay_stroke_pt = float(data.get("overlay_stroke_pt", 1.0))
-        include_files = bool(data.get("include_files", False))
+        # Items are returned inline only on request; by default the response is a summary plus file handles
+        include_items = bool(data.get("include_items", False))
+        include_files = bool(data.get("include_files", not include_items))
         include_files_content = bool(data.get("include_files_content", False))
         content_max_bytes = int(data.get("content_max_bytes", 200000))
 
@@ -375,46 +669,41 @@ def measure_from_path():
         if out_dir:
             os.makedirs(out_dir, exist_ok=True)
 
-        result = measure_pdf(pdf_path, out_dir=out_dir, per_page=per_page, max_pages=max_pages,
-                             layout_only_outputs=bool(data.get("layout_only_outputs", False)))
+        columnar = data.get("columnar_format")  # "npz" | "parquet"
+        if columnar not in (None, "npz", "parquet"):
+            return jsonify({"success": False, "error": "columnar_format must be 'npz' or 'parquet'"}), 400
 
         overlay_url = None
         overlay_path = None
         if make_overlay:
-            # generate overlay into out_dir (or default if out_dir is None)
+            # generate overlay into out_dir (or default if out_dir is None), drawn page by page during measuring
             overlay_dir = out_dir or os.getenv("MEASURE_OUT_DIR", "/shared/measurements")
             os.makedirs(overlay_dir, exist_ok=True)
             base = os.path.splitext(os.path.basename(pdf_path))[0]
             overlay_path = os.path.join(overlay_dir, f"{base}_overlay.pdf")
-            create_overlay_pdf(pdf_path, result.get("items", []), overlay_path, stroke_pt=overlay_stroke_pt)
-            url_path = f"/files/{os.path.basename(overlay_path)}"
-            base_url = request.host_url[:-1] if request.host_url.endswith('/') else request.host_url
-            overlay_url = f"{base_url}{url_path}"
 
-        # Optional layout-only reduction (filter items to layout_block types)
-        items_out = result["items"]
-        if bool(data.get("layout_only", False)):
-            items_out = [it for it in items_out if it.get("type") in ("text_block","image_block")]
+        result = measure_pdf(pdf_path, out_dir=out_dir, per_page=per_page, max_pages=max_pages,
+                             layout_only_outputs=bool(data.get("layout_only_outputs", False)),
+                             columnar=columnar, collect_items=include_items,
+                             overlay_path=overlay_path, overlay_stroke_pt=overlay_stroke_pt)
+
+        base_url = request.host_url[:-1] if request.host_url.endswith('/') else request.host_url
+        if overlay_path:
+            overlay_url = f"{base_url}/files/{os.path.basename(overlay_path)}"
 
-        # Collect output files if requested
+        # Collect output files written by this run
         output_files = []
-        if out_dir and (save_outputs or bool(data.get("layout_only_outputs", False)) or make_overlay) and include_files:
-            try:
-                base_name = os.path.basename(pdf_path)
-                base_root = os.path.join(out_dir, base_name)
-                # Gather matching files in out_dir
-                for fname in os.listdir(out_dir):
-                    if not fname.startswith(base_name):
-                        continue
-                    fpath = os.path.join(out_dir, fname)
-                    if not os.path.isfile(fpath):
-                        continue
-                    url_path = f"/files/{fname}"
-                    base_url = request.host_url[:-1] if request.host_url.endswith('/') else request.host_url
+        if out_dir and include_files:
+            paths = list(result.get("output_paths", []))
+            if overlay_path:
+                paths.append(overlay_path)
+            for fpath in paths:
+                try:
+                    fname = os.path.basename(fpath)
                     entry = {
                         "name": fname,
                         "path": fpath,
-                        "url": f"{base_url}{url_path}",
+                        "url": f"{base_url}/files/{fname}",
                         "size_bytes": os.path.getsize(fpath)
                     }
                     if include_files_content and entry["size_bytes"] <= content_max_bytes:
@@ -424,70 +713,72 @@ def measure_from_path():
                         except Exception:
                             pass
                     output_files.append(entry)
-            except Exception as e:
-                logger.warning(f"Failed to collect output files: {e}")
+                except Exception as e:
+                    logger.warning(f"Failed to collect output file {fpath}: {e}")
 
-        return jsonify({
+        response = {
             "success": True,
             "filepath": pdf_path,
             "total_items": result["total_items"],
-            "items": items_out,
+            "pages_processed": result["pages_processed"],
+            "counts_by_type": result["counts_by_type"],
             "layout_only": bool(data.get("layout_only", False)),
             "outputs_saved": bool(out_dir),
             "output_dir": out_dir,
             "overlay_path": overlay_path,
             "overlay_url": overlay_url,
+            "columnar_path": result.get("columnar_path"),
             "outputs": output_files
-        })
+        }
+        if include_items:
+            # Optional layout-only reduction (filter items to layout_block types)
+            items_out = result["items"]
+            if bool(data.get("layout_only", False)):
+                items_out = [it for it in items_out if it.get("type") in ("text_block","image_block")]
+            response["items"] = items_out
+        return jsonify(response)
     except Exception as e:
         logger.exception("Error in measure_from_path")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-def create_overlay_pdf(pdf_path: str, items: List[Dict[str, Any]], out_path: str,
-                       stroke_pt: float = 1.0) -> None:
+OVERLAY_COLORS = {
+    "image": (1, 0, 0),           # red
+    "rectangle": (0, 1, 0),       # green
+    "vector_path": (0, 0, 1),     # blue
+    "text_line": (1, 0.5, 0),     # orange
+    "text_glyph": (1, 0, 1),      # magenta
+    "form_xobject_expanded": (0, 0, 0) # black
+}
+
+def draw_overlay_page(page, page_items: List[Dict[str, Any]], stroke_pt: float = 1.0) -> None:
+    """Draw item outlines with one shape per style, so a page costs one content-stream commit per style."""
     import fitz
-    colors = {
-        "image": (1, 0, 0),           # red
-        "rectangle": (0, 1, 0),       # green
-        "vector_path": (0, 0, 1),     # blue
-        "text_line": (1, 0.5, 0),     # orange
-        "text_glyph": (1, 0, 1),      # magenta
-        "form_xobject_expanded": (0, 0, 0) # black
-    }
-    doc = fitz.open(pdf_path)
-    try:
-        for page_idx in range(len(doc)):
-            page = doc[page_idx]
-            # items use page_number (1-based)
-            page_items = [it for it in items if it.get("page_number") == page_idx + 1]
-            if not page_items:
-                continue
-            for it in page_items:
-                bbox = it.get("bbox_pt") or it.get("bbox")
-                if not bbox or len(bbox) != 4:
-                    continue
-                x0, y0, x1, y1 = [float(v) for v in bbox]
-                rect = fitz.Rect(x0, y0, x1, y1)
-                c = colors.get(it.get("type", ""), (0, 0, 0))
-                shape = page.new_shape()
-                shape.draw_rect(rect)
-                shape.finish(color=c, width=stroke_pt)
-                shape.commit()
-                # draw visible clip bbox if present
-                vb = it.get("visible_bbox_pt")
-                if vb and isinstance(vb, (list, tuple)) and len(vb) == 4:
-                    vrect = fitz.Rect(*[float(v) for v in vb])
-                    vshape = page.new_shape()
-                    vshape.draw_rect(vrect)
-                    # dashed outline
-                    vshape.finish(color=(0, 0, 0), dashes="2 2", width=max(0.7, stroke_pt * 0.8))
-                    vshape.commit()
-        # save overlay
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        doc.save(out_path)
-    finally:
-        doc.close()
+    # group rects by type once: color -> rects
+    by_type: Dict[str, List[Any]] = {}
+    visible: List[Any] = []
+    for it in page_items:
+        bbox = it.get("bbox_pt") or it.get("bbox")
+        if not bbox or len(bbox) != 4:
+            continue
+        by_type.setdefault(it.get("type", ""), []).append(fitz.Rect(*[float(v) for v in bbox]))
+        # visible clip bbox if present
+        vb = it.get("visible_bbox_pt")
+        if vb and isinstance(vb, (list, tuple)) and len(vb) == 4:
+            visible.append(fitz.Rect(*[float(v) for v in vb]))
+
+    shape = page.new_shape()
+    for item_type, rects in by_type.items():
+        for rect in rects:
+            shape.draw_rect(rect)
+        shape.finish(color=OVERLAY_COLORS.get(item_type, (0, 0, 0)), width=stroke_pt)
+    if visible:
+        for rect in visible:
+            shape.draw_rect(rect)
+        # dashed outline
+        shape.finish(color=(0, 0, 0), dashes="2 2", width=max(0.7, stroke_pt * 0.8))
+    if by_type or visible:
+        shape.commit()
 
 
 @app.route("/measure/overlay-from-path", methods=["POST"])
@@ -510,15 +801,13 @@ def overlay_from_path():
         out_dir = os.getenv("MEASURE_OUT_DIR", "/shared/measurements") if save_outputs else None
         if out_dir:
             os.makedirs(out_dir, exist_ok=True)
-        result = measure_pdf(pdf_path, out_dir=out_dir, per_page=per_page, max_pages=max_pages)
-        items = result.get("items", [])
-
         # overlay always written (uses default dir if save_outputs false)
         overlay_dir = out_dir or os.getenv("MEASURE_OUT_DIR", "/shared/measurements")
         os.makedirs(overlay_dir, exist_ok=True)
         base = os.path.splitext(os.path.basename(pdf_path))[0]
         out_path = os.path.join(overlay_dir, f"{base}_overlay.pdf")
-        create_overlay_pdf(pdf_path, items, out_path, stroke_pt=stroke_pt)
+        result = measure_pdf(pdf_path, out_dir=out_dir, per_page=per_page, max_pages=max_pages,
+                             collect_items=False, overlay_path=out_path, overlay_stroke_pt=stroke_pt)
 
         # build URL
         url_path = f"/files/{os.path.basename(out_path)}"
@@ -537,6 +826,405 @@ def overlay_from_path():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+# ==== Spatial queries over measured items ====
+
+# pdfmeasure/spatial.py
+SPATIAL_GRID_CELL_PT = float(os.getenv("SPATIAL_GRID_CELL_PT", "36"))
+SPATIAL_CACHE_DOCS = int(os.getenv("SPATIAL_CACHE_DOCS", "16"))
+
+_spatial_cache = OrderedDict()
+_spatial_lock = threading.Lock()
+
+
+def _expand(bbox, d: float):
+    return [bbox[0] - d, bbox[1] - d, bbox[2] + d, bbox[3] + d]
+
+
+class PageIndex:
+    """Uniform-grid index over one page's item bboxes (pt, top-left origin)."""
+
+    def __init__(self, page_no: int, ctx: Dict[str, Any], items: List[Dict[str, Any]], n_measured: int,
+                 cell: float = SPATIAL_GRID_CELL_PT):
+        import numpy as np
+        self.page_no = page_no
+        self.user_unit = ctx["user_unit"]
+        self.page_size_pt = [ctx["media_w"], ctx["media_h"]]
+        self.cell = cell
+        self.n_measured = n_measured  # items [0, n_measured) have deterministic (page, index) ids
+        self.layout_ids = [it["id"] for it in items[n_measured:]]
+        self.bboxes = np.array([it["bbox_pt"] for it in items], dtype=np.float64).reshape(-1, 4)
+        self.types = np.array([TYPE_CODES.get(it["type"], 255) for it in items], dtype=np.uint8)
+        self.ncols = max(1, int(math.ceil(self.page_size_pt[0] / cell)))
+        self.nrows = max(1, int(math.ceil(self.page_size_pt[1] / cell)))
+
+        buckets: Dict[int, List[int]] = {}
+        c0, r0, c1, r1 = self._cell_span(self.bboxes)
+        for i in range(len(items)):
+            for r in range(r0[i], r1[i] + 1):
+                base = r * self.ncols
+                for c in range(c0[i], c1[i] + 1):
+                    buckets.setdefault(base + c, []).append(i)
+        self.buckets = {k: np.array(v, dtype=np.int64) for k, v in buckets.items()}
+
+    def _cell_span(self, b):
+        import numpy as np
+        c0 = np.clip(np.floor(b[..., 0] / self.cell), 0, self.ncols - 1).astype(np.int64)
+        r0 = np.clip(np.floor(b[..., 1] / self.cell), 0, self.nrows - 1).astype(np.int64)
+        c1 = np.clip(np.floor(b[..., 2] / self.cell), 0, self.ncols - 1).astype(np.int64)
+        r1 = np.clip(np.floor(b[..., 3] / self.cell), 0, self.nrows - 1).astype(np.int64)
+        return c0, r0, c1, r1
+
+    def _covers_page(self, bbox) -> bool:
+        if not len(self.bboxes):
+            return True
+        return (bbox[0] <= min(0.0, self.bboxes[:, 0].min()) and bbox[1] <= min(0.0, self.bboxes[:, 1].min())
+                and bbox[2] >= max(self.page_size_pt[0], self.bboxes[:, 2].max())
+                and bbox[3] >= max(self.page_size_pt[1], self.bboxes[:, 3].max()))
+
+    def _candidates(self, bbox):
+        import numpy as np
+        c0, r0, c1, r1 = (int(v) for v in self._cell_span(np.asarray(bbox, dtype=np.float64)))
+        parts = [self.buckets[k] for r in range(r0, r1 + 1) for k in range(r * self.ncols + c0, r * self.ncols + c1 + 1)
+                 if k in self.buckets]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def _type_filter(self, idx, type_codes):
+        import numpy as np
+        if type_codes is None or not len(idx):
+            return idx
+        return idx[np.isin(self.types[idx], type_codes)]
+
+    def gaps(self, idx, bbox):
+        """Edge-to-edge distance (pt) between bbox and items idx; 0 where they overlap."""
+        import numpy as np
+        b = self.bboxes[idx]
+        dx = np.maximum(0.0, np.maximum(bbox[0] - b[:, 2], b[:, 0] - bbox[2]))
+        dy = np.maximum(0.0, np.maximum(bbox[1] - b[:, 3], b[:, 1] - bbox[3]))
+        return np.hypot(dx, dy)
+
+    def in_bbox(self, bbox, type_codes=None, within: bool = False):
+        idx = self._type_filter(self._candidates(bbox), type_codes)
+        b = self.bboxes[idx]
+        if within:
+            keep = (b[:, 0] >= bbox[0]) & (b[:, 1] >= bbox[1]) & (b[:, 2] <= bbox[2]) & (b[:, 3] <= bbox[3])
+        else:
+            keep = (b[:, 0] <= bbox[2]) & (b[:, 2] >= bbox[0]) & (b[:, 1] <= bbox[3]) & (b[:, 3] >= bbox[1])
+        return idx[keep]
+
+    def nearest(self, bbox, type_codes=None, exclude=None, k: int = 1, max_dist: float = None):
+        """k nearest items to bbox by edge distance, searching outward in grid rings."""
+        import numpy as np
+        radius = self.cell
+        while True:
+            if max_dist is not None:
+                radius = min(radius, max_dist)
+            idx = self.in_bbox(_expand(bbox, radius), type_codes)
+            if exclude is not None and len(idx):
+                idx = idx[~np.isin(idx, exclude)]
+            d = self.gaps(idx, bbox)
+            done = (d <= radius).sum() >= k
+            if done or self._covers_page(_expand(bbox, radius)) or (max_dist is not None and radius >= max_dist):
+                keep = d <= radius
+                idx, d = idx[keep], d[keep]
+                order = np.argsort(d, kind="stable")[:k]
+                return idx[order], d[order]
+            radius *= 2
+
+    def item_id(self, i: int) -> str:
+        return item_id(self.page_no, i) if i < self.n_measured else self.layout_ids[i - self.n_measured]
+
+    def resolve_id(self, ident: str):
+        if ident.startswith("p") and "-" in ident:
+            try:
+                pno, idx = ident[1:].split("-", 1)
+                if int(pno) == self.page_no and 0 <= int(idx) < self.n_measured:
+                    return int(idx)
+            except ValueError:
+                pass
+        if ident in self.layout_ids:
+            return self.n_measured + self.layout_ids.index(ident)
+        return None
+
+    def item_ref(self, i: int, dist_pt: float = None) -> Dict[str, Any]:
+        bb = [float(v) for v in self.bboxes[i]]
+        ref = {
+            "id": self.item_id(int(i)),
+            "page_number": self.page_no,
+            "type": ITEM_TYPES[self.types[i]] if self.types[i] < len(ITEM_TYPES) else None,
+            "bbox_pt": bb,
+            "bbox_mm": bbox_pt_to_mm(bb, self.user_unit),
+        }
+        if dist_pt is not None:
+            ref["distance_pt"] = round(float(dist_pt), 3)
+            ref["distance_mm"] = round(pt_to_mm(float(dist_pt), self.user_unit), 3)
+        return ref
+
+
+class DocIndex:
+    def __init__(self, doc_path: str, max_pages: int = None):
+        import fitz
+        t0 = time.perf_counter()
+        self.doc_path = doc_path
+        self.pages: Dict[int, PageIndex] = {}
+        doc = fitz.open(doc_path)
+        try:
+            for i, ctx, fin, layout_items in iter_page_items(doc, doc_path, max_pages=max_pages):
+                self.pages[i] = PageIndex(i, ctx, fin + layout_items, len(fin))
+        finally:
+            doc.close()
+        self.build_ms = (time.perf_counter() - t0) * 1000.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pages": len(self.pages),
+            "items": int(sum(len(p.bboxes) for p in self.pages.values())),
+            "build_ms": round(self.build_ms, 1),
+        }
+
+
+def get_doc_index(doc_path: str, max_pages: int = None) -> DocIndex:
+    """Return the cached spatial index for a document, (re)building it when the file changed."""
+    key = (os.path.realpath(doc_path), os.path.getmtime(doc_path), max_pages)
+    with _spatial_lock:
+        idx = _spatial_cache.get(key)
+        if idx is not None:
+            _spatial_cache.move_to_end(key)
+            return idx
+    idx = DocIndex(doc_path, max_pages=max_pages)
+    with _spatial_lock:
+        _spatial_cache[key] = idx
+        while len(_spatial_cache) > SPATIAL_CACHE_DOCS:
+            _spatial_cache.popitem(last=False)
+    return idx
+
+
+def _type_codes(types):
+    if not types:
+        return None
+    if isinstance(types, str):
+        types = [types]
+    return [TYPE_CODES[t] for t in types if t in TYPE_CODES]
+
+
+def clearance_report(pidx: PageIndex, box, required_pt: float = None, search_pt: float = 72.0,
+                     exclude_types=None, exclude=None) -> Dict[str, Any]:
+    """Clear space around `box`: minimum gap overall and per side. Items fully inside the box
+    are treated as part of the element (e.g. the paths of a logo) and ignored."""
+    import numpy as np
+    radius = max(search_pt, required_pt or 0.0)
+    idx = pidx.in_bbox(_expand(box, radius))
+    if exclude is not None and len(idx):
+        idx = idx[~np.isin(idx, exclude)]
+    if exclude_types:
+        idx = idx[~np.isin(pidx.types[idx], _type_codes(exclude_types) or [])]
+    b = pidx.bboxes[idx]
+    inside = (b[:, 0] >= box[0]) & (b[:, 1] >= box[1]) & (b[:, 2] <= box[2]) & (b[:, 3] <= box[3])
+    # ignore items that fully enclose the box (page backgrounds, frames)
+    encloses = (b[:, 0] <= box[0]) & (b[:, 1] <= box[1]) & (b[:, 2] >= box[2]) & (b[:, 3] >= box[3])
+    idx, b = idx[~inside & ~encloses], b[~inside & ~encloses]
+    d = pidx.gaps(idx, box)
+
+    # assign each neighbour to the side it lies furthest out on
+    side_gaps = np.stack([box[0] - b[:, 2], box[1] - b[:, 3], b[:, 0] - box[2], b[:, 1] - box[3]], axis=1) \
+        if len(idx) else np.zeros((0, 4))
+    side_of = np.argmax(side_gaps, axis=1) if len(idx) else np.zeros(0, dtype=np.int64)
+    sides = {}
+    for s, name in enumerate(("left", "top", "right", "bottom")):
+        sel = np.where((side_of == s) & (d > 0))[0]
+        if not len(sel):
+            sides[name] = None
+            continue
+        j = sel[np.argmin(d[sel])]
+        sides[name] = pidx.item_ref(idx[j], d[j])
+
+    result = {
+        "box_pt": [float(v) for v in box],
+        "box_mm": bbox_pt_to_mm(box, pidx.user_unit),
+        "search_radius_pt": radius,
+        "min_clearance_pt": None,
+        "min_clearance_mm": None,
+        "nearest": None,
+        "sides": sides,
+    }
+    if len(idx):
+        j = int(np.argmin(d))
+        result["min_clearance_pt"] = round(float(d[j]), 3)
+        result["min_clearance_mm"] = round(pt_to_mm(float(d[j]), pidx.user_unit), 3)
+        result["nearest"] = pidx.item_ref(idx[j], d[j])
+    if required_pt is not None:
+        viol = np.where(d < required_pt)[0]
+        result["required_pt"] = required_pt
+        result["required_mm"] = round(pt_to_mm(required_pt, pidx.user_unit), 3)
+        result["passes"] = not len(viol)
+        result["violations"] = [pidx.item_ref(idx[j], d[j]) for j in viol[np.argsort(d[viol])][:200]]
+    return result
+
+
+def _spatial_request():
+    """Parse the common spatial query fields; returns (data, DocIndex, PageIndex) or an error response."""
+    data = request.get_json(silent=True) or {}
+    pdf_path = data.get("filepath")
+    if not pdf_path or not os.path.exists(pdf_path):
+        return None, (jsonify({"success": False, "error": "File not found or no filepath provided"}), 400)
+    if not pdf_path.lower().endswith(".pdf"):
+        return None, (jsonify({"success": False, "error": "File must be a PDF"}), 400)
+    max_pages = data.get("max_pages")
+    didx = get_doc_index(pdf_path, max_pages=int(max_pages) if max_pages is not None else None)
+    page_no = int(data.get("page_number", 1))
+    pidx = didx.pages.get(page_no)
+    if pidx is None:
+        return None, (jsonify({"success": False, "error": f"page_number {page_no} not indexed"}), 400)
+    return (data, didx, pidx), None
+
+
+def _request_box(data: Dict[str, Any], pidx: PageIndex, key: str = "bbox"):
+    """Query box from `<key>_pt`, `<key>_mm` or an item `id`; returns (bbox_pt, item index or None)."""
+    if data.get("id"):
+        i = pidx.resolve_id(str(data["id"]))
+        if i is None:
+            raise ValueError(f"unknown id {data['id']} on page {pidx.page_no}")
+        return [float(v) for v in pidx.bboxes[i]], i
+    if data.get(f"{key}_pt") is not None:
+        bb = [float(v) for v in data[f"{key}_pt"]]
+    elif data.get(f"{key}_mm") is not None:
+        bb = [float(v) / (PT_TO_MM * pidx.user_unit) for v in data[f"{key}_mm"]]
+    else:
+        raise ValueError(f"provide id, {key}_pt or {key}_mm")
+    if len(bb) != 4:
+        raise ValueError(f"{key} must have 4 values")
+    return bb, None
+
+
+def _required_pt(data: Dict[str, Any], pidx: PageIndex):
+    if data.get("required_pt") is not None:
+        return float(data["required_pt"])
+    if data.get("required_mm") is not None:
+        return float(data["required_mm"]) / (PT_TO_MM * pidx.user_unit)
+    return None
+
+
+@app.route("/measure/index", methods=["POST"])
+def spatial_index_endpoint():
+    try:
+        data = request.get_json(silent=True) or {}
+        pdf_path = data.get("filepath")
+        if not pdf_path or not os.path.exists(pdf_path):
+            return jsonify({"success": False, "error": "File not found or no filepath provided"}), 400
+        if not pdf_path.lower().endswith(".pdf"):
+            return jsonify({"success": False, "error": "File must be a PDF"}), 400
+        max_pages = data.get("max_pages")
+        didx = get_doc_index(pdf_path, max_pages=int(max_pages) if max_pages is not None else None)
+        return jsonify({"success": True, "filepath": pdf_path, **didx.stats()})
+    except Exception as e:
+        logger.exception("Error in spatial_index_endpoint")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/measure/query/in-bbox", methods=["POST"])
+def spatial_in_bbox():
+    try:
+        parsed, err = _spatial_request()
+        if err:
+            return err
+        data, didx, pidx = parsed
+        t0 = time.perf_counter()
+        box, _ = _request_box(data, pidx)
+        idx = pidx.in_bbox(box, _type_codes(data.get("types")), within=bool(data.get("within", False)))
+        items = [pidx.item_ref(i) for i in idx[: int(data.get("limit", 1000))]]
+        return jsonify({"success": True, "page_number": pidx.page_no, "count": int(len(idx)), "items": items,
+                        "query_ms": round((time.perf_counter() - t0) * 1000.0, 3)})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Error in spatial_in_bbox")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/measure/query/nearest", methods=["POST"])
+def spatial_nearest():
+    try:
+        parsed, err = _spatial_request()
+        if err:
+            return err
+        data, didx, pidx = parsed
+        t0 = time.perf_counter()
+        box, self_idx = _request_box(data, pidx)
+        exclude = [self_idx] if self_idx is not None else None
+        idx, d = pidx.nearest(box, _type_codes(data.get("types")), exclude=exclude, k=int(data.get("k", 1)))
+        items = [pidx.item_ref(i, dist) for i, dist in zip(idx, d)]
+        return jsonify({"success": True, "page_number": pidx.page_no, "items": items,
+                        "query_ms": round((time.perf_counter() - t0) * 1000.0, 3)})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Error in spatial_nearest")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/measure/query/min-distance", methods=["POST"])
+def spatial_min_distance():
+    try:
+        import numpy as np
+        parsed, err = _spatial_request()
+        if err:
+            return err
+        data, didx, pidx = parsed
+        codes_a, codes_b = _type_codes(data.get("class_a")), _type_codes(data.get("class_b"))
+        if not codes_a or not codes_b:
+            return jsonify({"success": False, "error": "class_a and class_b must be known item types"}), 400
+        t0 = time.perf_counter()
+        a_idx = np.where(np.isin(pidx.types, codes_a))[0]
+        b_count = int(np.isin(pidx.types, codes_b).sum())
+        best = None
+        for i in a_idx:
+            found, d = pidx.nearest(list(pidx.bboxes[i]), codes_b, exclude=[i],
+                                    max_dist=best[2] if best else None)
+            if len(found) and (best is None or d[0] < best[2]):
+                best = (int(i), int(found[0]), float(d[0]))
+                if best[2] == 0.0:
+                    break
+        result = {"success": True, "page_number": pidx.page_no, "count_a": int(len(a_idx)), "count_b": b_count,
+                  "min_distance_pt": None, "min_distance_mm": None, "item_a": None, "item_b": None}
+        if best:
+            result.update({
+                "min_distance_pt": round(best[2], 3),
+                "min_distance_mm": round(pt_to_mm(best[2], pidx.user_unit), 3),
+                "item_a": pidx.item_ref(best[0]),
+                "item_b": pidx.item_ref(best[1]),
+            })
+        result["query_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Error in spatial_min_distance")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route("/measure/query/clearance", methods=["POST"])
+def spatial_clearance():
+    try:
+        parsed, err = _spatial_request()
+        if err:
+            return err
+        data, didx, pidx = parsed
+        t0 = time.perf_counter()
+        box, self_idx = _request_box(data, pidx, key="logo_bbox")
+        report = clearance_report(pidx, box, required_pt=_required_pt(data, pidx),
+                                  search_pt=float(data.get("search_pt", 72.0)),
+                                  exclude_types=data.get("exclude_types"),
+                                  exclude=[self_idx] if self_idx is not None else None)
+        return jsonify({"success": True, "page_number": pidx.page_no, **report,
+                        "query_ms": round((time.perf_counter() - t0) * 1000.0, 3)})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Error in spatial_clearance")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # ==== Render LLM Layout Report onto PDF ====
 
 def render_layout_report(pdf_path: str, report: Dict[str, Any], out_path: str,
@@ -112,6 +112,57 @@ CREATE TABLE IF NOT EXISTS complete_analysis (
     UNIQUE(pdf_document_id)
 );
 
+-- AI analyses of graphic region crops, keyed by perceptual hash (dHash + mean color, hex)
+-- so repeated graphics are analyzed once across documents
+CREATE TABLE IF NOT EXISTS graphic_ai_analyses (
+    phash VARCHAR(24) NOT NULL,
+    model VARCHAR(50) NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    analysis JSONB NOT NULL,
+    raw_response TEXT,
+    hit_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (phash, model)
+);
+
+-- Embedding vectors keyed by SHA-256 of the embedded text, so unchanged content
+-- is never sent to the embeddings API twice (hit_count counts cache hits)
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    content_sha256 CHAR(64) NOT NULL,
+    model VARCHAR(50) NOT NULL,
+    dimensions INTEGER NOT NULL,
+    embedding REAL[] NOT NULL,
+    hit_count INTEGER DEFAULT 0,
+    last_hit_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_sha256, model, dimensions)
+);
+
+-- LLM answers keyed by the embedding of their question (semantic response cache,
+-- see python_app/response_cache.py); scope is 'ask' (/api/ask, per brand) or
+-- 'knowledge' (/knowledge/query, no brand). query_embedding has no fixed size:
+-- lookups only compare entries of the same embedding model and dimensions.
+CREATE TABLE IF NOT EXISTS response_cache (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    scope VARCHAR(20) NOT NULL,
+    brand_id UUID,
+    query_text TEXT NOT NULL,
+    query_embedding vector NOT NULL,
+    embedding_model VARCHAR(50) NOT NULL,
+    dimensions INTEGER NOT NULL,
+    llm_model VARCHAR(50) NOT NULL,
+    source_limit INTEGER NOT NULL,
+    response_text TEXT NOT NULL,
+    sources JSONB NOT NULL,
+    chunk_fingerprint CHAR(64) NOT NULL, -- SHA-256 over the sources' ids and embedding_created_at
+    hit_count INTEGER DEFAULT 0,
+    last_hit_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_response_cache_scope_brand ON response_cache(scope, brand_id);
+
 -- ============================================================================
 -- KNOWLEDGE DATABASE TABLES FOR GPT EMBEDDINGS
 -- ============================================================================
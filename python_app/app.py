@@ -28,6 +28,8 @@ from intelligent_logo_detector import IntelligentLogoDetector
 from global_graphic_detector import GlobalGraphicDetector
 from visual_report_generator import generate_visual_report, create_detailed_report_pdf, generate_visual_report_with_ai_graphics, generate_visual_report_with_ai_graphics_and_text
 from enhanced_ai_analyzer import EnhancedAIAnalyzer
+from http_clients import connection_metrics
+from sse import event_stream_response
 
 # Import database manager
 try:
@@ -1540,10 +1542,19 @@ def get_info():
             "extract_vectors": "/extract-vectors",
             "database_stats": "/database/stats",
             "database_recent": "/database/recent",
-            "database_search": "/database/search"
+            "database_search": "/database/search",
+            "http_metrics": "/metrics/http"
         }
     })
 
+@app.route('/metrics/http', methods=['GET'])
+def get_http_metrics():
+    """Get request and connection reuse counts of the shared HTTP clients"""
+    return jsonify({
+        "success": True,
+        "http_clients": connection_metrics()
+    })
+
 # Database endpoints
 @app.route('/database/stats', methods=['GET'])
 def get_database_stats():
@@ -1764,6 +1775,9 @@ def query_knowledge_with_gpt():
         if limit > 10:
             limit = 10
         
+        if data.get('stream'):
+            return event_stream_response(knowledge_db_manager.stream_knowledge_with_gpt(query_text, limit))
+        
         result = knowledge_db_manager.query_knowledge_with_gpt(query_text, limit)
         
         return jsonify(result)
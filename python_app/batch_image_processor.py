@@ -17,6 +17,9 @@ from typing import Dict, List, Any, Optional, Tuple
 from urllib.parse import urlparse, parse_qs
 import re
 
+from rate_limiter import RATE_LIMIT_RETRIES, openai_limiter, estimate_request_tokens
+from http_clients import aiohttp_session, close_aiohttp_session
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -338,7 +341,7 @@ class BatchImageProcessor:
             return None, 'error', url
 
     async def analyze_image(self, session: aiohttp.ClientSession, 
-                           image_data: bytes, url: str, content_type: str) -> Dict[str, Any]:
+                           image_data: bytes, url: str, content_type: str, attempt: int = 0) -> Dict[str, Any]:
         """Analyze image with GPT-4o"""
         headers = {
             "Content-Type": "application/json",
@@ -381,11 +384,17 @@ Return the analysis in structured JSON format."""
         }
 
         try:
+            limiter = openai_limiter(payload["model"])
+            await limiter.acquire_async(estimate_request_tokens(payload))
             async with session.post(
                 "https://api.openai.com/v1/chat/completions",
                 headers=headers,
                 json=payload
             ) as response:
+                limiter.observe(response.status, response.headers)
+                if response.status == 429 and attempt < RATE_LIMIT_RETRIES:
+                    # the limiter has paused for Retry-After; send again
+                    return await self.analyze_image(session, image_data, url, content_type, attempt + 1)
                 if response.status == 200:
                     result = await response.json()
                     content = result['choices'][0]['message']['content']
@@ -498,49 +507,46 @@ Return the analysis in structured JSON format."""
         
         self.stats['start_time'] = datetime.now()
         
-        async with aiohttp.ClientSession() as session:
-            for i, image_info in enumerate(images[:max_images]):
-                if i % 10 == 0:
-                    logger.info(f"Processing image {i+1}/{min(len(images), max_images)}")
+        session = await aiohttp_session()
+        for i, image_info in enumerate(images[:max_images]):
+            if i % 10 == 0:
+                logger.info(f"Processing image {i+1}/{min(len(images), max_images)}")
+            
+            try:
+                # Download image
+                image_data, image_type, original_url = await self.download_image(
+                    session, image_info['url']
+                )
                 
-                try:
-                    # Download image
-                    image_data, image_type, original_url = await self.download_image(
-                        session, image_info['url']
-                    )
-                    
-                    if image_data is None:
-                        logger.warning(f"Failed to download: {original_url}")
-                        self.stats['errors'] += 1
-                        continue
-                    
-                    # Store image data for database
-                    image_info['image_data'] = image_data
-                    image_info['image_type'] = image_type
-                    
-                    # Analyze image
-                    analysis_result = await self.analyze_image(
-                        session, image_data, original_url, image_type
-                    )
-                    
-                    if analysis_result['status'] == 'success':
-                        # Save to database
-                        if self.save_image_to_database(image_info, analysis_result):
-                            self.stats['successful'] += 1
-                        else:
-                            self.stats['errors'] += 1
+                if image_data is None:
+                    logger.warning(f"Failed to download: {original_url}")
+                    self.stats['errors'] += 1
+                    continue
+                
+                # Store image data for database
+                image_info['image_data'] = image_data
+                image_info['image_type'] = image_type
+                
+                # Analyze image
+                analysis_result = await self.analyze_image(
+                    session, image_data, original_url, image_type
+                )
+                
+                if analysis_result['status'] == 'success':
+                    # Save to database
+                    if self.save_image_to_database(image_info, analysis_result):
+                        self.stats['successful'] += 1
                     else:
-                        logger.error(f"Analysis failed for {original_url}: {analysis_result.get('error')}")
                         self.stats['errors'] += 1
-                    
-                    self.stats['processed'] += 1
-                    
-                    # Small delay to avoid rate limiting
-                    await asyncio.sleep(1)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing image {image_info['url']}: {e}")
+                else:
+                    logger.error(f"Analysis failed for {original_url}: {analysis_result.get('error')}")
                     self.stats['errors'] += 1
+                
+                self.stats['processed'] += 1
+                
+            except Exception as e:
+                logger.error(f"Error processing image {image_info['url']}: {e}")
+                self.stats['errors'] += 1
         
         self.stats['end_time'] = datetime.now()
         return self.stats
@@ -617,6 +623,7 @@ async def main():
         logger.error(f"Batch processing failed: {e}")
     finally:
         processor.disconnect_db()
+        await close_aiohttp_session()
 
 if __name__ == "__main__":
     asyncio.run(main())
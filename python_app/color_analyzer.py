@@ -202,6 +202,73 @@ def extract_colors_from_image(image_array, max_colors=20):
     
     return colors
 
+# 5 bits per channel: fine enough for dominant-color clustering, small enough to merge across tiles
+HISTOGRAM_BITS = 5
+
+def color_histogram(image_array, bits=HISTOGRAM_BITS):
+    """Quantized RGB histogram of an image; histograms of tiles add up to the page histogram"""
+    shift = 8 - bits
+    q = (image_array[:, :, :3] >> shift).astype(np.int32)
+    index = (q[:, :, 0] << (2 * bits)) | (q[:, :, 1] << bits) | q[:, :, 2]
+    return np.bincount(index.ravel(), minlength=1 << (3 * bits)).astype(np.int64)
+
+def extract_colors_from_histogram(histogram, max_colors=20, bits=HISTOGRAM_BITS):
+    """Dominant colors from a quantized histogram, clustered like extract_colors_from_image"""
+    colors = []
+    try:
+        from sklearn.cluster import KMeans
+        
+        occupied = np.nonzero(histogram)[0]
+        weights = histogram[occupied].astype(np.float64)
+        total = float(weights.sum())
+        mask = (1 << bits) - 1
+        # bin centers in 0..255
+        half = 1 << (8 - bits - 1)
+        centers = np.stack([
+            ((occupied >> (2 * bits)) & mask) << (8 - bits),
+            ((occupied >> bits) & mask) << (8 - bits),
+            (occupied & mask) << (8 - bits),
+        ], axis=1).astype(np.float64) + half
+        
+        if len(occupied) > max_colors:
+            kmeans = KMeans(n_clusters=max_colors, random_state=42, n_init=10)
+            kmeans.fit(centers, sample_weight=weights)
+            cluster_centers = kmeans.cluster_centers_
+            cluster_counts = np.bincount(kmeans.labels_, weights=weights, minlength=max_colors)
+        else:
+            cluster_centers, cluster_counts = centers, weights
+        
+        for center, count in zip(cluster_centers, cluster_counts):
+            r, g, b = int(center[0]), int(center[1]), int(center[2])
+            colors.append({
+                "rgb": [r, g, b],
+                "hex": rgb_to_hex(r, g, b),
+                "name": get_color_name(r, g, b),
+                "count": int(count),
+                "percentage": float(count / total * 100) if total else 0.0
+            })
+        
+        colors.sort(key=lambda x: x["count"], reverse=True)
+        
+    except Exception as e:
+        logger.error(f"Error in histogram color extraction: {e}")
+    
+    return colors
+
+def extract_colors_from_page_tiled(page, zoom, max_colors, enhance=False):
+    """Dominant page colors for pages too large to render at once: per-tile histograms, merged"""
+    from tiled_render import iter_tiles
+    import cv2
+    
+    histogram = None
+    for tile in iter_tiles(page, zoom):
+        tile_array = tile["array"]
+        if enhance:
+            tile_array = cv2.convertScaleAbs(tile_array, alpha=1.2, beta=10)
+        tile_hist = color_histogram(tile_array)
+        histogram = tile_hist if histogram is None else histogram + tile_hist
+    return extract_colors_from_histogram(histogram, max_colors=max_colors) if histogram is not None else []
+
 def extract_colors_from_pdf_comprehensive(pdf_path):
     """Comprehensive color extraction from PDF using multiple methods"""
     
@@ -211,6 +278,7 @@ def extract_colors_from_pdf_comprehensive(pdf_path):
     from PIL import Image
     import pdfplumber
     from sklearn.cluster import KMeans
+    from tiled_render import fits_budget
     
     all_colors = []
     color_sources = {
@@ -228,21 +296,25 @@ def extract_colors_from_pdf_comprehensive(pdf_path):
         for page_num in range(len(doc)):
             page = doc[page_num]
             
-            # Convert page to image for color analysis
-            mat = fitz.Matrix(2.0, 2.0)  # Higher resolution for better color detection
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Convert to numpy array
-            img_array = np.frombuffer(pix.samples, dtype=np.uint8).reshape(
-                pix.height, pix.width, pix.n
-            )
-            
-            # Convert RGBA to RGB if necessary
-            if pix.n == 4:
-                img_array = img_array[:, :, :3]
-            
-            # Extract colors from the page image
-            page_colors = extract_colors_from_image(img_array, max_colors=15)
+            if not fits_budget(page, 2.0):
+                # Poster-size page: merge per-tile histograms instead of one huge pixmap
+                page_colors = extract_colors_from_page_tiled(page, 2.0, max_colors=15)
+            else:
+                # Convert page to image for color analysis
+                mat = fitz.Matrix(2.0, 2.0)  # Higher resolution for better color detection
+                pix = page.get_pixmap(matrix=mat)
+                
+                # Convert to numpy array
+                img_array = np.frombuffer(pix.samples, dtype=np.uint8).reshape(
+                    pix.height, pix.width, pix.n
+                )
+                
+                # Convert RGBA to RGB if necessary
+                if pix.n == 4:
+                    img_array = img_array[:, :, :3]
+                
+                # Extract colors from the page image
+                page_colors = extract_colors_from_image(img_array, max_colors=15)
             
             for color in page_colors:
                 color["source"] = "page_image"
@@ -337,22 +409,26 @@ def extract_colors_from_pdf_comprehensive(pdf_path):
         for page_num in range(len(doc)):
             page = doc[page_num]
             
-            # Convert to high-resolution image
-            mat = fitz.Matrix(3.0, 3.0)  # Very high resolution
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Convert to PIL Image
-            img_data = pix.tobytes("ppm")
-            pil_image = Image.open(io.BytesIO(img_data))
-            
-            # Convert to OpenCV format
-            opencv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-            
-            # Apply color enhancement
-            enhanced = cv2.convertScaleAbs(opencv_image, alpha=1.2, beta=10)
-            
-            # Extract colors from enhanced image
-            enhanced_colors = extract_colors_from_image(enhanced, max_colors=10)
+            if not fits_budget(page, 3.0):
+                # Poster-size page: enhance and histogram tile by tile
+                enhanced_colors = extract_colors_from_page_tiled(page, 3.0, max_colors=10, enhance=True)
+            else:
+                # Convert to high-resolution image
+                mat = fitz.Matrix(3.0, 3.0)  # Very high resolution
+                pix = page.get_pixmap(matrix=mat)
+                
+                # Convert to PIL Image
+                img_data = pix.tobytes("ppm")
+                pil_image = Image.open(io.BytesIO(img_data))
+                
+                # Stay in RGB like the tiled path: extract_colors_from_image reads pixels as RGB
+                rgb_image = np.array(pil_image.convert("RGB"))
+                
+                # Apply color enhancement
+                enhanced = cv2.convertScaleAbs(rgb_image, alpha=1.2, beta=10)
+                
+                # Extract colors from enhanced image
+                enhanced_colors = extract_colors_from_image(enhanced, max_colors=10)
             
             for color in enhanced_colors:
                 color["source"] = "opencv_enhanced"
@@ -0,0 +1,113 @@
+"""
+Content-addressed store for image crops.
+
+Crops are written once under the SHA-256 of their encoded bytes, so identical
+crops share a file, names are deterministic, and a name never changes content -
+which makes them safe to serve with a long-lived Cache-Control and a strong
+ETag. The store directory is kept under a byte budget by evicting the least
+recently used files.
+
+Shared by image-profile-service and logo-profile-service (mounted read-only at
+/brandchecker_app, see docker-compose.yml).
+"""
+
+import os
+import re
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = int(os.getenv("CROP_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+SWEEP_EVERY = int(os.getenv("CROP_STORE_SWEEP_EVERY", "50"))
+CACHE_MAX_AGE = 365 * 24 * 3600
+
+# only files written by the store are ever evicted
+_STORED_NAME = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,5}$")
+
+_lock = threading.Lock()
+_writes_since_sweep: Dict[str, int] = {}
+
+
+def content_name(data: bytes, ext: str) -> str:
+    return f"{hashlib.sha256(data).hexdigest()}.{ext.lower().lstrip('.')}"
+
+
+def store_bytes(root: str, data: bytes, ext: str = "png", max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, Any]:
+    """Store encoded image bytes under their content hash; returns name, path, sha256, size and whether it was new."""
+    os.makedirs(root, exist_ok=True)
+    name = content_name(data, ext)
+    path = os.path.join(root, name)
+    created = False
+    if os.path.exists(path):
+        # refresh recency for LRU eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+    else:
+        fd, tmp = tempfile.mkstemp(dir=root, prefix=".crop-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+            created = True
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        _maybe_sweep(root, max_bytes)
+    return {"name": name, "path": path, "sha256": name.split(".", 1)[0], "size_bytes": len(data), "created": created}
+
+
+def _maybe_sweep(root: str, max_bytes: int) -> None:
+    with _lock:
+        n = _writes_since_sweep.get(root, 0) + 1
+        _writes_since_sweep[root] = 0 if n >= SWEEP_EVERY else n
+    if n >= SWEEP_EVERY:
+        evict_lru(root, max_bytes)
+
+
+def evict_lru(root: str, max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, int]:
+    """Delete least recently used stored crops until the directory is within max_bytes."""
+    entries = []
+    total = 0
+    try:
+        with os.scandir(root) as it:
+            for entry in it:
+                if not entry.is_file() or not _STORED_NAME.match(entry.name):
+                    continue
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+    except FileNotFoundError:
+        return {"files": 0, "bytes": 0, "evicted": 0}
+    evicted = 0
+    if total > max_bytes:
+        entries.sort()
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                evicted += 1
+            except OSError:
+                continue
+        logger.info(f"Crop store {root}: evicted {evicted} files, {total} bytes remain")
+    return {"files": len(entries) - evicted, "bytes": total, "evicted": evicted}
+
+
+def send_stored_file(directory: str, filename: str):
+    """Flask response for a stored file: immutable caching and a content-hash ETag for
+    content-addressed names, Flask's default conditional handling for anything else."""
+    from flask import send_from_directory
+    base = os.path.basename(filename)
+    if _STORED_NAME.match(base):
+        resp = send_from_directory(directory, filename, etag=base.split(".", 1)[0], max_age=CACHE_MAX_AGE)
+        resp.headers["Cache-Control"] = f"public, max-age={CACHE_MAX_AGE}, immutable"
+        return resp
+    return send_from_directory(directory, filename)
@@ -4,16 +4,44 @@ import logging
 import numpy as np
 from collections import defaultdict, Counter
 import fitz  # PyMuPDF
-from PIL import Image
 import cv2
-import io
+import time
 from sklearn.cluster import KMeans
 from sklearn.metrics.pairwise import euclidean_distances
+from functools import cached_property
+from page_triage import triage_pdf, wants_raster_analysis, triage_report, LOGO_PAGE_CLASSES
+from tiled_render import render_clip
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+RENDER_ZOOM = 2  # 2x zoom for better quality
+
+class PageRaster:
+    """One render of a page plus the images derived from it, each computed on first use.
+    
+    All raster methods of a page share one instance; regions of interest and dominant
+    colors are cached here too, since every logo pattern needs the same ones.
+    """
+    
+    def __init__(self, page, zoom=RENDER_ZOOM):
+        self.bgr = cv2.cvtColor(render_clip(page, zoom, None), cv2.COLOR_RGB2BGR)
+        self.regions_of_interest = None
+        self.dominant_colors = None
+    
+    @cached_property
+    def hsv(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV)
+    
+    @cached_property
+    def gray(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+    
+    @cached_property
+    def edges(self):
+        return cv2.Canny(self.gray, 50, 150)
+
 class CustomLogoDetector:
     """Custom logo detection system using multiple approaches"""
     
@@ -32,6 +60,8 @@ class CustomLogoDetector:
                 "aspect_ratio": (0.5, 3.0)
             }
         }
+        # Set for the duration of detect_logos_in_pdf; raster methods skip pages it rules out
+        self.page_triage = None
     
     def detect_logos_in_pdf(self, pdf_path):
         """Main method to detect logos in PDF using custom approaches"""
@@ -47,89 +77,98 @@ class CustomLogoDetector:
                 "analysis_summary": {}
             }
             
-            # Method 1: Color-based logo detection
-            color_logos = self.detect_logos_by_color(pdf_path)
-            detection_results["logos"].extend(color_logos)
-            
-            # Method 2: Region-based logo detection
-            region_logos = self.detect_logos_by_region(pdf_path)
-            detection_results["logos"].extend(region_logos)
+            # Triage: blank pages are skipped by the raster methods (a letterhead logo sits on a text page)
+            self.page_triage = triage_pdf(pdf_path)
+            raster_seconds = 0.0
             
-            # Method 3: Pattern-based logo detection
-            pattern_logos = self.detect_logos_by_pattern(pdf_path)
-            detection_results["logos"].extend(pattern_logos)
+            # Methods 1-3 and 5 (color, region, pattern, pixel) share one render per page
+            start = time.perf_counter()
+            color_logos, region_logos, pattern_logos, pixel_logos = self.detect_logos_on_rendered_pages(
+                pdf_path, [self.detect_logos_by_color_on_page, self.detect_logos_by_region_on_page,
+                           self.detect_logos_by_pattern_on_page, self.detect_logos_by_pixel_analysis_on_page])
+            raster_seconds += time.perf_counter() - start
             
             # Method 4: Content-stream logo detection
             content_logos = self.detect_logos_in_content_stream(pdf_path)
-            detection_results["logos"].extend(content_logos)
             
-            # Method 5: Pixel-based logo detection
-            pixel_logos = self.detect_logos_by_pixel_analysis(pdf_path)
-            detection_results["logos"].extend(pixel_logos)
+            for logos in (color_logos, region_logos, pattern_logos, content_logos, pixel_logos):
+                detection_results["logos"].extend(logos)
             
             # Combine and rank results
             detection_results["analysis_summary"] = self.analyze_detection_results(detection_results)
+            detection_results["page_triage"] = triage_report(
+                self.page_triage, raster_seconds, len(self.page_triage["pages"]), LOGO_PAGE_CLASSES)
             
             return detection_results
             
         except Exception as e:
             logger.error(f"Error in custom logo detection: {e}")
             return {"error": str(e)}
+        finally:
+            self.page_triage = None
     
-    def detect_logos_by_color(self, pdf_path):
-        """Detect logos based on color analysis"""
+    def detect_logos_on_rendered_pages(self, pdf_path, page_methods):
+        """Run per-page raster methods over the PDF, rendering each page once for all of them.
+        
+        Returns one list of logos per method. Pages ruled out by the triage are skipped.
+        """
         
+        results = [[] for _ in page_methods]
+        doc = fitz.open(pdf_path)
         try:
-            logos = []
-            doc = fitz.open(pdf_path)
-            
             for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Convert page to image
-                mat = fitz.Matrix(2, 2)  # 2x zoom for better quality
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Convert to PIL Image
-                img_data = pix.tobytes("png")
-                pil_image = Image.open(io.BytesIO(img_data))
-                
-                # Convert to OpenCV format
-                cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+                if not wants_raster_analysis(self.page_triage, page_num, LOGO_PAGE_CLASSES):
+                    continue
                 
-                # Analyze colors
-                color_regions = self.analyze_color_regions(cv_image)
-                
-                for region in color_regions:
-                    if self.is_logo_color_region(region):
-                        logo_info = {
-                            "type": "color_based_logo",
-                            "page": page_num + 1,
-                            "rect": region["bbox"],
-                            "colors": region["colors"],
-                            "confidence": region["confidence"],
-                            "detection_method": "color_analysis",
-                            "area": region["area"],
-                            "center_x": region["center_x"],
-                            "center_y": region["center_y"]
-                        }
-                        logos.append(logo_info)
-            
+                raster = PageRaster(doc[page_num])
+                for logos, page_method in zip(results, page_methods):
+                    try:
+                        logos.extend(page_method(raster, page_num))
+                    except Exception as e:
+                        logger.error(f"Error in {page_method.__name__} on page {page_num + 1}: {e}")
+        finally:
             doc.close()
-            return logos
+        return results
+    
+    def detect_logos_by_color(self, pdf_path):
+        """Detect logos based on color analysis"""
+        
+        try:
+            return self.detect_logos_on_rendered_pages(pdf_path, [self.detect_logos_by_color_on_page])[0]
             
         except Exception as e:
             logger.error(f"Error in color-based logo detection: {e}")
             return []
     
-    def analyze_color_regions(self, cv_image):
+    def detect_logos_by_color_on_page(self, raster, page_num):
+        """Color-based logo detection on one rendered page"""
+        
+        logos = []
+        for region in self.analyze_color_regions(raster.bgr, hsv=raster.hsv):
+            if self.is_logo_color_region(region):
+                logo_info = {
+                    "type": "color_based_logo",
+                    "page": page_num + 1,
+                    "rect": region["bbox"],
+                    "colors": region["colors"],
+                    "confidence": region["confidence"],
+                    "detection_method": "color_analysis",
+                    "area": region["area"],
+                    "center_x": region["center_x"],
+                    "center_y": region["center_y"]
+                }
+                logos.append(logo_info)
+        return logos
+    
+    def analyze_color_regions(self, cv_image, hsv=None):
         """Analyze image for color regions that might be logos"""
         
         try:
             regions = []
             
             # Convert to HSV for better color analysis
-            hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
+            if hsv is None:
+                hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
             
             # Define color ranges for logo colors
             color_ranges = {
@@ -230,55 +269,53 @@ class CustomLogoDetector:
         """Detect logos based on region analysis"""
         
         try:
-            logos = []
-            doc = fitz.open(pdf_path)
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Convert page to image
-                mat = fitz.Matrix(2, 2)
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-                pil_image = Image.open(io.BytesIO(img_data))
-                cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-                
-                # Find regions of interest
-                regions = self.find_regions_of_interest(cv_image)
-                
-                for region in regions:
-                    if self.is_logo_region(region):
-                        logo_info = {
-                            "type": "region_based_logo",
-                            "page": page_num + 1,
-                            "rect": region["bbox"],
-                            "confidence": region["confidence"],
-                            "detection_method": "region_analysis",
-                            "area": region["area"],
-                            "center_x": region["center_x"],
-                            "center_y": region["center_y"],
-                            "region_type": region["type"]
-                        }
-                        logos.append(logo_info)
-            
-            doc.close()
-            return logos
+            return self.detect_logos_on_rendered_pages(pdf_path, [self.detect_logos_by_region_on_page])[0]
             
         except Exception as e:
             logger.error(f"Error in region-based logo detection: {e}")
             return []
     
-    def find_regions_of_interest(self, cv_image):
+    def detect_logos_by_region_on_page(self, raster, page_num):
+        """Region-based logo detection on one rendered page"""
+        
+        logos = []
+        for region in self.page_regions_of_interest(raster):
+            if self.is_logo_region(region):
+                logo_info = {
+                    "type": "region_based_logo",
+                    "page": page_num + 1,
+                    "rect": region["bbox"],
+                    "confidence": region["confidence"],
+                    "detection_method": "region_analysis",
+                    "area": region["area"],
+                    "center_x": region["center_x"],
+                    "center_y": region["center_y"],
+                    "region_type": region["type"]
+                }
+                logos.append(logo_info)
+        return logos
+    
+    def page_regions_of_interest(self, raster):
+        """Regions of interest of a rendered page, computed once per page"""
+        
+        if raster.regions_of_interest is None:
+            raster.regions_of_interest = self.find_regions_of_interest(
+                raster.bgr, gray=raster.gray, edges=raster.edges)
+        return raster.regions_of_interest
+    
+    def find_regions_of_interest(self, cv_image, gray=None, edges=None):
         """Find regions that might contain logos"""
         
         try:
             regions = []
             
             # Convert to grayscale
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+            if gray is None:
+                gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
             
             # Edge detection
-            edges = cv2.Canny(gray, 50, 150)
+            if edges is None:
+                edges = cv2.Canny(gray, 50, 150)
             
             # Find contours
             contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -289,7 +326,7 @@ class CustomLogoDetector:
                     x, y, w, h = cv2.boundingRect(contour)
                     
                     # Analyze region characteristics
-                    region_type = self.classify_region(cv_image, x, y, w, h)
+                    region_type = self.classify_region(cv_image, x, y, w, h, gray=gray)
                     confidence = self.calculate_region_confidence(area, x, y, w, h, cv_image.shape, region_type)
                     
                     if confidence > 0.4:
@@ -311,7 +348,7 @@ class CustomLogoDetector:
             logger.error(f"Error finding regions of interest: {e}")
             return []
     
-    def classify_region(self, cv_image, x, y, w, h):
+    def classify_region(self, cv_image, x, y, w, h, gray=None):
         """Classify a region based on its characteristics"""
         
         try:
@@ -319,7 +356,10 @@ class CustomLogoDetector:
             region = cv_image[y:y+h, x:x+w]
             
             # Calculate features
-            gray_region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+            if gray is not None:
+                gray_region = gray[y:y+h, x:x+w]
+            else:
+                gray_region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
             
             # Edge density
             edges = cv2.Canny(gray_region, 50, 150)
@@ -399,52 +439,55 @@ class CustomLogoDetector:
         """Detect logos based on pattern matching"""
         
         try:
-            logos = []
-            doc = fitz.open(pdf_path)
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Convert page to image
-                mat = fitz.Matrix(2, 2)
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-                pil_image = Image.open(io.BytesIO(img_data))
-                cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-                
-                # Pattern matching for known logos
-                for pattern_name, pattern in self.logo_patterns.items():
-                    matches = self.match_logo_pattern(cv_image, pattern)
-                    
-                    for match in matches:
-                        logo_info = {
-                            "type": f"pattern_based_{pattern_name}",
-                            "page": page_num + 1,
-                            "rect": match["bbox"],
-                            "confidence": match["confidence"],
-                            "detection_method": "pattern_matching",
-                            "pattern": pattern_name,
-                            "area": match["area"],
-                            "center_x": match["center_x"],
-                            "center_y": match["center_y"]
-                        }
-                        logos.append(logo_info)
-            
-            doc.close()
-            return logos
+            return self.detect_logos_on_rendered_pages(pdf_path, [self.detect_logos_by_pattern_on_page])[0]
             
         except Exception as e:
             logger.error(f"Error in pattern-based logo detection: {e}")
             return []
     
-    def match_logo_pattern(self, cv_image, pattern):
-        """Match a logo pattern in the image"""
+    def detect_logos_by_pattern_on_page(self, raster, page_num):
+        """Pattern-based logo detection on one rendered page"""
+        
+        logos = []
+        
+        # Dominant colors and regions are the same for every pattern
+        if raster.dominant_colors is None:
+            raster.dominant_colors = self.extract_dominant_colors(raster.bgr)
+        regions = self.page_regions_of_interest(raster)
+        
+        # Pattern matching for known logos
+        for pattern_name, pattern in self.logo_patterns.items():
+            matches = self.match_logo_pattern(
+                raster.bgr, pattern, dominant_colors=raster.dominant_colors, regions=regions)
+            
+            for match in matches:
+                logo_info = {
+                    "type": f"pattern_based_{pattern_name}",
+                    "page": page_num + 1,
+                    "rect": match["bbox"],
+                    "confidence": match["confidence"],
+                    "detection_method": "pattern_matching",
+                    "pattern": pattern_name,
+                    "area": match["area"],
+                    "center_x": match["center_x"],
+                    "center_y": match["center_y"]
+                }
+                logos.append(logo_info)
+        return logos
+    
+    def match_logo_pattern(self, cv_image, pattern, dominant_colors=None, regions=None):
+        """Match a logo pattern in the image.
+        
+        dominant_colors and regions can be passed in when several patterns are matched
+        against the same image.
+        """
         
         try:
             matches = []
             
             # Extract dominant colors from image
-            dominant_colors = self.extract_dominant_colors(cv_image)
+            if dominant_colors is None:
+                dominant_colors = self.extract_dominant_colors(cv_image)
             
             # Check if pattern colors are present
             color_matches = 0
@@ -455,7 +498,8 @@ class CustomLogoDetector:
             
             # If colors match, look for regions
             if color_matches > 0:
-                regions = self.find_regions_of_interest(cv_image)
+                if regions is None:
+                    regions = self.find_regions_of_interest(cv_image)
                 
                 for region in regions:
                     # Check if region matches pattern criteria
@@ -636,52 +680,41 @@ class CustomLogoDetector:
         """Detect logos by pixel-level analysis"""
         
         try:
-            logos = []
-            doc = fitz.open(pdf_path)
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Convert page to image
-                mat = fitz.Matrix(2, 2)
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-                pil_image = Image.open(io.BytesIO(img_data))
-                cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-                
-                # Pixel-level analysis
-                pixel_regions = self.analyze_pixel_patterns(cv_image)
-                
-                for region in pixel_regions:
-                    if self.is_logo_pixel_region(region):
-                        logo_info = {
-                            "type": "pixel_based_logo",
-                            "page": page_num + 1,
-                            "rect": region["bbox"],
-                            "confidence": region["confidence"],
-                            "detection_method": "pixel_analysis",
-                            "pixel_density": region["pixel_density"],
-                            "area": region["area"],
-                            "center_x": region["center_x"],
-                            "center_y": region["center_y"]
-                        }
-                        logos.append(logo_info)
-            
-            doc.close()
-            return logos
+            return self.detect_logos_on_rendered_pages(pdf_path, [self.detect_logos_by_pixel_analysis_on_page])[0]
             
         except Exception as e:
             logger.error(f"Error in pixel-based logo detection: {e}")
             return []
     
-    def analyze_pixel_patterns(self, cv_image):
+    def detect_logos_by_pixel_analysis_on_page(self, raster, page_num):
+        """Pixel-based logo detection on one rendered page"""
+        
+        logos = []
+        for region in self.analyze_pixel_patterns(raster.bgr, gray=raster.gray):
+            if self.is_logo_pixel_region(region):
+                logo_info = {
+                    "type": "pixel_based_logo",
+                    "page": page_num + 1,
+                    "rect": region["bbox"],
+                    "confidence": region["confidence"],
+                    "detection_method": "pixel_analysis",
+                    "pixel_density": region["pixel_density"],
+                    "area": region["area"],
+                    "center_x": region["center_x"],
+                    "center_y": region["center_y"]
+                }
+                logos.append(logo_info)
+        return logos
+    
+    def analyze_pixel_patterns(self, cv_image, gray=None):
         """Analyze pixel patterns for logo detection"""
         
         try:
             regions = []
             
             # Convert to grayscale
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+            if gray is None:
+                gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
             
             # Calculate pixel density
             kernel = np.ones((5, 5), np.uint8)
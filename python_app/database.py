@@ -283,6 +283,30 @@ class DatabaseManager:
             return [dict(row) for row in result]
         return []
     
+    def get_graphic_ai_analyses(self, phashes: List[str], model: str) -> Dict[str, Dict]:
+        """Stored AI analyses for perceptual hashes, keyed by hash"""
+        if not phashes:
+            return {}
+        query = """
+        UPDATE graphic_ai_analyses SET hit_count = hit_count + 1
+        WHERE phash = ANY(%s) AND model = %s
+        RETURNING phash, width, height, analysis, raw_response
+        """
+        
+        result = self.execute_query_with_returning(query, (list(phashes), model))
+        return {row['phash']: dict(row) for row in result or []}
+    
+    def save_graphic_ai_analysis(self, phash: str, model: str, width: int, height: int,
+                                 analysis: Dict, raw_response: str = None):
+        """Store the AI analysis of a graphic crop under its perceptual hash"""
+        query = """
+        INSERT INTO graphic_ai_analyses (phash, model, width, height, analysis, raw_response)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (phash, model) DO NOTHING
+        """
+        
+        return self.execute_query(query, (phash, model, width, height, Json(analysis), raw_response), fetch=False)
+    
     def cleanup_old_analyses(self, days: int = 30):
         """Clean up old analysis data"""
         query = """
@@ -0,0 +1,46 @@
+"""
+Request planning for batched embedding calls.
+
+The embeddings API takes an array of inputs per request (up to 2048 inputs and
+300k tokens). Texts are packed greedily, in order, into batches bounded by an
+input count and an estimated token total; callers send one request per batch
+and map `data[i].index` back to the positions returned here.
+
+Used by OpenAIEmbeddingService (embedding_service.py) and
+KnowledgeDatabaseManager (knowledge_database.py).
+"""
+
+import os
+from typing import List, Optional, Sequence
+
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "256"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "200000"))
+# no tokenizer here; ~3 characters per token over-estimates for English and German text
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def plan_batches(texts: Sequence[Optional[str]], max_inputs: Optional[int] = None,
+                 max_tokens: Optional[int] = None) -> List[List[int]]:
+    """Indices of the texts grouped into request batches, in order; None / empty texts are skipped."""
+    max_inputs = EMBEDDING_BATCH_MAX_INPUTS if max_inputs is None else max_inputs
+    max_tokens = EMBEDDING_BATCH_MAX_TOKENS if max_tokens is None else max_tokens
+
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= max_inputs or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
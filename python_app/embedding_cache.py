@@ -0,0 +1,96 @@
+"""
+Persistent embedding cache keyed by content hash, model and dimensions.
+
+Re-embedding unchanged text costs an API call per chunk for a vector we
+already have. Vectors are stored in the embedding_cache table under
+(sha256 of the exact text sent, model, dimensions) and looked up in bulk
+before any API request; only the missing texts are sent. Every lookup hit
+increments the row's hit_count, so the table itself carries the hit / miss
+statistics shown by /api/embeddings/status.
+
+Used by OpenAIEmbeddingService (embedding_service.py) and
+KnowledgeDatabaseManager (knowledge_database.py) with their own psycopg2
+connections.
+"""
+
+import os
+import hashlib
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") != "0"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_cached_embeddings(connection, hashes: Sequence[str], model: str, dimensions: int) -> Dict[str, List[float]]:
+    """Cached vectors for the content hashes, keyed by hash; counts a hit on every row found"""
+    hashes = sorted(set(h for h in hashes if h))
+    if not hashes or not connection:
+        return {}
+    try:
+        with connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                UPDATE embedding_cache
+                SET hit_count = hit_count + 1, last_hit_at = CURRENT_TIMESTAMP
+                WHERE content_sha256 = ANY(%s) AND model = %s AND dimensions = %s
+                RETURNING content_sha256, embedding
+            """, (hashes, model, dimensions))
+            rows = cursor.fetchall()
+        connection.commit()
+        return {row['content_sha256']: list(row['embedding']) for row in rows}
+    except Exception as e:
+        logger.warning(f"Embedding cache lookup failed: {e}")
+        connection.rollback()
+        return {}
+
+
+def save_cached_embeddings(connection, embeddings: Dict[str, List[float]], model: str, dimensions: int):
+    """Store new vectors by content hash; vectors of other than `dimensions` length are skipped"""
+    rows = [(h, model, dimensions, embedding) for h, embedding in embeddings.items()
+            if embedding is not None and len(embedding) == dimensions]
+    if not rows or not connection:
+        return
+    try:
+        with connection.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO embedding_cache (content_sha256, model, dimensions, embedding)
+                VALUES %s
+                ON CONFLICT (content_sha256, model, dimensions) DO NOTHING
+            """, rows)
+        connection.commit()
+    except Exception as e:
+        logger.warning(f"Embedding cache write failed: {e}")
+        connection.rollback()
+
+
+def missing_indices(hashes: Sequence[Optional[str]], cached: Dict[str, List[float]]) -> List[int]:
+    """Indices of the first text for every hash not in the cache (duplicates are embedded once)"""
+    seen = set(cached)
+    missing = []
+    for i, h in enumerate(hashes):
+        if h and h not in seen:
+            seen.add(h)
+            missing.append(i)
+    return missing
+
+
+def get_cache_stats(connection) -> List[Dict]:
+    """Entries and hits per model / dimensions; every entry was one miss embedded via the API"""
+    with connection.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT model, dimensions,
+                   COUNT(*) AS misses,
+                   COALESCE(SUM(hit_count), 0) AS hits,
+                   MAX(last_hit_at) AS last_hit_at
+            FROM embedding_cache
+            GROUP BY model, dimensions
+            ORDER BY model, dimensions
+        """)
+        return [dict(row) for row in cursor.fetchall()]
@@ -18,10 +18,28 @@ import colorsys
 from psycopg2.extras import RealDictCursor
 import time
 
+from embedding_batches import plan_batches
+from http_clients import aiohttp_session, close_aiohttp_session
+from rate_limiter import RATE_LIMIT_RETRIES, openai_limiter, estimate_request_tokens
+from embedding_cache import (EMBEDDING_CACHE_ENABLED, content_hash, get_cached_embeddings,
+                             save_cached_embeddings, missing_indices)
+from response_cache import (RESPONSE_CACHE_ENABLED, get_cached_response, save_cached_response,
+                            invalidate_cached_responses)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Parallel single-text requests when a batch request has to be retried item by item
+EMBEDDING_RETRY_CONCURRENCY = int(os.getenv("EMBEDDING_RETRY_CONCURRENCY", "4"))
+
+# Answers given instead of a generated one (never stored in the response cache)
+NO_RESULTS_ANSWER = "Keine relevanten Informationen zu Ihrer Anfrage gefunden."
+REQUEST_FAILED_ANSWER = "Entschuldigung, ich konnte Ihre Anfrage nicht verarbeiten."
+ERROR_ANSWER = "Entschuldigung, es ist ein Fehler aufgetreten."
+STREAM_ERROR_ANSWER = "Entschuldigung, ich konnte keine Antwort generieren."
+FALLBACK_ANSWERS = {NO_RESULTS_ANSWER, REQUEST_FAILED_ANSWER, ERROR_ANSWER, STREAM_ERROR_ANSWER}
+
 class OpenAIEmbeddingService:
     def __init__(self, db_config: Dict[str, str]):
         """Initialize the embedding service"""
@@ -115,32 +133,32 @@ class OpenAIEmbeddingService:
         try:
             model = self.fallback_embedding_model if use_fallback else self.embedding_model
             
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "model": model,
-                    "input": text,
-                    "encoding_format": "float"
-                }
-                
-                async with session.post(
-                    "https://api.openai.com/v1/embeddings",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json=payload
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data['data'][0]['embedding']
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Embedding API error ({response.status}): {error_text}")
-                        if not use_fallback and self.embedding_model != self.fallback_embedding_model:
-                            logger.info(f"Trying fallback model: {self.fallback_embedding_model}")
-                            return await self.create_embedding(text, use_fallback=True)
-                        return None
-                        
+            session = await aiohttp_session()
+            payload = {
+                "model": model,
+                "input": text,
+                "encoding_format": "float"
+            }
+            
+            async with session.post(
+                "https://api.openai.com/v1/embeddings",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json=payload
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return data['data'][0]['embedding']
+                else:
+                    error_text = await response.text()
+                    logger.error(f"Embedding API error ({response.status}): {error_text}")
+                    if not use_fallback and self.embedding_model != self.fallback_embedding_model:
+                        logger.info(f"Trying fallback model: {self.fallback_embedding_model}")
+                        return await self.create_embedding(text, use_fallback=True)
+                    return None
+                    
         except Exception as e:
             logger.error(f"Error creating embedding: {e}")
             if not use_fallback and self.embedding_model != self.fallback_embedding_model:
@@ -154,7 +172,8 @@ class OpenAIEmbeddingService:
             self.connection.close()
             logger.info("Disconnected from database")
     
-    async def create_embedding(self, text: str, session: aiohttp.ClientSession, use_fallback: bool = False) -> Optional[List[float]]:
+    async def create_embedding(self, text: str, session: aiohttp.ClientSession, use_fallback: bool = False,
+                               attempt: int = 0) -> Optional[List[float]]:
         """Create embedding for a single text with fallback support"""
         try:
             # Clean and truncate text
@@ -176,11 +195,14 @@ class OpenAIEmbeddingService:
             if model == "text-embedding-3-large":
                 payload["dimensions"] = self.embedding_dimensions
             
+            limiter = openai_limiter(model)
+            await limiter.acquire_async(estimate_request_tokens(payload))
             async with session.post(
                 f"{self.base_url}/embeddings",
                 headers=self.headers,
                 json=payload
             ) as response:
+                limiter.observe(response.status, response.headers)
                 if response.status == 200:
                     data = await response.json()
                     return data['data'][0]['embedding']
@@ -188,6 +210,9 @@ class OpenAIEmbeddingService:
                     # Model not available, try fallback
                     logger.warning(f"Model {model} not available, trying fallback...")
                     return await self.create_embedding(text, session, use_fallback=True)
+                elif response.status == 429 and attempt < RATE_LIMIT_RETRIES:
+                    # the limiter has paused for Retry-After; send again
+                    return await self.create_embedding(text, session, use_fallback, attempt + 1)
                 else:
                     error_text = await response.text()
                     logger.error(f"OpenAI API error: {response.status} - {error_text}")
@@ -197,21 +222,110 @@ class OpenAIEmbeddingService:
             logger.error(f"Failed to create embedding: {e}")
             return None
     
+    async def create_embeddings_request(self, texts: List[str], session: aiohttp.ClientSession,
+                                        use_fallback: bool = False, attempt: int = 0) -> Optional[List[List[float]]]:
+        """Create embeddings for several texts with one API request; None if the request fails"""
+        try:
+            # Choose model (with fallback)
+            model = self.fallback_embedding_model if use_fallback else self.embedding_model
+            
+            payload = {
+                "model": model,
+                "input": texts,
+                "encoding_format": "float"
+            }
+            
+            # For text-embedding-3-large, we can specify dimensions
+            if model == "text-embedding-3-large":
+                payload["dimensions"] = self.embedding_dimensions
+            
+            limiter = openai_limiter(model)
+            await limiter.acquire_async(estimate_request_tokens(payload))
+            async with session.post(
+                f"{self.base_url}/embeddings",
+                headers=self.headers,
+                json=payload
+            ) as response:
+                limiter.observe(response.status, response.headers)
+                if response.status == 200:
+                    data = await response.json()
+                    embeddings = [None] * len(texts)
+                    for item in data['data']:
+                        embeddings[item['index']] = item['embedding']
+                    return embeddings
+                elif response.status == 404 and not use_fallback:
+                    # Model not available, try fallback
+                    logger.warning(f"Model {model} not available, trying fallback...")
+                    return await self.create_embeddings_request(texts, session, use_fallback=True)
+                elif response.status == 429 and attempt < RATE_LIMIT_RETRIES:
+                    # the limiter has paused for Retry-After; send the batch again
+                    return await self.create_embeddings_request(texts, session, use_fallback, attempt + 1)
+                else:
+                    error_text = await response.text()
+                    logger.error(f"OpenAI API error for batch of {len(texts)}: {response.status} - {error_text}")
+                    return None
+                    
+        except Exception as e:
+            logger.error(f"Failed to create embeddings for batch of {len(texts)}: {e}")
+            return None
+    
+    async def _create_embedding_limited(self, text: str, session: aiohttp.ClientSession,
+                                        limit: asyncio.Semaphore) -> Optional[List[float]]:
+        async with limit:
+            return await self.create_embedding(text, session)
+    
     async def create_embeddings_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
-        """Create embeddings for multiple texts in parallel"""
-        embeddings = []
+        """Create embeddings for multiple texts, many texts per API request.
+        
+        Texts are packed into requests by plan_batches (EMBEDDING_BATCH_MAX_INPUTS inputs /
+        EMBEDDING_BATCH_MAX_TOKENS estimated tokens); texts of a failed request are retried one by one.
+        Texts already in the embedding cache (with a database connection) are not sent at all.
+        Returns one embedding (or None) per text, in order.
+        """
+        # Clean and truncate texts as create_embedding does
+        prepared = [text.strip()[:8000] if text else "" for text in texts]
+        prepared = [text if len(text) >= 10 else None for text in prepared]
+        hashes = [content_hash(text) if text else None for text in prepared]
         
-        async with aiohttp.ClientSession() as session:
-            tasks = [self.create_embedding(text, session) for text in texts]
-            embeddings = await asyncio.gather(*tasks, return_exceptions=True)
+        use_cache = EMBEDDING_CACHE_ENABLED and self.connection is not None
+        # database work runs in a worker thread: this coroutine may run on the shared event loop
+        cached = await asyncio.to_thread(get_cached_embeddings, self.connection, hashes, self.embedding_model,
+                                         self.embedding_dimensions) if use_cache else {}
+        todo = missing_indices(hashes, cached)
+        if use_cache:
+            logger.info(f"Embedding cache: {len(cached)} cached, {len(todo)} to embed")
+        created: Dict[str, List[float]] = {}
+        
+        # bounds the one-by-one retries of failed batches
+        retry_limit = asyncio.Semaphore(EMBEDDING_RETRY_CONCURRENCY)
+        
+        session = await aiohttp_session()
+        batches = [[todo[j] for j in batch] for batch in plan_batches([prepared[i] for i in todo])]
+        for n, batch in enumerate(batches):
+            logger.info(f"Embedding request {n + 1}/{len(batches)} ({len(batch)} texts)")
+            batch_embeddings = await self.create_embeddings_request([prepared[i] for i in batch], session)
+            
+            if batch_embeddings is None:
+                # Retry the texts individually so one bad input does not lose the batch
+                logger.warning(f"Embedding request {n + 1} failed, retrying {len(batch)} texts individually")
+                batch_embeddings = await asyncio.gather(
+                    *[self._create_embedding_limited(prepared[i], session, retry_limit) for i in batch],
+                    return_exceptions=True
+                )
             
-            # Handle exceptions
-            for i, emb in enumerate(embeddings):
+            for i, emb in zip(batch, batch_embeddings):
                 if isinstance(emb, Exception):
                     logger.error(f"Embedding failed for text {i}: {emb}")
-                    embeddings[i] = None
+                    emb = None
+                if emb is not None:
+                    created[hashes[i]] = emb
         
-        return embeddings
+        if use_cache:
+            # fallback-model vectors have other dimensions and are not cached
+            await asyncio.to_thread(save_cached_embeddings, self.connection, created, self.embedding_model,
+                                    self.embedding_dimensions)
+        
+        return [cached.get(h) or created.get(h) if h else None for h in hashes]
     
     def get_texts_for_embedding(self, brand_id: str) -> List[Dict[str, Any]]:
         """Get all texts that need embeddings"""
@@ -341,8 +455,8 @@ class OpenAIEmbeddingService:
         try:
             logger.info(f"Starting embedding process for brand {brand_id}")
             
-            # Get all texts
-            texts_data = self.get_texts_for_embedding(brand_id)
+            # Get all texts (database work in a worker thread, see create_embeddings_batch)
+            texts_data = await asyncio.to_thread(self.get_texts_for_embedding, brand_id)
             if not texts_data:
                 logger.warning("No texts found for embedding")
                 return False
@@ -350,34 +464,11 @@ class OpenAIEmbeddingService:
             # Extract texts and metadata
             texts = [item['content'] for item in texts_data]
             
-            # Create embeddings in batches
-            batch_size = 10  # OpenAI rate limit consideration
-            all_embeddings = []
+            # Create embeddings, many texts per request
+            embeddings = await self.create_embeddings_batch(texts)
             
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i + batch_size]
-                batch_data = texts_data[i:i + batch_size]
-                
-                logger.info(f"Processing batch {i//batch_size + 1}/{(len(texts) + batch_size - 1)//batch_size}")
-                
-                # Create embeddings
-                embeddings = await self.create_embeddings_batch(batch_texts)
-                
-                # Store embeddings in database
-                for j, (embedding, data) in enumerate(zip(embeddings, batch_data)):
-                    if embedding is not None:
-                        self.store_embedding(
-                            brand_id=brand_id,
-                            source_id=data['id'],
-                            chunk_type=data['chunk_type'],
-                            content=data['content'],
-                            metadata=data['metadata'],
-                            embedding=embedding
-                        )
-                
-                # Rate limiting
-                if i + batch_size < len(texts):
-                    await asyncio.sleep(1)
+            # Store embeddings in database
+            await asyncio.to_thread(self.store_embeddings, brand_id, texts_data, embeddings)
             
             logger.info("Embedding process completed successfully")
             return True
@@ -386,6 +477,23 @@ class OpenAIEmbeddingService:
             logger.error(f"Failed to process brand embeddings: {e}")
             return False
     
+    def store_embeddings(self, brand_id: str, texts_data: List[Dict[str, Any]],
+                         embeddings: List[Optional[List[float]]]):
+        """Store the created embeddings of a brand and drop the answers cached from its old chunks"""
+        for embedding, data in zip(embeddings, texts_data):
+            if embedding is not None:
+                self.store_embedding(
+                    brand_id=brand_id,
+                    source_id=data['id'],
+                    chunk_type=data['chunk_type'],
+                    content=data['content'],
+                    metadata=data['metadata'],
+                    embedding=embedding
+                )
+        
+        # Cached answers were built from the old chunks
+        invalidate_cached_responses(self.connection, "ask", brand_id)
+    
     def store_embedding(self, brand_id: str, source_id: str, chunk_type: str, 
                        content: str, metadata: Dict[str, Any], embedding: List[float]):
         """Store embedding in database"""
@@ -425,72 +533,91 @@ class OpenAIEmbeddingService:
             logger.error(f"Failed to store embedding: {e}")
             self.connection.rollback()
     
-    async def semantic_search(self, query: str, brand_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Perform semantic search using embeddings"""
+    async def embed_query(self, query: str) -> Optional[List[float]]:
+        """Embedding of a search query (through the embedding cache)"""
+        query_embeddings = await self.create_embeddings_batch([query])
+        return query_embeddings[0] if query_embeddings else None
+    
+    def search_chunks(self, query_embedding: List[float], brand_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Chunks of the brand nearest to the query embedding"""
+        with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT 
+                    bkc.id,
+                    bkc.chunk_type,
+                    bkc.content,
+                    bkc.metadata,
+                    b.name as brand_name,
+                    1 - (bkc.embedding <=> %s::vector) as similarity_score
+                FROM brand_knowledge_chunks bkc
+                JOIN brands b ON bkc.brand_id = b.id
+                WHERE bkc.brand_id = %s
+                AND bkc.embedding IS NOT NULL
+                ORDER BY bkc.embedding <=> %s::vector
+                LIMIT %s
+            """, (query_embedding, brand_id, query_embedding, limit))
+            
+            results = cursor.fetchall()
+            
+            # Convert to list of dicts
+            search_results = []
+            for row in results:
+                search_results.append({
+                    'id': row['id'],
+                    'chunk_type': row['chunk_type'],
+                    'content': row['content'],
+                    'metadata': row['metadata'],
+                    'brand_name': row['brand_name'],
+                    'similarity_score': float(row['similarity_score'])
+                })
+            
+            return search_results
+    
+    async def semantic_search(self, query: str, brand_id: str, limit: int = 10,
+                              query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Perform semantic search using embeddings (query_embedding: from embed_query, if already created)"""
         try:
             # Create embedding for query
-            query_embeddings = await self.create_embeddings_batch([query])
-            if not query_embeddings or query_embeddings[0] is None:
+            query_embedding = query_embedding or await self.embed_query(query)
+            if query_embedding is None:
                 logger.error("Failed to create query embedding")
                 return []
             
-            query_embedding = query_embeddings[0]
-            
-            # Search in database
-            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute("""
-                    SELECT 
-                        bkc.id,
-                        bkc.chunk_type,
-                        bkc.content,
-                        bkc.metadata,
-                        b.name as brand_name,
-                        1 - (bkc.embedding <=> %s::vector) as similarity_score
-                    FROM brand_knowledge_chunks bkc
-                    JOIN brands b ON bkc.brand_id = b.id
-                    WHERE bkc.brand_id = %s
-                    AND bkc.embedding IS NOT NULL
-                    ORDER BY bkc.embedding <=> %s::vector
-                    LIMIT %s
-                """, (query_embedding, brand_id, query_embedding, limit))
-                
-                results = cursor.fetchall()
-                
-                # Convert to list of dicts
-                search_results = []
-                for row in results:
-                    search_results.append({
-                        'id': row['id'],
-                        'chunk_type': row['chunk_type'],
-                        'content': row['content'],
-                        'metadata': row['metadata'],
-                        'brand_name': row['brand_name'],
-                        'similarity_score': float(row['similarity_score'])
-                    })
-                
-                logger.info(f"Found {len(search_results)} semantic search results")
-                return search_results
+            # Search in database (in a worker thread, see create_embeddings_batch)
+            search_results = await asyncio.to_thread(self.search_chunks, query_embedding, brand_id, limit)
+            logger.info(f"Found {len(search_results)} semantic search results")
+            return search_results
                 
         except Exception as e:
             logger.error(f"Semantic search failed: {e}")
             return []
     
-    async def generate_llm_response(self, query: str, search_results: List[Dict[str, Any]], 
-                                  session: aiohttp.ClientSession, use_fallback: bool = False) -> str:
-        """Generate LLM response based on search results with fallback support"""
-        try:
-            if not search_results:
-                return "Keine relevanten Informationen zu Ihrer Anfrage gefunden."
-            
-            # Prepare context from search results
-            context_parts = []
-            for i, result in enumerate(search_results[:5]):  # Top 5 results
-                context_parts.append(f"[{i+1}] {result['content']}")
-            
-            context = "\n\n".join(context_parts)
-            
-            # Create LLM prompt
-            prompt = f"""Du bist ein Experte für Brand Guidelines und Markenmanagement. 
+    def get_cached_answer(self, query_embedding: Optional[List[float]], brand_id: str, limit: int) -> Optional[Dict[str, Any]]:
+        """Cached answer to an earlier, semantically equal question about the brand (see response_cache.py)"""
+        if not RESPONSE_CACHE_ENABLED:
+            return None
+        return get_cached_response(self.connection, "ask", brand_id, query_embedding,
+                                   self.embedding_model, self.llm_model, limit)
+    
+    def save_cached_answer(self, query: str, query_embedding: Optional[List[float]], brand_id: str, limit: int,
+                           answer: str, search_results: List[Dict[str, Any]]):
+        """Store a generated answer in the response cache; fallback and error answers are not stored"""
+        if not RESPONSE_CACHE_ENABLED or answer in FALLBACK_ANSWERS:
+            return
+        save_cached_response(self.connection, "ask", brand_id, query, query_embedding, self.embedding_model,
+                             self.llm_model, limit, answer, search_results)
+    
+    def _llm_payload(self, query: str, search_results: List[Dict[str, Any]], model: str) -> Dict[str, Any]:
+        """Chat-completions payload answering the query from the top search results"""
+        # Prepare context from search results
+        context_parts = []
+        for i, result in enumerate(search_results[:5]):  # Top 5 results
+            context_parts.append(f"[{i+1}] {result['content']}")
+        
+        context = "\n\n".join(context_parts)
+        
+        # Create LLM prompt
+        prompt = f"""Du bist ein Experte für Brand Guidelines und Markenmanagement. 
 Antworte auf Deutsch basierend auf den folgenden Brand-Guideline-Informationen:
 
 Anfrage: {query}
@@ -500,23 +627,35 @@ Relevante Informationen:
 
 Antworte präzise und hilfreich. Falls die Informationen nicht ausreichen, sage das ehrlich."""
 
+        return {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": "Du bist ein Experte für Brand Guidelines und Markenmanagement."},
+                {"role": "user", "content": prompt}
+            ],
+            "max_completion_tokens": 2000  # GPT-5 uses max_completion_tokens and default temperature (1)
+        }
+    
+    async def generate_llm_response(self, query: str, search_results: List[Dict[str, Any]], 
+                                  session: Optional[aiohttp.ClientSession] = None, use_fallback: bool = False) -> str:
+        """Generate LLM response based on search results with fallback support (session defaults to the shared one)"""
+        try:
+            session = session or await aiohttp_session()
+            if not search_results:
+                return NO_RESULTS_ANSWER
+            
             # Choose model (with fallback)
             model = self.fallback_llm_model if use_fallback else self.llm_model
+            payload = self._llm_payload(query, search_results, model)
             
-            payload = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": "Du bist ein Experte für Brand Guidelines und Markenmanagement."},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_completion_tokens": 2000  # GPT-5 uses max_completion_tokens and default temperature (1)
-            }
-            
+            limiter = openai_limiter(model)
+            await limiter.acquire_async(estimate_request_tokens(payload))
             async with session.post(
                 f"{self.base_url}/chat/completions",
                 headers=self.headers,
                 json=payload
             ) as response:
+                limiter.observe(response.status, response.headers)
                 if response.status == 200:
                     data = await response.json()
                     return data['choices'][0]['message']['content']
@@ -527,29 +666,78 @@ Antworte präzise und hilfreich. Falls die Informationen nicht ausreichen, sage
                 else:
                     error_text = await response.text()
                     logger.error(f"LLM API error: {response.status} - {error_text}")
-                    return "Entschuldigung, ich konnte Ihre Anfrage nicht verarbeiten."
+                    return REQUEST_FAILED_ANSWER
                     
         except Exception as e:
             logger.error(f"LLM response generation failed: {e}")
-            return "Entschuldigung, es ist ein Fehler aufgetreten."
+            return ERROR_ANSWER
     
     async def generate_llm_response_streaming(self, query: str, search_results: List[Dict[str, Any]], 
-                                           session: aiohttp.ClientSession, use_fallback: bool = False):
-        """Generate streaming LLM response based on search results"""
+                                           session: Optional[aiohttp.ClientSession] = None, use_fallback: bool = False):
+        """Stream the LLM response based on search results: an async generator of answer text pieces,
+        yielded as the chat-completions stream delivers them"""
+        if not search_results:
+            yield NO_RESULTS_ANSWER
+            return
+        
+        started = False
         try:
-            if not search_results:
-                return "Keine relevanten Informationen zu Ihrer Anfrage gefunden."
+            session = session or await aiohttp_session()
             
-            # For now, return regular response instead of streaming
-            # Streaming implementation can be added later if needed
-            return await self.generate_llm_response(query, search_results, session, use_fallback)
+            # Choose model (with fallback)
+            model = self.fallback_llm_model if use_fallback else self.llm_model
+            payload = self._llm_payload(query, search_results, model)
+            payload["stream"] = True
+            
+            limiter = openai_limiter(model)
+            await limiter.acquire_async(estimate_request_tokens(payload))
+            async with session.post(
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload
+            ) as response:
+                limiter.observe(response.status, response.headers)
+                if response.status == 404 and not use_fallback:
+                    # Model not available, try fallback
+                    logger.warning(f"LLM Model {model} not available, trying fallback...")
+                    async for piece in self.generate_llm_response_streaming(query, search_results, session, use_fallback=True):
+                        yield piece
+                    return
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"LLM API error: {response.status} - {error_text}")
+                    yield REQUEST_FAILED_ANSWER
+                    return
+                
+                # Server-sent events: "data: {chunk}" lines, terminated by "data: [DONE]"
+                complete = False
+                async for line in response.content:
+                    line = line.decode('utf-8').strip()
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        complete = True
+                        break
+                    for choice in json.loads(data).get('choices', []):
+                        piece = (choice.get('delta') or {}).get('content')
+                        if piece:
+                            started = True
+                            yield piece
+                if not complete:
+                    raise aiohttp.ClientPayloadError("LLM stream ended before [DONE]")
                     
         except Exception as e:
             logger.error(f"Streaming LLM generation failed: {e}")
+            if started:
+                # part of the answer is out: the caller must not take it for a complete one
+                raise
             if not use_fallback and self.llm_model != self.fallback_llm_model:
                 logger.info(f"Trying fallback LLM model: {self.fallback_llm_model}")
-                return await self.generate_llm_response_streaming(query, search_results, session, use_fallback=True)
-            return "Entschuldigung, ich konnte keine Antwort generieren."
+                async for piece in self.generate_llm_response_streaming(query, search_results, session, use_fallback=True):
+                    yield piece
+                return
+            yield STREAM_ERROR_ANSWER
 
 
 async def main():
@@ -590,9 +778,8 @@ async def main():
             
             # Test LLM response
             logger.info("Testing LLM response...")
-            async with aiohttp.ClientSession() as session:
-                response = await service.generate_llm_response(test_query, results, session)
-                logger.info(f"LLM Response: {response}")
+            response = await service.generate_llm_response(test_query, results)
+            logger.info(f"LLM Response: {response}")
         else:
             logger.error("Embedding process failed")
             
@@ -601,6 +788,7 @@ async def main():
     
     finally:
         service.disconnect_db()
+        await close_aiohttp_session()
 
 
 if __name__ == "__main__":
@@ -3,22 +3,97 @@ import json
 import logging
 import tempfile
 import base64
-import requests
+import threading
 from PIL import Image
 import fitz  # PyMuPDF
 import io
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from rate_limiter import RATE_LIMIT_RETRIES, AdaptiveRateLimiter, openai_limiter, estimate_request_tokens
+from http_clients import requests_session
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-page vision calls in parallel; their rate is set by the shared OpenAI limiter (rate_limiter.py)
+AI_PAGE_CONCURRENCY = int(os.getenv("AI_PAGE_CONCURRENCY", "4"))
+# One font+layout prompt per page image instead of two uploads
+AI_COMBINED_PAGE_PROMPT = os.getenv("AI_COMBINED_PAGE_PROMPT", "0") == "1"
+
+FONT_FOCUS = """1. Font families and styles used
+2. Typography hierarchy (headings, body text, etc.)
+3. Font sizes and their purposes
+4. Color usage in text
+5. Overall typography quality and consistency"""
+
+FONT_FIELDS = """- font_families: (list of font families found)
+- typography_hierarchy: (description of text hierarchy)
+- font_sizes: (list of font sizes and their purposes)
+- text_colors: (list of colors used in text)
+- typography_quality: (high/medium/low assessment)
+- consistency_score: (0-1 score for typography consistency)
+- recommendations: (list of typography recommendations)"""
+
+LAYOUT_FOCUS = """1. Overall layout type (grid, asymmetric, centered, etc.)
+2. Content organization and hierarchy
+3. Spacing and margins
+4. Visual balance and composition
+5. Design principles used"""
+
+LAYOUT_FIELDS = """- layout_type: (grid/asymmetric/centered/other)
+- content_hierarchy: (description of content organization)
+- spacing_analysis: (description of spacing and margins)
+- visual_balance: (high/medium/low assessment)
+- design_quality: (high/medium/low assessment)
+- composition_score: (0-1 score for overall composition)
+- recommendations: (list of layout improvements)"""
+
+FONT_PROMPT = f"""Analyze the fonts and typography in this image. Focus on:
+
+{FONT_FOCUS}
+
+Provide a detailed analysis in JSON format with these fields:
+{FONT_FIELDS}"""
+
+LAYOUT_PROMPT = f"""Analyze the layout and design structure of this page. Focus on:
+
+{LAYOUT_FOCUS}
+
+Provide a detailed analysis in JSON format with these fields:
+{LAYOUT_FIELDS}"""
+
+COMBINED_PROMPT = f"""Analyze the typography and the layout of this page.
+
+Typography - focus on:
+
+{FONT_FOCUS}
+
+Layout - focus on:
+
+{LAYOUT_FOCUS}
+
+Provide a detailed analysis as one JSON object with two objects:
+- font_analysis: with these fields:
+{FONT_FIELDS}
+- layout_analysis: with these fields:
+{LAYOUT_FIELDS}"""
+
+
 class EnhancedAIAnalyzer:
     """Comprehensive AI-powered PDF analyzer for graphics, fonts, and layout"""
     
-    def __init__(self, openai_api_key):
+    def __init__(self, openai_api_key, max_concurrency=None, requests_per_minute=None, combined_prompt=None):
         self.openai_api_key = openai_api_key
-        self.openai_base_url = "https://api.openai.com/v1"
+        self.openai_base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        self.max_concurrency = AI_PAGE_CONCURRENCY if max_concurrency is None else max_concurrency
+        # the process-wide gpt-4o limiter, or a private one capped at requests_per_minute
+        self.rate_limiter = openai_limiter("gpt-4o") if requests_per_minute is None \
+            else AdaptiveRateLimiter(requests_per_minute=requests_per_minute, name="gpt-4o",
+                                     requests_ceiling=requests_per_minute)
+        self.combined_prompt = AI_COMBINED_PAGE_PROMPT if combined_prompt is None else combined_prompt
+        self._usage_lock = threading.Lock()
+        self.ai_usage = {}
     
     def analyze_pdf_comprehensive(self, pdf_path):
         """Complete PDF analysis with graphics, fonts, and layout"""
@@ -29,18 +104,16 @@ class EnhancedAIAnalyzer:
             # Step 1: Graphics Analysis (existing functionality)
             graphics_analysis = self._analyze_graphics(pdf_path)
             
-            # Step 2: Font Analysis with AI
-            font_analysis = self._analyze_fonts_with_ai(pdf_path)
-            
-            # Step 3: Layout Analysis with AI
-            layout_analysis = self._analyze_layout_with_ai(pdf_path)
+            # Steps 2 + 3: Font and layout analysis with AI, pages analyzed concurrently
+            font_analysis, layout_analysis = self._analyze_pages_with_ai(pdf_path)
             
             # Step 4: Combine all analyses
             comprehensive_analysis = {
                 "graphics_analysis": graphics_analysis,
                 "font_analysis": font_analysis,
                 "layout_analysis": layout_analysis,
-                "summary": self._generate_comprehensive_summary(graphics_analysis, font_analysis, layout_analysis)
+                "summary": self._generate_comprehensive_summary(graphics_analysis, font_analysis, layout_analysis),
+                "ai_usage": self.ai_usage
             }
             
             return comprehensive_analysis
@@ -59,151 +132,121 @@ class EnhancedAIAnalyzer:
             logger.error(f"Error in graphics analysis: {e}")
             return {"error": str(e)}
     
-    def _analyze_fonts_with_ai(self, pdf_path):
-        """Analyze fonts using AI vision and text extraction"""
+    def _analyze_pages_with_ai(self, pdf_path):
+        """Font and layout analysis of every page with AI vision.
+        
+        Each page is rendered once; its vision calls run on a thread pool of max_concurrency
+        workers, spaced by the rate limiter, while the next pages render. Rendering pauses
+        while more than 2 x max_concurrency calls are outstanding. With combined_prompt,
+        pages with text get one font+layout call instead of two.
+        """
         
         try:
-            logger.info("Starting AI-powered font analysis...")
+            logger.info(f"Starting AI-powered font and layout analysis "
+                        f"({'combined' if self.combined_prompt else 'separate'} prompts, {self.max_concurrency} workers)...")
+            self.ai_usage = {
+                "mode": "combined" if self.combined_prompt else "separate",
+                "requests": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0
+            }
             
-            # Extract text and font information using PyMuPDF
             doc = fitz.open(pdf_path)
+            # pages whose vision calls are submitted but not collected, oldest first
+            pending = deque()
+            # at most this many calls (and their page PNGs) wait for a worker
+            max_outstanding = 2 * max(1, self.max_concurrency)
             font_data = []
+            layout_data = []
             
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Convert page to image for AI analysis
-                mat = fitz.Matrix(2, 2)
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
+            def collect_oldest():
+                page_num, page_fonts, font_future, layout_future = pending.popleft()
+                if layout_future is None:
+                    ai_font_analysis, ai_layout_analysis = font_future.result()
+                else:
+                    ai_font_analysis = font_future.result() if font_future else None
+                    ai_layout_analysis = layout_future.result()
                 
-                # Get text with font information
-                text_dict = page.get_text("dict")
-                page_fonts = []
-                
-                for block in text_dict.get("blocks", []):
-                    if "lines" in block:
-                        for line in block["lines"]:
-                            for span in line.get("spans", []):
-                                if "font" in span and "size" in span:
-                                    font_info = {
-                                        "name": span["font"],
-                                        "size": span["size"],
-                                        "text": span.get("text", ""),
-                                        "bbox": span.get("bbox", []),
-                                        "page": page_num + 1,
-                                        "color": span.get("color", 0),
-                                        "flags": span.get("flags", 0)
-                                    }
-                                    page_fonts.append(font_info)
-                
-                # Analyze fonts with AI
                 if page_fonts:
-                    ai_font_analysis = self._analyze_fonts_ai(img_data, page_fonts, page_num + 1)
                     font_data.append({
                         "page": page_num + 1,
                         "fonts": page_fonts,
                         "ai_analysis": ai_font_analysis
                     })
+                layout_data.append({
+                    "page": page_num + 1,
+                    "ai_analysis": ai_layout_analysis
+                })
             
-            doc.close()
+            def outstanding():
+                return sum((font_future is not None) + (layout_future is not None)
+                           for _, _, font_future, layout_future in pending)
             
-            # Aggregate font analysis
-            return self._aggregate_font_analysis(font_data)
+            with ThreadPoolExecutor(max_workers=max(1, self.max_concurrency)) as pool:
+                for page_num in range(len(doc)):
+                    page = doc[page_num]
+                    
+                    # Convert page to image for AI analysis
+                    mat = fitz.Matrix(2, 2)
+                    pix = page.get_pixmap(matrix=mat)
+                    img_data = pix.tobytes("png")
+                    
+                    page_fonts = self._extract_page_fonts(page, page_num)
+                    
+                    if page_fonts and self.combined_prompt:
+                        combined = pool.submit(self._analyze_page_combined_ai, img_data, page_num + 1)
+                        pending.append((page_num, page_fonts, combined, None))
+                    else:
+                        font_future = pool.submit(self._analyze_fonts_ai, img_data, page_fonts, page_num + 1) if page_fonts else None
+                        layout_future = pool.submit(self._analyze_layout_ai, img_data, page_num + 1)
+                        pending.append((page_num, page_fonts, font_future, layout_future))
+                    
+                    # backpressure: rendering must not run ahead of the API calls
+                    while outstanding() > max_outstanding:
+                        collect_oldest()
+                
+                doc.close()
+                
+                while pending:
+                    collect_oldest()
+            
+            # Aggregate font and layout analysis
+            return self._aggregate_font_analysis(font_data), self._aggregate_layout_analysis(layout_data)
             
         except Exception as e:
-            logger.error(f"Error in font analysis: {e}")
-            return {"error": str(e)}
+            logger.error(f"Error in font and layout analysis: {e}")
+            return {"error": str(e)}, {"error": str(e)}
+    
+    def _extract_page_fonts(self, page, page_num):
+        """Text spans with font information of a page"""
+        
+        # Get text with font information
+        text_dict = page.get_text("dict")
+        page_fonts = []
+        
+        for block in text_dict.get("blocks", []):
+            if "lines" in block:
+                for line in block["lines"]:
+                    for span in line.get("spans", []):
+                        if "font" in span and "size" in span:
+                            font_info = {
+                                "name": span["font"],
+                                "size": span["size"],
+                                "text": span.get("text", ""),
+                                "bbox": span.get("bbox", []),
+                                "page": page_num + 1,
+                                "color": span.get("color", 0),
+                                "flags": span.get("flags", 0)
+                            }
+                            page_fonts.append(font_info)
+        
+        return page_fonts
     
     def _analyze_fonts_ai(self, img_data, fonts, page_num):
         """Analyze fonts using AI vision"""
         
         try:
-            # Encode image for OpenAI
-            image_base64 = base64.b64encode(img_data).decode('utf-8')
-            
-            # Prepare prompt for font analysis
-            font_prompt = f"""Analyze the fonts and typography in this image. Focus on:
-
-1. Font families and styles used
-2. Typography hierarchy (headings, body text, etc.)
-3. Font sizes and their purposes
-4. Color usage in text
-5. Overall typography quality and consistency
-
-Provide a detailed analysis in JSON format with these fields:
-- font_families: (list of font families found)
-- typography_hierarchy: (description of text hierarchy)
-- font_sizes: (list of font sizes and their purposes)
-- text_colors: (list of colors used in text)
-- typography_quality: (high/medium/low assessment)
-- consistency_score: (0-1 score for typography consistency)
-- recommendations: (list of typography recommendations)"""
-            
-            payload = {
-                "model": "gpt-4o",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": font_prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "max_tokens": 800
-            }
-            
-            response = requests.post(
-                f"{self.openai_base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.openai_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json=payload
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                
-                # Try to parse JSON response
-                try:
-                    # Extract JSON from markdown code blocks if present
-                    if "```json" in content:
-                        json_start = content.find("```json") + 7
-                        json_end = content.find("```", json_start)
-                        json_content = content[json_start:json_end].strip()
-                        ai_analysis = json.loads(json_content)
-                    else:
-                        ai_analysis = json.loads(content)
-                    
-                    return {
-                        "success": True,
-                        "ai_analysis": ai_analysis,
-                        "raw_response": content
-                    }
-                except json.JSONDecodeError:
-                    return {
-                        "success": False,
-                        "error": "Failed to parse AI response as JSON",
-                        "raw_response": content
-                    }
-            else:
-                return {
-                    "success": False,
-                    "error": f"OpenAI API error: {response.status_code}",
-                    "raw_response": response.text
-                }
-                
+            return self._vision_request(img_data, FONT_PROMPT, 800)
         except Exception as e:
             logger.error(f"Error in AI font analysis: {e}")
             return {
@@ -211,87 +254,83 @@ Provide a detailed analysis in JSON format with these fields:
                 "error": str(e)
             }
     
-    def _analyze_layout_with_ai(self, pdf_path):
+    def _analyze_layout_ai(self, img_data, page_num):
         """Analyze layout using AI vision"""
         
         try:
-            logger.info("Starting AI-powered layout analysis...")
-            
-            doc = fitz.open(pdf_path)
-            layout_data = []
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Convert page to image for AI analysis
-                mat = fitz.Matrix(2, 2)
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-                
-                # Analyze layout with AI
-                ai_layout_analysis = self._analyze_layout_ai(img_data, page_num + 1)
-                
-                layout_data.append({
-                    "page": page_num + 1,
-                    "ai_analysis": ai_layout_analysis
-                })
-            
-            doc.close()
-            
-            return self._aggregate_layout_analysis(layout_data)
-            
+            return self._vision_request(img_data, LAYOUT_PROMPT, 800)
         except Exception as e:
-            logger.error(f"Error in layout analysis: {e}")
-            return {"error": str(e)}
+            logger.error(f"Error in AI layout analysis: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
     
-    def _analyze_layout_ai(self, img_data, page_num):
-        """Analyze layout using AI vision"""
+    def _analyze_page_combined_ai(self, img_data, page_num):
+        """Analyze fonts and layout of a page with one AI vision call; returns (font, layout) results"""
         
         try:
-            # Encode image for OpenAI
-            image_base64 = base64.b64encode(img_data).decode('utf-8')
-            
-            # Prepare prompt for layout analysis
-            layout_prompt = f"""Analyze the layout and design structure of this page. Focus on:
-
-1. Overall layout type (grid, asymmetric, centered, etc.)
-2. Content organization and hierarchy
-3. Spacing and margins
-4. Visual balance and composition
-5. Design principles used
-
-Provide a detailed analysis in JSON format with these fields:
-- layout_type: (grid/asymmetric/centered/other)
-- content_hierarchy: (description of content organization)
-- spacing_analysis: (description of spacing and margins)
-- visual_balance: (high/medium/low assessment)
-- design_quality: (high/medium/low assessment)
-- composition_score: (0-1 score for overall composition)
-- recommendations: (list of layout improvements)"""
-            
-            payload = {
-                "model": "gpt-4o",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": layout_prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "max_tokens": 800
+            result = self._vision_request(img_data, COMBINED_PROMPT, 1600)
+        except Exception as e:
+            logger.error(f"Error in AI font and layout analysis: {e}")
+            result = {
+                "success": False,
+                "error": str(e)
             }
-            
-            response = requests.post(
+        
+        if not result["success"]:
+            return result, result
+        
+        # Split into the per-analysis results the aggregators expect
+        split = []
+        for key in ("font_analysis", "layout_analysis"):
+            ai_analysis = result["ai_analysis"].get(key) if isinstance(result["ai_analysis"], dict) else None
+            if isinstance(ai_analysis, dict):
+                split.append({
+                    "success": True,
+                    "ai_analysis": ai_analysis,
+                    "raw_response": result["raw_response"]
+                })
+            else:
+                split.append({
+                    "success": False,
+                    "error": f"AI response has no {key} object",
+                    "raw_response": result["raw_response"]
+                })
+        return split[0], split[1]
+    
+    def _vision_request(self, img_data, prompt, max_tokens):
+        """One chat-completion call with a page image; returns success, ai_analysis (parsed JSON) and raw_response"""
+        
+        # Encode image for OpenAI
+        image_base64 = base64.b64encode(img_data).decode('utf-8')
+        
+        payload = {
+            "model": "gpt-4o",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/png;base64,{image_base64}"
+                            }
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": max_tokens
+        }
+        
+        tokens = estimate_request_tokens(payload)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self.rate_limiter.acquire(tokens)
+            response = requests_session().post(
                 f"{self.openai_base_url}/chat/completions",
                 headers={
                     "Authorization": f"Bearer {self.openai_api_key}",
@@ -299,45 +338,48 @@ Provide a detailed analysis in JSON format with these fields:
                 },
                 json=payload
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                
-                # Try to parse JSON response
-                try:
-                    # Extract JSON from markdown code blocks if present
-                    if "```json" in content:
-                        json_start = content.find("```json") + 7
-                        json_end = content.find("```", json_start)
-                        json_content = content[json_start:json_end].strip()
-                        ai_analysis = json.loads(json_content)
-                    else:
-                        ai_analysis = json.loads(content)
-                    
-                    return {
-                        "success": True,
-                        "ai_analysis": ai_analysis,
-                        "raw_response": content
-                    }
-                except json.JSONDecodeError:
-                    return {
-                        "success": False,
-                        "error": "Failed to parse AI response as JSON",
-                        "raw_response": content
-                    }
+            self.rate_limiter.observe(response.status_code, response.headers)
+            if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                break
+            # the limiter has paused for Retry-After; send again
+            logger.warning(f"Vision request rate limited (attempt {attempt + 1}), retrying")
+        
+        if response.status_code != 200:
+            return {
+                "success": False,
+                "error": f"OpenAI API error: {response.status_code}",
+                "raw_response": response.text
+            }
+        
+        result = response.json()
+        content = result["choices"][0]["message"]["content"]
+        usage = result.get("usage", {})
+        with self._usage_lock:
+            self.ai_usage["requests"] = self.ai_usage.get("requests", 0) + 1
+            self.ai_usage["prompt_tokens"] = self.ai_usage.get("prompt_tokens", 0) + usage.get("prompt_tokens", 0)
+            self.ai_usage["completion_tokens"] = self.ai_usage.get("completion_tokens", 0) + usage.get("completion_tokens", 0)
+        
+        # Try to parse JSON response
+        try:
+            # Extract JSON from markdown code blocks if present
+            if "```json" in content:
+                json_start = content.find("```json") + 7
+                json_end = content.find("```", json_start)
+                json_content = content[json_start:json_end].strip()
+                ai_analysis = json.loads(json_content)
             else:
-                return {
-                    "success": False,
-                    "error": f"OpenAI API error: {response.status_code}",
-                    "raw_response": response.text
-                }
-                
-        except Exception as e:
-            logger.error(f"Error in AI layout analysis: {e}")
+                ai_analysis = json.loads(content)
+            
+            return {
+                "success": True,
+                "ai_analysis": ai_analysis,
+                "raw_response": content
+            }
+        except json.JSONDecodeError:
             return {
                 "success": False,
-                "error": str(e)
+                "error": "Failed to parse AI response as JSON",
+                "raw_response": content
             }
     
     def _aggregate_font_analysis(self, font_data):
@@ -8,6 +8,8 @@ import pdfplumber
 from PIL import Image
 import cv2
 import io
+import time
+from page_triage import triage_pdf, wants_raster_analysis, triage_report
 
 # Optional imports - will be None if not available
 try:
@@ -549,6 +551,10 @@ def analyze_as_images(pdf_path):
     """Convert PDF pages to images and analyze them"""
     
     try:
+        # Triage: blank and text-only pages get an empty record instead of the OpenCV pass
+        triage = triage_pdf(pdf_path)
+        raster_seconds = 0.0
+        
         # Convert PDF to images
         doc = fitz.open(pdf_path)
         image_data = {
@@ -558,6 +564,21 @@ def analyze_as_images(pdf_path):
         for page_num in range(len(doc)):
             page = doc[page_num]
             
+            if not wants_raster_analysis(triage, page_num):
+                image_data["pages"].append({
+                    "page_number": page_num + 1,
+                    "width": int(page.rect.width * 2),
+                    "height": int(page.rect.height * 2),
+                    "channels": 3,
+                    "contours": [],
+                    "edges": [],
+                    "color_regions": [],
+                    "skipped": triage["pages"][page_num]["class"]
+                })
+                continue
+            
+            start = time.perf_counter()
+            
             # Convert page to image
             mat = fitz.Matrix(2, 2)  # 2x zoom for better quality
             pix = page.get_pixmap(matrix=mat)
@@ -642,7 +663,9 @@ def analyze_as_images(pdf_path):
                         page_image_data["color_regions"].append(color_info)
             
             image_data["pages"].append(page_image_data)
+            raster_seconds += time.perf_counter() - start
         
+        image_data["page_triage"] = triage_report(triage, raster_seconds, len(doc))
         doc.close()
         return image_data
         
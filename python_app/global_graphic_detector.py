@@ -1,30 +1,65 @@
 import os
 import json
 import logging
-import numpy as np
 from collections import defaultdict
 import fitz  # PyMuPDF
 from PIL import Image, ImageDraw
-import cv2
 import io
-import tempfile
+import time
+import random
 import base64
 import requests
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
+from concurrent.futures import ThreadPoolExecutor
+from page_triage import triage_pdf, wants_raster_analysis, triage_report, LOGO_PAGE_CLASSES
+from region_proposals import RENDER_ZOOM, page_proposals, cluster_regions
+from tiled_render import render_clip
+from perceptual_hash import dhash, near_duplicate_groups
+from rate_limiter import openai_limiter, estimate_request_tokens
+from http_clients import requests_session
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# AI vision calls: parallel requests, retries on 429/5xx and the per-request deadline (s)
+AI_MAX_CONCURRENCY = int(os.getenv("GRAPHIC_AI_CONCURRENCY", "4"))
+AI_MAX_RETRIES = int(os.getenv("GRAPHIC_AI_MAX_RETRIES", "3"))
+AI_REQUEST_DEADLINE = float(os.getenv("GRAPHIC_AI_DEADLINE", "60"))
+AI_ATTEMPT_TIMEOUT = 30
+AI_BACKOFF_BASE = 1.0
+AI_RETRY_STATUS = frozenset((429, 500, 502, 503, 504))
+AI_VISION_MODEL = "gpt-4o"
+# Persistent perceptual hash -> analysis table (graphic_ai_analyses) shared across documents
+AI_HASH_TABLE_ENABLED = os.getenv("GRAPHIC_AI_HASH_TABLE", "0") == "1"
+
+
+def default_analysis_store():
+    """Database manager for the hash -> analysis table, when enabled and available"""
+    if not AI_HASH_TABLE_ENABLED:
+        return None
+    try:
+        from database import db_manager
+        return db_manager
+    except ImportError as e:
+        logger.warning(f"Graphic AI hash table not available: {e}")
+        return None
+
+
 class GlobalGraphicDetector:
     """Global graphic/illustration detection with OpenAI AI analysis"""
     
-    def __init__(self, openai_api_key):
+    def __init__(self, openai_api_key, max_concurrency=None, max_retries=None, request_deadline=None,
+                 analysis_store=None):
         self.openai_api_key = openai_api_key
-        self.openai_base_url = "https://api.openai.com/v1"
+        self.openai_base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        self.max_concurrency = AI_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        self.max_retries = AI_MAX_RETRIES if max_retries is None else max_retries
+        self.request_deadline = AI_REQUEST_DEADLINE if request_deadline is None else request_deadline
+        # get_graphic_ai_analyses / save_graphic_ai_analysis, e.g. database.db_manager
+        self.analysis_store = default_analysis_store() if analysis_store is None else analysis_store
         self.graphic_regions = []
-        self.screenshot_paths = []
+        # Page classes and time saved by the last find_all_graphic_regions run
+        self.page_triage_report = {"enabled": False}
         
     def detect_all_graphics(self, pdf_path):
         """Main method to detect all graphics/illustrations and analyze with AI"""
@@ -59,10 +94,14 @@ class GlobalGraphicDetector:
             recommended = self.recommend_graphics(ranked_regions, ai_analysis)
             
             detection_results["graphic_regions"] = ranked_regions
-            detection_results["screenshots"] = screenshots
+            # Encoded images only go to the AI request, not into the JSON response
+            detection_results["screenshots"] = [
+                {k: v for k, v in screenshot.items() if k != "image_png"} for screenshot in screenshots
+            ]
             detection_results["ai_analysis"] = ai_analysis
             detection_results["recommended_graphics"] = recommended
             detection_results["analysis_summary"] = self.analyze_graphic_regions(ranked_regions, ai_analysis)
+            detection_results["page_triage"] = self.page_triage_report
             
             return detection_results
             
@@ -75,46 +114,45 @@ class GlobalGraphicDetector:
         
         try:
             all_regions = []
+            # Triage: blank pages cannot contain graphics worth a raster pass (text pages can carry a logo)
+            triage = triage_pdf(pdf_path)
+            raster_seconds = 0.0
             doc = fitz.open(pdf_path)
             
             for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Convert page to image
-                mat = fitz.Matrix(2, 2)  # 2x zoom for better quality
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Convert to PIL Image
-                img_data = pix.tobytes("png")
-                pil_image = Image.open(io.BytesIO(img_data))
+                if not wants_raster_analysis(triage, page_num, LOGO_PAGE_CLASSES):
+                    continue
                 
-                # Convert to OpenCV format
-                cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+                start = time.perf_counter()
+                # Proposals are shared with IntelligentLogoDetector and memoized per page
+                proposals = page_proposals(pdf_path, doc[page_num])
                 
                 # Method 1: Color-based regions (logos, graphics)
-                color_regions = self.find_color_based_regions(cv_image, page_num)
+                color_regions = self.find_color_based_regions(proposals, page_num)
                 all_regions.extend(color_regions)
                 
                 # Method 2: Edge-based regions (illustrations, diagrams)
-                edge_regions = self.find_edge_based_regions(cv_image, page_num)
+                edge_regions = self.find_edge_based_regions(proposals, page_num)
                 all_regions.extend(edge_regions)
                 
                 # Method 3: Contour-based regions (shapes, graphics)
-                contour_regions = self.find_contour_based_regions(cv_image, page_num)
+                contour_regions = self.find_contour_based_regions(proposals, page_num)
                 all_regions.extend(contour_regions)
                 
                 # Method 4: Texture-based regions (patterns, backgrounds)
-                texture_regions = self.find_texture_based_regions(cv_image, page_num)
+                texture_regions = self.find_texture_based_regions(proposals, page_num)
                 all_regions.extend(texture_regions)
                 
                 # Method 5: Position-based regions (typical graphic positions)
-                position_regions = self.find_position_based_regions(cv_image, page_num)
+                position_regions = self.find_position_based_regions(proposals, page_num)
                 all_regions.extend(position_regions)
                 
                 # Method 6: Brightness-based regions (high contrast areas)
-                brightness_regions = self.find_brightness_based_regions(cv_image, page_num)
+                brightness_regions = self.find_brightness_based_regions(proposals, page_num)
                 all_regions.extend(brightness_regions)
+                raster_seconds += time.perf_counter() - start
             
+            self.page_triage_report = triage_report(triage, raster_seconds, len(doc), LOGO_PAGE_CLASSES)
             doc.close()
             return all_regions
             
@@ -122,16 +160,13 @@ class GlobalGraphicDetector:
             logger.error(f"Error finding graphic regions: {e}")
             return []
     
-    def find_color_based_regions(self, cv_image, page_num):
+    def find_color_based_regions(self, proposals, page_num):
         """Find regions based on color analysis"""
         
         try:
             regions = []
             
-            # Convert to HSV for better color analysis
-            hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
-            
-            # Define color ranges for graphics
+            # Define color ranges for graphics (HSV)
             color_ranges = {
                 "blue": ([100, 50, 50], [130, 255, 255]),
                 "red": ([0, 50, 50], [10, 255, 255]),
@@ -146,17 +181,8 @@ class GlobalGraphicDetector:
             }
             
             for color_name, (lower, upper) in color_ranges.items():
-                # Create mask for color
-                mask = cv2.inRange(hsv, np.array(lower), np.array(upper))
-                
-                # Find contours
-                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                for contour in contours:
-                    area = cv2.contourArea(contour)
+                for area, x, y, w, h in proposals.color_components(lower, upper):
                     if 50 < area < 50000:  # Wider range for graphics
-                        x, y, w, h = cv2.boundingRect(contour)
-                        
                         region_info = {
                             "bbox": [x, y, x + w, y + h],
                             "area": area,
@@ -177,33 +203,17 @@ class GlobalGraphicDetector:
             logger.error(f"Error finding color-based regions: {e}")
             return []
     
-    def find_edge_based_regions(self, cv_image, page_num):
+    def find_edge_based_regions(self, proposals, page_num):
         """Find regions based on edge detection"""
         
         try:
             regions = []
             
-            # Convert to grayscale
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
-            # Edge detection with different thresholds
-            edges_low = cv2.Canny(gray, 30, 100)
-            edges_high = cv2.Canny(gray, 50, 150)
-            
-            # Combine edge maps
-            edges = cv2.bitwise_or(edges_low, edges_high)
-            
-            # Find contours
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            for contour in contours:
-                area = cv2.contourArea(contour)
+            # Edge detection with different thresholds, edge maps combined
+            for area, x, y, w, h, edge_count in proposals.edge_components(((30, 100), (50, 150))):
                 if 100 < area < 30000:  # Wider range for graphics
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
                     # Calculate edge density
-                    roi = edges[y:y+h, x:x+w]
-                    edge_density = np.sum(roi > 0) / (w * h)
+                    edge_density = edge_count / (w * h)
                     
                     if edge_density > 0.02:  # Lower threshold for graphics
                         region_info = {
@@ -226,29 +236,18 @@ class GlobalGraphicDetector:
             logger.error(f"Error finding edge-based regions: {e}")
             return []
     
-    def find_contour_based_regions(self, cv_image, page_num):
+    def find_contour_based_regions(self, proposals, page_num):
         """Find regions based on contour analysis"""
         
         try:
             regions = []
             
-            # Convert to grayscale
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
             # Multiple threshold levels
             thresholds = [127, 100, 150]
             
             for threshold in thresholds:
-                _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)
-                
-                # Find contours
-                contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                for contour in contours:
-                    area = cv2.contourArea(contour)
+                for area, x, y, w, h in proposals.threshold_components(threshold):
                     if 200 < area < 40000:  # Wider range for graphics
-                        x, y, w, h = cv2.boundingRect(contour)
-                        
                         # Calculate aspect ratio
                         aspect_ratio = w / h if h > 0 else 0
                         
@@ -275,38 +274,15 @@ class GlobalGraphicDetector:
             logger.error(f"Error finding contour-based regions: {e}")
             return []
     
-    def find_texture_based_regions(self, cv_image, page_num):
+    def find_texture_based_regions(self, proposals, page_num):
         """Find regions based on texture analysis"""
         
         try:
             regions = []
             
-            # Convert to grayscale
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
-            # Calculate texture features using local binary patterns
-            # Simple approach: variance of local regions
-            kernel_size = 15
-            kernel = np.ones((kernel_size, kernel_size), np.float32) / (kernel_size * kernel_size)
-            
-            # Convolve with kernel to get local mean
-            local_mean = cv2.filter2D(gray.astype(np.float32), -1, kernel)
-            
-            # Calculate local variance
-            local_variance = cv2.filter2D((gray.astype(np.float32) - local_mean) ** 2, -1, kernel)
-            
-            # Find regions with high texture
-            texture_threshold = np.percentile(local_variance, 90)
-            texture_mask = local_variance > texture_threshold
-            
-            # Find contours in texture mask
-            contours, _ = cv2.findContours(texture_mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            for contour in contours:
-                area = cv2.contourArea(contour)
+            # Simple texture measure: local variance over 15x15 windows, top 10% of the page
+            for area, x, y, w, h, variance in proposals.local_spread_components(15, 90, min_area=300):
                 if 300 < area < 20000:
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
                     region_info = {
                         "bbox": [x, y, x + w, y + h],
                         "area": area,
@@ -316,7 +292,7 @@ class GlobalGraphicDetector:
                         "center_y": y + h // 2,
                         "page": page_num + 1,
                         "detection_method": "texture_based",
-                        "texture_variance": float(np.mean(local_variance[y:y+h, x:x+w])),
+                        "texture_variance": variance,
                         "confidence": 0.0
                     }
                     regions.append(region_info)
@@ -327,13 +303,13 @@ class GlobalGraphicDetector:
             logger.error(f"Error finding texture-based regions: {e}")
             return []
     
-    def find_position_based_regions(self, cv_image, page_num):
+    def find_position_based_regions(self, proposals, page_num):
         """Find regions based on typical graphic positions"""
         
         try:
             regions = []
             
-            img_height, img_width = cv_image.shape[:2]
+            img_width, img_height = proposals.image_size
             
             # Define typical graphic positions
             graphic_positions = [
@@ -394,38 +370,15 @@ class GlobalGraphicDetector:
             logger.error(f"Error finding position-based regions: {e}")
             return []
     
-    def find_brightness_based_regions(self, cv_image, page_num):
+    def find_brightness_based_regions(self, proposals, page_num):
         """Find regions based on brightness/contrast analysis"""
         
         try:
             regions = []
             
-            # Convert to grayscale
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
-            # Calculate local contrast
-            kernel_size = 21
-            kernel = np.ones((kernel_size, kernel_size), np.float32) / (kernel_size * kernel_size)
-            
-            # Local mean
-            local_mean = cv2.filter2D(gray.astype(np.float32), -1, kernel)
-            
-            # Local contrast (standard deviation)
-            local_contrast = cv2.filter2D((gray.astype(np.float32) - local_mean) ** 2, -1, kernel)
-            local_contrast = np.sqrt(local_contrast)
-            
-            # Find regions with high contrast
-            contrast_threshold = np.percentile(local_contrast, 85)
-            contrast_mask = local_contrast > contrast_threshold
-            
-            # Find contours in contrast mask
-            contours, _ = cv2.findContours(contrast_mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            for contour in contours:
-                area = cv2.contourArea(contour)
+            # Local contrast: standard deviation over 21x21 windows, top 15% of the page
+            for area, x, y, w, h, contrast in proposals.local_spread_components(21, 85, std=True, min_area=200):
                 if 200 < area < 15000:
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
                     region_info = {
                         "bbox": [x, y, x + w, y + h],
                         "area": area,
@@ -435,7 +388,7 @@ class GlobalGraphicDetector:
                         "center_y": y + h // 2,
                         "page": page_num + 1,
                         "detection_method": "brightness_based",
-                        "contrast_level": float(np.mean(local_contrast[y:y+h, x:x+w])),
+                        "contrast_level": contrast,
                         "confidence": 0.0
                     }
                     regions.append(region_info)
@@ -450,42 +403,7 @@ class GlobalGraphicDetector:
         """Cluster similar regions to eliminate duplicates"""
         
         try:
-            if not regions:
-                return []
-            
-            # Prepare features for clustering
-            features = []
-            for region in regions:
-                # Normalize features
-                center_x_norm = region["center_x"] / 2000
-                center_y_norm = region["center_y"] / 2000
-                area_norm = region["area"] / 10000
-                
-                features.append([center_x_norm, center_y_norm, area_norm])
-            
-            # Use DBSCAN for clustering
-            scaler = StandardScaler()
-            features_scaled = scaler.fit_transform(features)
-            
-            # Cluster with DBSCAN
-            clustering = DBSCAN(eps=0.4, min_samples=1).fit(features_scaled)
-            
-            # Group regions by cluster
-            clusters = defaultdict(list)
-            for i, label in enumerate(clustering.labels_):
-                clusters[label].append(regions[i])
-            
-            # Select best region from each cluster
-            clustered_regions = []
-            for cluster_id, cluster_regions in clusters.items():
-                if len(cluster_regions) == 1:
-                    best_region = cluster_regions[0]
-                else:
-                    best_region = self.select_best_region_from_cluster(cluster_regions)
-                
-                clustered_regions.append(best_region)
-            
-            return clustered_regions
+            return cluster_regions(regions, 0.4, self.select_best_region_from_cluster)
             
         except Exception as e:
             logger.error(f"Error clustering regions: {e}")
@@ -619,42 +537,39 @@ class GlobalGraphicDetector:
             return 0.0
     
     def generate_region_screenshots(self, pdf_path, regions):
-        """Generate screenshots for all regions"""
+        """Generate in-memory PNG screenshots for all regions, rendering each page once"""
         
         try:
-            screenshots = []
+            screenshots = [None] * len(regions)
             doc = fitz.open(pdf_path)
             
-            # Generate screenshots for all regions (not just top 3)
+            # Group regions by page so every page is rendered a single time
+            regions_by_page = defaultdict(list)
             for i, region in enumerate(regions):
-                page_num = region["page"] - 1
-                page = doc[page_num]
-                
-                # Convert page to image
-                mat = fitz.Matrix(2, 2)  # 2x zoom for better quality
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Convert to PIL Image
-                img_data = pix.tobytes("png")
-                pil_image = Image.open(io.BytesIO(img_data))
-                
-                # Extract region
-                x1, y1, x2, y2 = region["bbox"]
-                region_image = pil_image.crop((x1, y1, x2, y2))
-                
-                # Save screenshot
-                screenshot_path = f"/tmp/graphic_region_{i+1}.png"
-                region_image.save(screenshot_path)
+                regions_by_page[region["page"] - 1].append(i)
+            
+            for page_num, indices in sorted(regions_by_page.items()):
+                # Same 2x render the regions were found on
+                page_image = render_clip(doc[page_num], RENDER_ZOOM, None)
                 
-                screenshot_info = {
-                    "region_index": i + 1,
-                    "file_path": screenshot_path,
-                    "region_bbox": region["bbox"],
-                    "confidence": region["confidence"],
-                    "detection_method": region["detection_method"],
-                    "page": region["page"]
-                }
-                screenshots.append(screenshot_info)
+                for i in indices:
+                    region = regions[i]
+                    x1, y1, x2, y2 = region["bbox"]
+                    
+                    # Encode the crop straight into a buffer for the AI request
+                    crop = page_image[y1:y2, x1:x2]
+                    buffer = io.BytesIO()
+                    Image.fromarray(crop).save(buffer, format="PNG")
+                    
+                    screenshots[i] = {
+                        "region_index": i + 1,
+                        "image_png": buffer.getvalue(),
+                        "phash": dhash(crop),
+                        "region_bbox": region["bbox"],
+                        "confidence": region["confidence"],
+                        "detection_method": region["detection_method"],
+                        "page": region["page"]
+                    }
             
             doc.close()
             return screenshots
@@ -664,32 +579,86 @@ class GlobalGraphicDetector:
             return []
     
     def analyze_screenshots_with_ai(self, screenshots):
-        """Analyze each screenshot with OpenAI AI"""
+        """Analyze the screenshots with OpenAI AI, up to max_concurrency requests at a time.
+        
+        Near-duplicate crops (same perceptual hash within a few bits, same size) share the
+        analysis of their first occurrence; with a hash table store, hashes analyzed in
+        earlier documents are not sent again either.
+        """
         
         try:
+            if not screenshots:
+                return []
+            
+            representative = near_duplicate_groups(
+                [s["phash"] for s in screenshots],
+                [(s["region_bbox"][2] - s["region_bbox"][0], s["region_bbox"][3] - s["region_bbox"][1]) for s in screenshots]
+            )
+            unique = [s for i, s in enumerate(screenshots) if representative[i] == i]
+            
+            analyses = {}
+            if self.analysis_store is not None:
+                stored = self.analysis_store.get_graphic_ai_analyses([s["phash"] for s in unique], AI_VISION_MODEL)
+                for s in unique:
+                    row = stored.get(s["phash"])
+                    if row:
+                        analyses[s["region_index"]] = {
+                            "region_index": s["region_index"],
+                            "ai_analysis": row["analysis"],
+                            "raw_response": row.get("raw_response") or "",
+                            "success": True,
+                            "analysis_source": "hash_table"
+                        }
+            
+            pending = [s for s in unique if s["region_index"] not in analyses]
+            if self.max_concurrency <= 1 or len(pending) <= 1:
+                results = [self.analyze_screenshot_with_ai(screenshot) for screenshot in pending]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(pending))) as pool:
+                    results = list(pool.map(self.analyze_screenshot_with_ai, pending))
+            
+            for screenshot, result in zip(pending, results):
+                analyses[screenshot["region_index"]] = result
+                if result["success"] and self.analysis_store is not None:
+                    x1, y1, x2, y2 = screenshot["region_bbox"]
+                    self.analysis_store.save_graphic_ai_analysis(
+                        screenshot["phash"], AI_VISION_MODEL, x2 - x1, y2 - y1,
+                        result["ai_analysis"], result["raw_response"]
+                    )
+            
+            logger.info(f"AI analysis: {len(screenshots)} regions, {len(unique)} unique, {len(pending)} sent to the API")
+            
+            # One entry per region, in region order; duplicates point at the analyzed region
             ai_analysis = []
+            for i, screenshot in enumerate(screenshots):
+                source = screenshots[representative[i]]
+                analysis = analyses[source["region_index"]]
+                if representative[i] != i:
+                    analysis = dict(analysis, region_index=screenshot["region_index"],
+                                    analysis_source="duplicate", duplicate_of=source["region_index"])
+                ai_analysis.append(analysis)
+            return ai_analysis
             
-            for screenshot in screenshots:
-                try:
-                    # Read and encode image
-                    with open(screenshot["file_path"], "rb") as image_file:
-                        image_data = base64.b64encode(image_file.read()).decode('utf-8')
-                    
-                    # Prepare OpenAI API request
-                    headers = {
-                        "Authorization": f"Bearer {self.openai_api_key}",
-                        "Content-Type": "application/json"
-                    }
-                    
-                    payload = {
-                        "model": "gpt-4o",
-                        "messages": [
+        except Exception as e:
+            logger.error(f"Error in AI analysis: {e}")
+            return []
+    
+    def analyze_screenshot_with_ai(self, screenshot):
+        """Analyze one screenshot with OpenAI AI"""
+        
+        try:
+            # Encode the in-memory screenshot
+            image_data = base64.b64encode(screenshot["image_png"]).decode('utf-8')
+            
+            payload = {
+                "model": AI_VISION_MODEL,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": [
                             {
-                                "role": "user",
-                                "content": [
-                                    {
-                                        "type": "text",
-                                        "text": """Analyze this image and describe what you see. Focus on identifying:
+                                "type": "text",
+                                "text": """Analyze this image and describe what you see. Focus on identifying:
 1. Type of graphic (logo, illustration, diagram, chart, icon, etc.)
 2. Content description (what the graphic shows)
 3. Colors and visual elements
@@ -703,99 +672,136 @@ Provide a detailed analysis in JSON format with these fields:
 - brand_company: (if recognizable, otherwise null)
 - quality: (high/medium/low)
 - confidence: (0-1 score for your analysis)"""
-                                    },
-                                    {
-                                        "type": "image_url",
-                                        "image_url": {
-                                            "url": f"data:image/png;base64,{image_data}"
-                                        }
-                                    }
-                                ]
-                            }
-                        ],
-                        "max_tokens": 500
-                    }
-                    
-                    # Make API request
-                    response = requests.post(
-                        f"{self.openai_base_url}/chat/completions",
-                        headers=headers,
-                        json=payload,
-                        timeout=30
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        ai_content = result["choices"][0]["message"]["content"]
-                        
-                        # Try to parse JSON from AI response
-                        try:
-                            # Extract JSON from response (AI might wrap it in markdown)
-                            if "```json" in ai_content:
-                                json_start = ai_content.find("```json") + 7
-                                json_end = ai_content.find("```", json_start)
-                                json_str = ai_content[json_start:json_end].strip()
-                            else:
-                                json_str = ai_content.strip()
-                            
-                            ai_result = json.loads(json_str)
-                        except json.JSONDecodeError:
-                            # If JSON parsing fails, create a structured response
-                            ai_result = {
-                                "graphic_type": "unknown",
-                                "content_description": ai_content,
-                                "colors": [],
-                                "brand_company": None,
-                                "quality": "unknown",
-                                "confidence": 0.5
-                            }
-                        
-                        analysis_info = {
-                            "region_index": screenshot["region_index"],
-                            "ai_analysis": ai_result,
-                            "raw_response": ai_content,
-                            "success": True
-                        }
-                        
-                    else:
-                        analysis_info = {
-                            "region_index": screenshot["region_index"],
-                            "ai_analysis": {
-                                "graphic_type": "error",
-                                "content_description": f"API Error: {response.status_code}",
-                                "colors": [],
-                                "brand_company": None,
-                                "quality": "unknown",
-                                "confidence": 0.0
                             },
-                            "raw_response": "",
-                            "success": False
-                        }
-                    
-                    ai_analysis.append(analysis_info)
-                    
-                except Exception as e:
-                    logger.error(f"Error analyzing screenshot {screenshot['region_index']}: {e}")
-                    analysis_info = {
-                        "region_index": screenshot["region_index"],
-                        "ai_analysis": {
-                            "graphic_type": "error",
-                            "content_description": f"Analysis error: {str(e)}",
-                            "colors": [],
-                            "brand_company": None,
-                            "quality": "unknown",
-                            "confidence": 0.0
-                        },
-                        "raw_response": "",
-                        "success": False
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/png;base64,{image_data}"
+                                }
+                            }
+                        ]
                     }
-                    ai_analysis.append(analysis_info)
+                ],
+                "max_tokens": 500
+            }
             
-            return ai_analysis
+            # Make API request (retried on 429/5xx within the request deadline)
+            response = self.post_chat_completion(payload)
+            
+            if response.status_code != 200:
+                return self.failed_ai_analysis(screenshot, f"API Error: {response.status_code}")
+            
+            result = response.json()
+            ai_content = result["choices"][0]["message"]["content"]
+            
+            # Try to parse JSON from AI response
+            try:
+                # Extract JSON from response (AI might wrap it in markdown)
+                if "```json" in ai_content:
+                    json_start = ai_content.find("```json") + 7
+                    json_end = ai_content.find("```", json_start)
+                    json_str = ai_content[json_start:json_end].strip()
+                else:
+                    json_str = ai_content.strip()
+                
+                ai_result = json.loads(json_str)
+            except json.JSONDecodeError:
+                # If JSON parsing fails, create a structured response
+                ai_result = {
+                    "graphic_type": "unknown",
+                    "content_description": ai_content,
+                    "colors": [],
+                    "brand_company": None,
+                    "quality": "unknown",
+                    "confidence": 0.5
+                }
+            
+            return {
+                "region_index": screenshot["region_index"],
+                "ai_analysis": ai_result,
+                "raw_response": ai_content,
+                "success": True,
+                "analysis_source": "ai"
+            }
             
         except Exception as e:
-            logger.error(f"Error in AI analysis: {e}")
-            return []
+            logger.error(f"Error analyzing screenshot {screenshot['region_index']}: {e}")
+            return self.failed_ai_analysis(screenshot, f"Analysis error: {str(e)}")
+    
+    def failed_ai_analysis(self, screenshot, description):
+        """Analysis entry for a screenshot the AI could not analyze"""
+        
+        return {
+            "region_index": screenshot["region_index"],
+            "ai_analysis": {
+                "graphic_type": "error",
+                "content_description": description,
+                "colors": [],
+                "brand_company": None,
+                "quality": "unknown",
+                "confidence": 0.0
+            },
+            "raw_response": "",
+            "success": False
+        }
+    
+    def post_chat_completion(self, payload):
+        """POST a chat completion, retrying 429/5xx and connection errors with exponential backoff.
+        
+        Every attempt first waits for the model's shared rate limiter, which also learns from the response.
+        Gives up once the next attempt would start after the request deadline; the last
+        response is returned (or the last connection error raised) so the caller records the failure.
+        """
+        
+        headers = {
+            "Authorization": f"Bearer {self.openai_api_key}",
+            "Content-Type": "application/json"
+        }
+        deadline = time.monotonic() + self.request_deadline
+        limiter = openai_limiter(payload.get("model", AI_VISION_MODEL))
+        tokens = estimate_request_tokens(payload)
+        attempt = 0
+        
+        while True:
+            try:
+                limiter.acquire(tokens, deadline=deadline)
+            except TimeoutError:
+                raise TimeoutError(f"AI request deadline of {self.request_deadline}s exceeded") from None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"AI request deadline of {self.request_deadline}s exceeded")
+            
+            response, error = None, None
+            try:
+                response = requests_session().post(
+                    f"{self.openai_base_url}/chat/completions",
+                    headers=headers,
+                    json=payload,
+                    timeout=min(AI_ATTEMPT_TIMEOUT, remaining)
+                )
+                limiter.observe(response.status_code, response.headers)
+                if response.status_code not in AI_RETRY_STATUS:
+                    return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            
+            # Server-requested delay first, else exponential backoff with jitter
+            delay = AI_BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.0)
+            if response is not None:
+                try:
+                    delay = max(delay, float(response.headers.get("Retry-After", 0)))
+                except ValueError:
+                    pass
+            
+            if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                if response is not None:
+                    return response
+                raise error
+            
+            logger.warning(f"AI request attempt {attempt + 1} failed "
+                           f"({response.status_code if response is not None else error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
     
     def recommend_graphics(self, regions, ai_analysis):
         """Recommend graphics based on AI analysis"""
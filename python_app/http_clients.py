@@ -0,0 +1,213 @@
+"""
+Process-wide, keep-alive HTTP clients for the AI callers.
+
+Opening a session (or calling requests.post) per request costs a TCP and TLS
+handshake per request. Instead:
+
+- requests_session(): one requests.Session for the thread-based callers
+  (GlobalGraphicDetector, EnhancedAIAnalyzer), with a pool of at most
+  HTTP_MAX_CONNECTIONS_PER_HOST connections per host; further threads wait
+  for a free connection instead of opening throwaway ones.
+- aiohttp_session(): one aiohttp.ClientSession per event loop with the same
+  per-host limit and HTTP_MAX_CONNECTIONS in total. A session belongs to its
+  loop, so short-lived loops get nothing from it: Flask runs every async view
+  in a new loop, which is why llm_api hands its coroutines to
+  run_on_shared_loop(), one background loop whose session lives as long as
+  the process. asyncio.run() scripts close theirs with close_aiohttp_session().
+
+Both clients count requests and newly opened connections;
+connection_metrics() reports the reuse rate.
+"""
+
+import os
+import atexit
+import asyncio
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Dict, Iterator, Optional
+
+import aiohttp
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "16"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+# distinct hosts whose requests pools are kept (OpenAI, image CDNs, ...)
+HTTP_POOL_HOSTS = 8
+
+_lock = threading.Lock()
+_metrics = {
+    "requests": {"requests": 0, "new_connections": 0},
+    "aiohttp": {"requests": 0, "new_connections": 0, "reused_connections": 0},
+}
+
+
+def _count(client: str, key: str):
+    with _lock:
+        _metrics[client][key] += 1
+
+
+# --- requests ---------------------------------------------------------------
+# requests is imported on first use: the async-only services (llm_api, image_api)
+# import this module without having requests installed.
+
+def _counting_adapter_class():
+    """HTTPAdapter subclass whose pools count the connections they open"""
+    from requests.adapters import HTTPAdapter
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class CountingHTTPConnectionPool(HTTPConnectionPool):
+        def _new_conn(self):
+            _count("requests", "new_connections")
+            return super()._new_conn()
+
+    class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+        def _new_conn(self):
+            _count("requests", "new_connections")
+            return super()._new_conn()
+
+    class CountingAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": CountingHTTPConnectionPool,
+                "https": CountingHTTPSConnectionPool,
+            }
+
+        def send(self, request, **kwargs):
+            _count("requests", "requests")
+            return super().send(request, **kwargs)
+
+    return CountingAdapter
+
+
+_requests_session: Optional["requests.Session"] = None
+
+
+def requests_session() -> "requests.Session":
+    """The process-wide requests.Session (thread-safe for plain request/response use)"""
+    import requests
+
+    global _requests_session
+    with _lock:
+        if _requests_session is None:
+            session = requests.Session()
+            adapter_class = _counting_adapter_class()
+            adapter = adapter_class(pool_connections=HTTP_POOL_HOSTS,
+                                    pool_maxsize=HTTP_MAX_CONNECTIONS_PER_HOST, pool_block=True)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _requests_session = session
+        return _requests_session
+
+
+# --- aiohttp ----------------------------------------------------------------
+
+_aiohttp_sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    async def on_request_start(session, context, params):
+        _count("aiohttp", "requests")
+
+    async def on_connection_create_end(session, context, params):
+        _count("aiohttp", "new_connections")
+
+    async def on_connection_reuseconn(session, context, params):
+        _count("aiohttp", "reused_connections")
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace_config
+
+
+async def aiohttp_session() -> aiohttp.ClientSession:
+    """The keep-alive aiohttp session of the running event loop; do not close it after use"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        # sessions of loops that are gone cannot be used (or closed) any more
+        for other in [other for other in _aiohttp_sessions if other.is_closed()]:
+            del _aiohttp_sessions[other]
+        session = _aiohttp_sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=HTTP_MAX_CONNECTIONS,
+                                             limit_per_host=HTTP_MAX_CONNECTIONS_PER_HOST,
+                                             keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT)
+            session = aiohttp.ClientSession(connector=connector, trace_configs=[_trace_config()])
+            _aiohttp_sessions[loop] = session
+        return session
+
+
+async def close_aiohttp_session():
+    """Close the running loop's session; call before the loop ends (e.g. at the end of asyncio.run)"""
+    with _lock:
+        session = _aiohttp_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+# --- shared background loop -------------------------------------------------
+
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def shared_loop() -> asyncio.AbstractEventLoop:
+    """A process-wide event loop running in a daemon thread"""
+    global _shared_loop
+    with _lock:
+        if _shared_loop is None:
+            _shared_loop = asyncio.new_event_loop()
+            threading.Thread(target=_shared_loop.run_forever, name="ai-http-loop", daemon=True).start()
+            atexit.register(_close_shared_loop_session)
+        return _shared_loop
+
+
+def _close_shared_loop_session():
+    try:
+        asyncio.run_coroutine_threadsafe(close_aiohttp_session(), _shared_loop).result(timeout=5)
+    except Exception as e:
+        logger.debug(f"Closing the shared loop's HTTP session failed: {e}")
+
+
+async def run_on_shared_loop(coro: Awaitable[Any]) -> Any:
+    """Await `coro` on the shared loop, so the aiohttp session it uses outlives the caller's loop.
+
+    The loop serves every request: `coro` must not block it, blocking (database) work inside
+    goes through asyncio.to_thread."""
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, shared_loop()))
+
+
+def iterate_on_shared_loop(agen: AsyncIterator[Any]) -> Iterator[Any]:
+    """Drive an async generator on the shared loop from synchronous code (e.g. a streamed
+    Flask response), one item at a time; closing this iterator closes the generator."""
+    loop = shared_loop()
+
+    async def next_item():
+        return await agen.__anext__()
+
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(next_item(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
+
+# --- metrics ----------------------------------------------------------------
+
+def connection_metrics() -> Dict[str, Dict[str, Any]]:
+    """Requests, new connections and connection reuse rate per client"""
+    with _lock:
+        metrics = {client: dict(counts) for client, counts in _metrics.items()}
+    for counts in metrics.values():
+        requests_sent = counts["requests"]
+        counts["reuse_rate"] = round(1 - counts["new_connections"] / requests_sent, 3) if requests_sent else None
+    return metrics
@@ -16,6 +16,9 @@ import base64
 import logging
 from urllib.parse import urlparse, parse_qs
 
+from rate_limiter import RATE_LIMIT_RETRIES, openai_limiter, estimate_request_tokens
+from http_clients import aiohttp_session, close_aiohttp_session
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -94,7 +97,7 @@ class ImageAnalysisService:
             return None, 'error', url
     
     async def analyze_image(self, session: aiohttp.ClientSession, 
-                           image_data: bytes, url: str, content_type: str) -> dict:
+                           image_data: bytes, url: str, content_type: str, attempt: int = 0) -> dict:
         """Analysiert Bild mit GPT-4o"""
         
         # Ultra-detaillierter Prompt für Bosch Brand Guide Referenz-Bilder
@@ -163,11 +166,17 @@ Antworte als strukturiertes JSON mit sehr detaillierten deutschen Beschreibungen
                 "max_completion_tokens": 15000
             }
             
+            limiter = openai_limiter(self.model)
+            await limiter.acquire_async(estimate_request_tokens(payload))
             async with session.post(
                 "https://api.openai.com/v1/chat/completions",
                 headers=self.headers,
                 json=payload
             ) as response:
+                limiter.observe(response.status, response.headers)
+                if response.status == 429 and attempt < RATE_LIMIT_RETRIES:
+                    # Limiter pausiert für Retry-After; erneut senden
+                    return await self.analyze_image(session, image_data, url, content_type, attempt + 1)
                 if response.status == 200:
                     data = await response.json()
                     content = data['choices'][0]['message']['content']
@@ -346,9 +355,9 @@ Antworte als strukturiertes JSON mit sehr detaillierten deutschen Beschreibungen
         logger.info(f"Starting image analysis of {len(image_urls)} images")
         self.stats['start_time'] = datetime.utcnow()
         
-        async with aiohttp.ClientSession() as session:
-            tasks = [self.process_single_image(session, url) for url in image_urls]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        session = await aiohttp_session()
+        tasks = [self.process_single_image(session, url) for url in image_urls]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
         
         self.stats['end_time'] = datetime.utcnow()
         
@@ -427,6 +436,7 @@ async def main():
     
     # Starte Analyse
     results = await analyzer.analyze_images(test_urls)
+    await close_aiohttp_session()
     
     # Speichere Ergebnisse
     stats = analyzer.save_results(results)
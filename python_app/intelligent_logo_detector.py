@@ -1,15 +1,11 @@
 import os
 import json
 import logging
-import numpy as np
-from collections import defaultdict
 import fitz  # PyMuPDF
 from PIL import Image, ImageDraw
-import cv2
 import io
-import tempfile
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
+from region_proposals import RENDER_ZOOM, page_proposals, cluster_regions
+from tiled_render import render_clip
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,7 +16,6 @@ class IntelligentLogoDetector:
     
     def __init__(self):
         self.logo_regions = []
-        self.screenshot_paths = []
         
     def detect_logo_regions(self, pdf_path):
         """Main method to detect logo regions and generate screenshots"""
@@ -51,7 +46,10 @@ class IntelligentLogoDetector:
             recommended = self.recommend_best_logo_region(ranked_regions, screenshots)
             
             detection_results["logo_regions"] = ranked_regions
-            detection_results["screenshots"] = screenshots
+            # the PNG bytes stay in memory; the result carries the metadata only
+            detection_results["screenshots"] = [
+                {k: v for k, v in screenshot.items() if k != "image_png"} for screenshot in screenshots
+            ]
             detection_results["recommended_regions"] = recommended
             detection_results["analysis_summary"] = self.analyze_logo_regions(ranked_regions)
             
@@ -69,33 +67,23 @@ class IntelligentLogoDetector:
             doc = fitz.open(pdf_path)
             
             for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Convert page to image
-                mat = fitz.Matrix(2, 2)  # 2x zoom for better quality
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Convert to PIL Image
-                img_data = pix.tobytes("png")
-                pil_image = Image.open(io.BytesIO(img_data))
-                
-                # Convert to OpenCV format
-                cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+                # Proposals are shared with GlobalGraphicDetector and memoized per page
+                proposals = page_proposals(pdf_path, doc[page_num])
                 
                 # Method 1: Color-based regions
-                color_regions = self.find_color_based_regions(cv_image, page_num)
+                color_regions = self.find_color_based_regions(proposals, page_num)
                 all_regions.extend(color_regions)
                 
                 # Method 2: Edge-based regions
-                edge_regions = self.find_edge_based_regions(cv_image, page_num)
+                edge_regions = self.find_edge_based_regions(proposals, page_num)
                 all_regions.extend(edge_regions)
                 
                 # Method 3: Contour-based regions
-                contour_regions = self.find_contour_based_regions(cv_image, page_num)
+                contour_regions = self.find_contour_based_regions(proposals, page_num)
                 all_regions.extend(contour_regions)
                 
                 # Method 4: Position-based regions (top-right corner)
-                position_regions = self.find_position_based_regions(cv_image, page_num)
+                position_regions = self.find_position_based_regions(proposals, page_num)
                 all_regions.extend(position_regions)
             
             doc.close()
@@ -105,16 +93,13 @@ class IntelligentLogoDetector:
             logger.error(f"Error finding potential regions: {e}")
             return []
     
-    def find_color_based_regions(self, cv_image, page_num):
+    def find_color_based_regions(self, proposals, page_num):
         """Find regions based on logo colors"""
         
         try:
             regions = []
             
-            # Convert to HSV for better color analysis
-            hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
-            
-            # Define logo color ranges
+            # Define logo color ranges (HSV)
             color_ranges = {
                 "blue": ([100, 50, 50], [130, 255, 255]),
                 "red": ([0, 50, 50], [10, 255, 255]),
@@ -124,17 +109,8 @@ class IntelligentLogoDetector:
             }
             
             for color_name, (lower, upper) in color_ranges.items():
-                # Create mask for color
-                mask = cv2.inRange(hsv, np.array(lower), np.array(upper))
-                
-                # Find contours
-                contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                for contour in contours:
-                    area = cv2.contourArea(contour)
+                for area, x, y, w, h in proposals.color_components(lower, upper):
                     if 100 < area < 10000:  # Filter by size
-                        x, y, w, h = cv2.boundingRect(contour)
-                        
                         region_info = {
                             "bbox": [x, y, x + w, y + h],
                             "area": area,
@@ -155,29 +131,16 @@ class IntelligentLogoDetector:
             logger.error(f"Error finding color-based regions: {e}")
             return []
     
-    def find_edge_based_regions(self, cv_image, page_num):
+    def find_edge_based_regions(self, proposals, page_num):
         """Find regions based on edge detection"""
         
         try:
             regions = []
             
-            # Convert to grayscale
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
-            # Edge detection
-            edges = cv2.Canny(gray, 50, 150)
-            
-            # Find contours
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            for contour in contours:
-                area = cv2.contourArea(contour)
+            for area, x, y, w, h, edge_count in proposals.edge_components(((50, 150),)):
                 if 200 < area < 15000:  # Filter by size
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
                     # Calculate edge density
-                    roi = edges[y:y+h, x:x+w]
-                    edge_density = np.sum(roi > 0) / (w * h)
+                    edge_density = edge_count / (w * h)
                     
                     if edge_density > 0.05:  # Minimum edge density
                         region_info = {
@@ -200,26 +163,14 @@ class IntelligentLogoDetector:
             logger.error(f"Error finding edge-based regions: {e}")
             return []
     
-    def find_contour_based_regions(self, cv_image, page_num):
+    def find_contour_based_regions(self, proposals, page_num):
         """Find regions based on contour analysis"""
         
         try:
             regions = []
             
-            # Convert to grayscale
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
-            # Binary threshold
-            _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
-            
-            # Find contours
-            contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            for contour in contours:
-                area = cv2.contourArea(contour)
+            for area, x, y, w, h in proposals.threshold_components(127):
                 if 300 < area < 20000:  # Filter by size
-                    x, y, w, h = cv2.boundingRect(contour)
-                    
                     # Calculate aspect ratio
                     aspect_ratio = w / h if h > 0 else 0
                     
@@ -245,13 +196,13 @@ class IntelligentLogoDetector:
             logger.error(f"Error finding contour-based regions: {e}")
             return []
     
-    def find_position_based_regions(self, cv_image, page_num):
+    def find_position_based_regions(self, proposals, page_num):
         """Find regions based on typical logo positions"""
         
         try:
             regions = []
             
-            img_height, img_width = cv_image.shape[:2]
+            img_width, img_height = proposals.image_size
             
             # Define typical logo positions
             logo_positions = [
@@ -304,44 +255,7 @@ class IntelligentLogoDetector:
         """Cluster similar regions to eliminate duplicates"""
         
         try:
-            if not regions:
-                return []
-            
-            # Prepare features for clustering
-            features = []
-            for region in regions:
-                # Normalize features
-                center_x_norm = region["center_x"] / 2000  # Normalize by typical image width
-                center_y_norm = region["center_y"] / 2000  # Normalize by typical image height
-                area_norm = region["area"] / 10000  # Normalize by typical area
-                
-                features.append([center_x_norm, center_y_norm, area_norm])
-            
-            # Use DBSCAN for clustering
-            scaler = StandardScaler()
-            features_scaled = scaler.fit_transform(features)
-            
-            # Cluster with DBSCAN
-            clustering = DBSCAN(eps=0.3, min_samples=1).fit(features_scaled)
-            
-            # Group regions by cluster
-            clusters = defaultdict(list)
-            for i, label in enumerate(clustering.labels_):
-                clusters[label].append(regions[i])
-            
-            # Select best region from each cluster
-            clustered_regions = []
-            for cluster_id, cluster_regions in clusters.items():
-                if len(cluster_regions) == 1:
-                    # Single region, keep as is
-                    best_region = cluster_regions[0]
-                else:
-                    # Multiple regions, select the best one
-                    best_region = self.select_best_region_from_cluster(cluster_regions)
-                
-                clustered_regions.append(best_region)
-            
-            return clustered_regions
+            return cluster_regions(regions, 0.3, self.select_best_region_from_cluster)
             
         except Exception as e:
             logger.error(f"Error clustering regions: {e}")
@@ -465,7 +379,7 @@ class IntelligentLogoDetector:
             return 0.0
     
     def generate_region_screenshots(self, pdf_path, regions):
-        """Generate screenshots for the top regions"""
+        """Generate in-memory PNG screenshots for the top regions"""
         
         try:
             screenshots = []
@@ -475,28 +389,17 @@ class IntelligentLogoDetector:
             top_regions = regions[:3]
             
             for i, region in enumerate(top_regions):
-                page_num = region["page"] - 1
-                page = doc[page_num]
+                # Same 2x render the regions were found on
+                page_image = render_clip(doc[region["page"] - 1], RENDER_ZOOM, None)
                 
-                # Convert page to image
-                mat = fitz.Matrix(2, 2)  # 2x zoom for better quality
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Convert to PIL Image
-                img_data = pix.tobytes("png")
-                pil_image = Image.open(io.BytesIO(img_data))
-                
-                # Extract region
+                # Encode the crop straight into a buffer
                 x1, y1, x2, y2 = region["bbox"]
-                region_image = pil_image.crop((x1, y1, x2, y2))
-                
-                # Save screenshot
-                screenshot_path = f"/tmp/logo_region_{i+1}.png"
-                region_image.save(screenshot_path)
+                buffer = io.BytesIO()
+                Image.fromarray(page_image[y1:y2, x1:x2]).save(buffer, format="PNG")
                 
                 screenshot_info = {
                     "region_index": i + 1,
-                    "file_path": screenshot_path,
+                    "image_png": buffer.getvalue(),
                     "region_bbox": region["bbox"],
                     "confidence": region["confidence"],
                     "detection_method": region["detection_method"],
@@ -530,7 +433,7 @@ class IntelligentLogoDetector:
             
             recommendation = {
                 "best_region": best_region,
-                "screenshot_path": best_screenshot["file_path"] if best_screenshot else None,
+                "screenshot_index": best_screenshot["region_index"] if best_screenshot else None,
                 "confidence": best_region["confidence"],
                 "reasoning": self.generate_recommendation_reasoning(best_region),
                 "ai_ready": True
@@ -11,6 +11,12 @@ import requests
 from datetime import datetime
 import openai
 from database import db_manager
+from embedding_batches import plan_batches
+from rate_limiter import openai_limiter, estimate_request_tokens
+from embedding_cache import (EMBEDDING_CACHE_ENABLED, content_hash, get_cached_embeddings,
+                             save_cached_embeddings, missing_indices)
+from response_cache import (RESPONSE_CACHE_ENABLED, get_cached_response, save_cached_response,
+                            invalidate_cached_responses)
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +27,7 @@ class KnowledgeDatabaseManager:
         self.openai_client = None
         self.embedding_model = "text-embedding-3-small"
         self.embedding_dimensions = 1536
+        self.llm_model = "gpt-4o"
         self.init_openai_client()
     
     def init_openai_client(self):
@@ -33,6 +40,18 @@ class KnowledgeDatabaseManager:
             logger.error(f"Failed to initialize OpenAI client: {e}")
             self.openai_client = None
     
+    def _limited_create(self, resource, **kwargs):
+        """resource.create(**kwargs) (embeddings, chat.completions) through the model's shared rate limiter"""
+        limiter = openai_limiter(kwargs["model"])
+        limiter.acquire(estimate_request_tokens(kwargs))
+        try:
+            raw = resource.with_raw_response.create(**kwargs)
+        except openai.APIStatusError as e:
+            limiter.observe(e.status_code, e.response.headers)
+            raise
+        limiter.observe(raw.status_code, raw.headers)
+        return raw.parse()
+    
     def create_embedding(self, text: str) -> Optional[List[float]]:
         """Create embedding for text using OpenAI"""
         if not self.openai_client:
@@ -40,7 +59,8 @@ class KnowledgeDatabaseManager:
             return None
         
         try:
-            response = self.openai_client.embeddings.create(
+            response = self._limited_create(
+                self.openai_client.embeddings,
                 model=self.embedding_model,
                 input=text
             )
@@ -49,6 +69,50 @@ class KnowledgeDatabaseManager:
             logger.error(f"Error creating embedding: {e}")
             return None
     
+    def create_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Create embeddings for many texts, packed into as few API requests as plan_batches allows.
+        
+        Texts of a failed request are retried one by one; texts already in the embedding cache are not
+        sent at all. Returns one embedding (or None) per text, in order.
+        """
+        hashes = [content_hash(text) if text and text.strip() else None for text in texts]
+        
+        conn = db_manager.get_connection() if EMBEDDING_CACHE_ENABLED else None
+        try:
+            cached = get_cached_embeddings(conn, hashes, self.embedding_model, self.embedding_dimensions)
+            todo = missing_indices(hashes, cached)
+            if conn:
+                logger.info(f"Embedding cache: {len(cached)} cached, {len(todo)} to embed")
+            created: Dict[str, List[float]] = {}
+            
+            if todo and not self.openai_client:
+                logger.error("OpenAI client not available")
+                todo = []
+            
+            batches = [[todo[j] for j in batch] for batch in plan_batches([texts[i] for i in todo])]
+            for n, batch in enumerate(batches):
+                try:
+                    response = self._limited_create(
+                        self.openai_client.embeddings,
+                        model=self.embedding_model,
+                        input=[texts[i] for i in batch]
+                    )
+                    for item in response.data:
+                        created[hashes[batch[item.index]]] = item.embedding
+                    logger.info(f"Embedding request {n + 1}/{len(batches)}: {len(batch)} texts")
+                except Exception as e:
+                    logger.warning(f"Embedding request {n + 1}/{len(batches)} failed ({e}), retrying {len(batch)} texts individually")
+                    for i in batch:
+                        embedding = self.create_embedding(texts[i])
+                        if embedding:
+                            created[hashes[i]] = embedding
+            
+            save_cached_embeddings(conn, created, self.embedding_model, self.embedding_dimensions)
+        finally:
+            db_manager.return_connection(conn)
+        
+        return [cached.get(h) or created.get(h) if h else None for h in hashes]
+    
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """Split text into chunks with overlap"""
         if len(text) <= chunk_size:
@@ -206,10 +270,11 @@ class KnowledgeDatabaseManager:
         """Save knowledge chunks to database with embeddings"""
         saved_chunk_ids = []
         
-        for chunk in chunks:
+        # Create embeddings for all chunk contents, many per request
+        embeddings = self.create_embeddings([chunk['content'] for chunk in chunks])
+        
+        for chunk, embedding in zip(chunks, embeddings):
             try:
-                # Create embedding for the chunk content
-                embedding = self.create_embedding(chunk['content'])
                 if not embedding:
                     logger.warning(f"Failed to create embedding for chunk {chunk['chunk_index']}")
                     continue
@@ -231,6 +296,10 @@ class KnowledgeDatabaseManager:
             except Exception as e:
                 logger.error(f"Error saving knowledge chunk: {e}")
         
+        if saved_chunk_ids:
+            # New chunks can change the sources of any cached answer
+            self.invalidate_cached_answers()
+        
         return saved_chunk_ids
     
     def insert_knowledge_chunk(self, pdf_document_id: str, chunk_type: str, chunk_index: int, 
@@ -259,11 +328,12 @@ class KnowledgeDatabaseManager:
             logger.error(f"Error inserting knowledge chunk: {e}")
             return None
     
-    def search_knowledge(self, query_text: str, limit: int = 5, similarity_threshold: float = 0.7) -> List[Dict]:
+    def search_knowledge(self, query_text: str, limit: int = 5, similarity_threshold: float = 0.7,
+                         query_embedding: Optional[List[float]] = None) -> List[Dict]:
         """Search knowledge base using vector similarity and text matching"""
         try:
             # Create embedding for query
-            query_embedding = self.create_embedding(query_text)
+            query_embedding = query_embedding or self.create_embedding(query_text)
             if not query_embedding:
                 logger.error("Failed to create query embedding")
                 return []
@@ -359,11 +429,74 @@ class KnowledgeDatabaseManager:
             logger.error(f"Error searching knowledge: {e}")
             return []
     
+    def _knowledge_messages(self, query_text: str, search_results: List[Dict]) -> List[Dict]:
+        """Chat messages answering query_text from the found chunks"""
+        context = "\n\n".join([result['content'] for result in search_results])
+        return [
+            {
+                "role": "system",
+                "content": "You are a helpful assistant that analyzes PDF documents. Use the provided context to answer questions about colors, fonts, layout, images, and other design elements found in PDFs."
+            },
+            {
+                "role": "user",
+                "content": f"Context from PDF analysis:\n\n{context}\n\nQuestion: {query_text}"
+            }
+        ]
+    
+    def get_cached_answer(self, query_embedding: Optional[List[float]], limit: int) -> Optional[Dict]:
+        """Cached answer to an earlier, semantically equal question (see response_cache.py)"""
+        if not RESPONSE_CACHE_ENABLED:
+            return None
+        conn = db_manager.get_connection()
+        try:
+            return get_cached_response(conn, "knowledge", None, query_embedding,
+                                       self.embedding_model, self.llm_model, limit)
+        finally:
+            db_manager.return_connection(conn)
+    
+    def save_cached_answer(self, query_text: str, query_embedding: Optional[List[float]], limit: int,
+                           response_text: str, search_results: List[Dict]):
+        """Store a generated answer in the response cache"""
+        if not RESPONSE_CACHE_ENABLED:
+            return
+        conn = db_manager.get_connection()
+        try:
+            save_cached_response(conn, "knowledge", None, query_text, query_embedding, self.embedding_model,
+                                 self.llm_model, limit, response_text, search_results)
+        finally:
+            db_manager.return_connection(conn)
+    
+    def invalidate_cached_answers(self):
+        """Drop all cached answers of the knowledge base"""
+        conn = db_manager.get_connection()
+        try:
+            invalidate_cached_responses(conn, "knowledge")
+        finally:
+            db_manager.return_connection(conn)
+    
     def query_knowledge_with_gpt(self, query_text: str, limit: int = 5) -> Dict:
-        """Query knowledge base and generate GPT response"""
+        """Query knowledge base and generate GPT response (or the cached answer of an equal earlier query)"""
         try:
+            # Query embedding, through the embedding cache; used for the response cache, search and history
+            query_embedding = self.create_embeddings([query_text])[0]
+            
+            cached = self.get_cached_answer(query_embedding, limit)
+            if cached:
+                query_id = self.save_knowledge_query(query_text, cached['response_text'], cached['sources'],
+                                                     query_embedding)
+                return {
+                    "success": True,
+                    "query_text": query_text,
+                    "response_text": cached['response_text'],
+                    "sources": cached['sources'],
+                    "query_id": query_id,
+                    "total_sources": len(cached['sources']),
+                    "cached": True,
+                    "cache_similarity": cached['similarity']
+                }
+            
             # Search for relevant chunks
-            search_results = self.search_knowledge(query_text, limit)
+            search_results = self.search_knowledge(query_text, limit, query_embedding=query_embedding)
             
             if not search_results:
                 return {
@@ -372,22 +505,11 @@ class KnowledgeDatabaseManager:
                     "query_text": query_text
                 }
             
-            # Prepare context for GPT
-            context = "\n\n".join([result['content'] for result in search_results])
-            
             # Generate GPT response
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that analyzes PDF documents. Use the provided context to answer questions about colors, fonts, layout, images, and other design elements found in PDFs."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Context from PDF analysis:\n\n{context}\n\nQuestion: {query_text}"
-                    }
-                ],
+            response = self._limited_create(
+                self.openai_client.chat.completions,
+                model=self.llm_model,
+                messages=self._knowledge_messages(query_text, search_results),
                 max_tokens=1000,
                 temperature=0.3
             )
@@ -395,7 +517,8 @@ class KnowledgeDatabaseManager:
             response_text = response.choices[0].message.content
             
             # Save query and response
-            query_id = self.save_knowledge_query(query_text, response_text, search_results)
+            query_id = self.save_knowledge_query(query_text, response_text, search_results, query_embedding)
+            self.save_cached_answer(query_text, query_embedding, limit, response_text, search_results)
             
             return {
                 "success": True,
@@ -403,7 +526,8 @@ class KnowledgeDatabaseManager:
                 "response_text": response_text,
                 "sources": search_results,
                 "query_id": query_id,
-                "total_sources": len(search_results)
+                "total_sources": len(search_results),
+                "cached": False
             }
             
         except Exception as e:
@@ -414,11 +538,78 @@ class KnowledgeDatabaseManager:
                 "query_text": query_text
             }
     
-    def save_knowledge_query(self, query_text: str, response_text: str, sources: List[Dict]) -> Optional[str]:
+    def stream_knowledge_with_gpt(self, query_text: str, limit: int = 5):
+        """Like query_knowledge_with_gpt, as (event, data) pairs for a server-sent event stream:
+        "sources" as soon as the search is done, "token" per piece of the answer, then "done"."""
+        query_embedding = self.create_embeddings([query_text])[0]
+        
+        cached = self.get_cached_answer(query_embedding, limit)
+        if cached:
+            yield "sources", {
+                "query_text": query_text,
+                "sources": cached['sources'],
+                "total_sources": len(cached['sources'])
+            }
+            yield "token", {"text": cached['response_text']}
+            query_id = self.save_knowledge_query(query_text, cached['response_text'], cached['sources'],
+                                                 query_embedding)
+            yield "done", {"query_id": query_id, "total_sources": len(cached['sources']),
+                           "cached": True, "cache_similarity": cached['similarity']}
+            return
+        
+        search_results = self.search_knowledge(query_text, limit, query_embedding=query_embedding)
+        
+        if not search_results:
+            yield "error", {"error": "No relevant knowledge found", "query_text": query_text}
+            return
+        
+        yield "sources", {
+            "query_text": query_text,
+            "sources": search_results,
+            "total_sources": len(search_results)
+        }
+        
+        stream = self._limited_create(
+            self.openai_client.chat.completions,
+            model=self.llm_model,
+            messages=self._knowledge_messages(query_text, search_results),
+            max_tokens=1000,
+            temperature=0.3,
+            stream=True
+        )
+        
+        pieces = []
+        finish_reason = None
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                piece = chunk.choices[0].delta.content
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                if piece:
+                    pieces.append(piece)
+                    yield "token", {"text": piece}
+        finally:
+            # client gone: stop reading the completion
+            stream.close()
+        
+        if not finish_reason:
+            # cut off: neither stored nor cached; the event stream reports the error
+            raise RuntimeError("GPT stream ended before the answer was complete")
+        
+        # Save query and (complete) response
+        response_text = "".join(pieces)
+        query_id = self.save_knowledge_query(query_text, response_text, search_results, query_embedding)
+        self.save_cached_answer(query_text, query_embedding, limit, response_text, search_results)
+        
+        yield "done", {"query_id": query_id, "total_sources": len(search_results), "cached": False}
+    
+    def save_knowledge_query(self, query_text: str, response_text: str, sources: List[Dict],
+                             query_embedding: Optional[List[float]] = None) -> Optional[str]:
         """Save knowledge query and response"""
         try:
             # Create embedding for query
-            query_embedding = self.create_embedding(query_text)
+            query_embedding = query_embedding or self.create_embedding(query_text)
             
             # Save query
             query = """
@@ -432,7 +623,7 @@ class KnowledgeDatabaseManager:
                 query,
                 (query_text, query_embedding, response_text, 
                  json.dumps([{'chunk_id': s['id'], 'similarity_score': s['similarity_score']} for s in sources]),
-                 'gpt-4o')
+                 self.llm_model)
             )
             
             if result and len(result) > 0:
@@ -8,7 +8,6 @@ import os
 import json
 import logging
 import asyncio
-import aiohttp
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from flask import Flask, request, jsonify
@@ -16,6 +15,10 @@ from flask_cors import CORS
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from embedding_service import OpenAIEmbeddingService
+from embedding_cache import get_cache_stats
+from response_cache import get_response_cache_stats
+from http_clients import run_on_shared_loop, iterate_on_shared_loop, connection_metrics
+from sse import event_stream_response
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -74,7 +77,7 @@ async def semantic_search():
             return jsonify({'error': 'Brand ID is required'}), 400
         
         # Perform semantic search
-        results = await embedding_service.semantic_search(query, brand_id, limit)
+        results = await run_on_shared_loop(embedding_service.semantic_search(query, brand_id, limit))
         
         return jsonify({
             'query': query,
@@ -87,6 +90,43 @@ async def semantic_search():
         logger.error(f"Semantic search error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def answer_events(question: str, brand_id: str, limit: int, query_embedding: Optional[List[float]],
+                  search_results: List[Dict[str, Any]]):
+    """Server-sent events of a streamed answer: sources, answer tokens, done"""
+    yield 'sources', {
+        'question': question,
+        'sources': search_results,
+        'source_count': len(search_results)
+    }
+    pieces = []
+    # a stream failing after the first token raises here: the client gets an "error" event
+    # instead of "done", and the partial answer is not cached
+    for piece in iterate_on_shared_loop(embedding_service.generate_llm_response_streaming(question, search_results)):
+        pieces.append(piece)
+        yield 'token', {'text': piece}
+    answer = ''.join(pieces)
+    embedding_service.save_cached_answer(question, query_embedding, brand_id, limit, answer, search_results)
+    yield 'done', {
+        'answer_length': len(answer),
+        'cached': False,
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
+def cached_answer_events(question: str, cached: Dict[str, Any]):
+    """Server-sent events of a cached answer, in one token"""
+    yield 'sources', {
+        'question': question,
+        'sources': cached['sources'],
+        'source_count': len(cached['sources'])
+    }
+    yield 'token', {'text': cached['response_text']}
+    yield 'done', {
+        'answer_length': len(cached['response_text']),
+        'cached': True,
+        'cache_similarity': cached['similarity'],
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
 @app.route('/api/ask', methods=['POST'])
 async def ask_question():
     """Ask a question and get LLM response"""
@@ -103,27 +143,46 @@ async def ask_question():
         if not brand_id:
             return jsonify({'error': 'Brand ID is required'}), 400
         
+        # AI calls run on the shared loop and its keep-alive session
+        query_embedding = await run_on_shared_loop(embedding_service.embed_query(question))
+        
+        # Answer of an earlier question with the same meaning, if its sources are unchanged
+        cached = embedding_service.get_cached_answer(query_embedding, brand_id, limit)
+        if cached:
+            if stream:
+                return event_stream_response(cached_answer_events(question, cached))
+            return jsonify({
+                'question': question,
+                'answer': cached['response_text'],
+                'sources': cached['sources'],
+                'source_count': len(cached['sources']),
+                'cached': True,
+                'cache_similarity': cached['similarity'],
+                'timestamp': datetime.utcnow().isoformat()
+            })
+        
         # Perform semantic search first
-        search_results = await embedding_service.semantic_search(question, brand_id, limit)
+        search_results = await run_on_shared_loop(embedding_service.semantic_search(
+            question, brand_id, limit, query_embedding
+        ))
         
         # Generate LLM response
-        async with aiohttp.ClientSession() as session:
-            if stream:
-                return await embedding_service.generate_llm_response_streaming(
-                    question, search_results, session
-                )
-            else:
-                response = await embedding_service.generate_llm_response(
-                    question, search_results, session
-                )
-                
-                return jsonify({
-                    'question': question,
-                    'answer': response,
-                    'sources': search_results,
-                    'source_count': len(search_results),
-                    'timestamp': datetime.utcnow().isoformat()
-                })
+        if stream:
+            return event_stream_response(answer_events(question, brand_id, limit, query_embedding, search_results))
+        else:
+            response = await run_on_shared_loop(embedding_service.generate_llm_response(
+                question, search_results
+            ))
+            embedding_service.save_cached_answer(question, query_embedding, brand_id, limit, response, search_results)
+            
+            return jsonify({
+                'question': question,
+                'answer': response,
+                'sources': search_results,
+                'source_count': len(search_results),
+                'cached': False,
+                'timestamp': datetime.utcnow().isoformat()
+            })
         
     except Exception as e:
         logger.error(f"Ask question error: {e}")
@@ -254,7 +313,7 @@ async def check_compliance():
         
         # Perform semantic search for relevant guidelines
         query = f"Brand compliance guidelines for {check_type}"
-        search_results = await embedding_service.semantic_search(query, brand_id, limit=10)
+        search_results = await run_on_shared_loop(embedding_service.semantic_search(query, brand_id, limit=10))
         
         # Generate compliance assessment
         compliance_prompt = f"""Du bist ein Experte für Brand-Compliance-Prüfung. 
@@ -267,10 +326,9 @@ Brand-Guidelines:
 
 Bewerte auf einer Skala von 0-1 (0 = nicht konform, 1 = vollständig konform) und gib spezifische Empfehlungen."""
 
-        async with aiohttp.ClientSession() as session:
-            assessment = await embedding_service.generate_llm_response(
-                compliance_prompt, search_results, session
-            )
+        assessment = await run_on_shared_loop(embedding_service.generate_llm_response(
+            compliance_prompt, search_results
+        ))
         
         # Calculate compliance score (simplified)
         compliance_score = 0.8  # This should be calculated based on the assessment
@@ -309,11 +367,31 @@ def get_embedding_status():
             """)
             
             status_data = cursor.fetchall()
-            
-            return jsonify({
-                'embedding_status': [dict(status) for status in status_data],
-                'timestamp': datetime.utcnow().isoformat()
-            })
+        
+        try:
+            cache_stats = get_cache_stats(connection)
+        except Exception as e:
+            logger.warning(f"Embedding cache stats unavailable: {e}")
+            connection.rollback()
+            cache_stats = []
+        
+        try:
+            response_cache_stats = get_response_cache_stats(connection)
+        except Exception as e:
+            logger.warning(f"Response cache stats unavailable: {e}")
+            connection.rollback()
+            response_cache_stats = []
+        
+        return jsonify({
+            'embedding_status': [dict(status) for status in status_data],
+            'embedding_cache': {
+                'hits': sum(row['hits'] for row in cache_stats),
+                'misses': sum(row['misses'] for row in cache_stats),
+                'by_model': cache_stats
+            },
+            'response_cache': response_cache_stats,
+            'timestamp': datetime.utcnow().isoformat()
+        })
             
     except Exception as e:
         logger.error(f"Get embedding status error: {e}")
@@ -322,6 +400,14 @@ def get_embedding_status():
         if 'connection' in locals():
             connection.close()
 
+@app.route('/api/metrics/http', methods=['GET'])
+def get_http_metrics():
+    """Get request and connection reuse counts of the shared HTTP clients"""
+    return jsonify({
+        'http_clients': connection_metrics(),
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
 @app.route('/api/embeddings/generate', methods=['POST'])
 async def generate_embeddings():
     """Generate embeddings for a brand"""
@@ -333,7 +419,7 @@ async def generate_embeddings():
             return jsonify({'error': 'Brand ID is required'}), 400
         
         # Generate embeddings
-        success = await embedding_service.process_brand_embeddings(brand_id)
+        success = await run_on_shared_loop(embedding_service.process_brand_embeddings(brand_id))
         
         if success:
             return jsonify({
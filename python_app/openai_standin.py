@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI chat-completions and embeddings endpoints.
+
+Answers POST /v1/chat/completions after a fixed latency with a small JSON graphic,
+font, layout or combined font+layout analysis (picked from the prompt), and fails
+every n-th request with 429 or 503, so the concurrency, retry and deadline handling
+of the AI callers can be exercised and benchmarked offline. POST /v1/embeddings
+returns deterministic vectors per input (in reverse order) and rejects batches that
+contain an input with "FAIL". Requests with "stream": true get the answer as
+server-sent chunks spread over the latency. With --requests-per-minute it enforces that limit
+with 429s and reports it in x-ratelimit-* headers, like the real API:
+
+    python openai_standin.py --port 8099 --latency 0.5 --fail-every 5 --requests-per-minute 600
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 ...
+
+`python openai_standin.py --benchmark` runs GlobalGraphicDetector.analyze_screenshots_with_ai
+against it, serially and with the configured concurrency.
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# reported limits when --requests-per-minute is not set
+STANDIN_REQUESTS_PER_MINUTE = 10000
+STANDIN_TOKENS_PER_MINUTE = 10000000
+# characters per chunk of a streamed ("stream": true) completion
+STANDIN_STREAM_CHUNK_CHARS = 8
+
+STANDIN_GRAPHIC = {
+    "graphic_type": "logo",
+    "content_description": "stand-in analysis",
+    "colors": ["red"],
+    "brand_company": None,
+    "quality": "high",
+    "confidence": 0.9
+}
+STANDIN_FONTS = {
+    "font_families": ["Helvetica"],
+    "typography_hierarchy": "stand-in hierarchy",
+    "typography_quality": "high"
+}
+STANDIN_LAYOUT = {
+    "layout_type": "grid",
+    "design_quality": "high",
+    "composition_score": 0.8
+}
+
+
+def standin_content(payload):
+    """JSON answer matching the prompt: graphic, font, layout or combined font+layout analysis"""
+    prompt = " ".join(part.get("text", "") for message in payload.get("messages", [])
+                      for part in (message.get("content") if isinstance(message.get("content"), list) else []))
+    if "font_analysis:" in prompt:
+        content = {"font_analysis": STANDIN_FONTS, "layout_analysis": STANDIN_LAYOUT}
+    elif "font_families:" in prompt:
+        content = STANDIN_FONTS
+    elif "layout_type:" in prompt:
+        content = STANDIN_LAYOUT
+    else:
+        content = STANDIN_GRAPHIC
+    return json.dumps(content)
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    # keep-alive, like the real API (every response sets Content-Length)
+    protocol_version = "HTTP/1.1"
+    
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.lock:
+            server.request_count += 1
+            count = server.request_count
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        request = json.loads(body or b"{}")
+        try:
+            # a streamed completion spreads the latency over its chunks instead
+            time.sleep(0 if request.get("stream") else server.latency)
+            if server.requests_per_minute and not self.take_request_slot():
+                self.send_response(429)
+                self.send_ratelimit_headers()
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if server.fail_every and count % server.fail_every == 0:
+                status = 429 if (count // server.fail_every) % 2 else 503
+                self.send_response(status)
+                self.send_ratelimit_headers()
+                self.send_header("Retry-After", str(server.retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if self.path.endswith("/embeddings"):
+                self.send_embeddings(request)
+                return
+            content = standin_content(request)
+            if request.get("stream"):
+                self.send_stream(request, content)
+                return
+            payload = json.dumps({
+                "object": "chat.completion",
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                # rough: ~4 bytes of request per prompt token
+                "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(content) // 4}
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_ratelimit_headers()
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def send_stream(self, request, content):
+        """content as chat.completion.chunk server-sent events, one chunk every latency / chunks seconds"""
+        pieces = [content[i:i + STANDIN_STREAM_CHUNK_CHARS] for i in range(0, len(content), STANDIN_STREAM_CHUNK_CHARS)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_ratelimit_headers()
+        self.end_headers()
+        for piece in pieces + [None]:
+            if piece is not None:
+                time.sleep(self.server.latency / len(pieces))
+            chunk = {
+                "object": "chat.completion.chunk",
+                "model": request.get("model"),
+                "choices": [{"index": 0, "delta": {"content": piece} if piece is not None else {},
+                             "finish_reason": None if piece is not None else "stop"}]
+            }
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def take_request_slot(self):
+        """Token bucket of requests_per_minute, full at start; False (-> 429) when empty"""
+        server = self.server
+        with server.lock:
+            now = time.monotonic()
+            server.bucket = min(server.requests_per_minute,
+                                server.bucket + (now - server.bucket_updated) * server.requests_per_minute / 60.0)
+            server.bucket_updated = now
+            if server.bucket < 1:
+                server.rejected += 1
+                return False
+            server.bucket -= 1
+            return True
+    
+    def send_ratelimit_headers(self):
+        """x-ratelimit-* headers as the API sends them; generous fixed limits when none is enforced"""
+        server = self.server
+        self.send_header("x-ratelimit-limit-tokens", str(STANDIN_TOKENS_PER_MINUTE))
+        self.send_header("x-ratelimit-remaining-tokens", str(STANDIN_TOKENS_PER_MINUTE))
+        if not server.requests_per_minute:
+            self.send_header("x-ratelimit-limit-requests", str(STANDIN_REQUESTS_PER_MINUTE))
+            self.send_header("x-ratelimit-remaining-requests", str(STANDIN_REQUESTS_PER_MINUTE))
+            return
+        with server.lock:
+            remaining = int(server.bucket)
+            reset = (1 - server.bucket % 1) * 60.0 / server.requests_per_minute
+        self.send_header("x-ratelimit-limit-requests", str(int(server.requests_per_minute)))
+        self.send_header("x-ratelimit-remaining-requests", str(remaining))
+        self.send_header("x-ratelimit-reset-requests", f"{reset:.3f}s")
+        if remaining < 1:
+            self.send_header("Retry-After", f"{reset:.3f}")
+    
+    def send_embeddings(self, request):
+        """Deterministic embeddings per input; a batch with an input containing "FAIL" gets a 400"""
+        inputs = request.get("input")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        with self.server.lock:
+            self.server.embedding_inputs += len(inputs)
+        if any("FAIL" in text for text in inputs) and len(inputs) > 1:
+            status, payload = 400, {"error": {"message": "stand-in batch failure"}}
+        else:
+            dims = request.get("dimensions", 1536)
+            data = []
+            for index, text in enumerate(inputs):
+                rng = random.Random(text)
+                data.append({"object": "embedding", "index": index, "embedding": [rng.uniform(-1, 1) for _ in range(dims)]})
+            # answered in reverse order; callers must map by index
+            status, payload = 200, {"object": "list", "data": data[::-1], "model": request.get("model"),
+                                    "usage": {"prompt_tokens": sum(len(t) // 4 for t in inputs)}}
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_ratelimit_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_standin(port=0, latency=0.5, fail_every=0, retry_after=0.1, requests_per_minute=0):
+    """Start the stand-in in a daemon thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StandinHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail_every = fail_every
+    server.retry_after = retry_after
+    # enforced with 429s and reported in x-ratelimit-* headers when set
+    server.requests_per_minute = requests_per_minute
+    server.bucket = requests_per_minute
+    server.bucket_updated = time.monotonic()
+    server.rejected = 0
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.embedding_inputs = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def benchmark(regions, latency, fail_every, concurrency):
+    """Time analyze_screenshots_with_ai against the stand-in, serially and concurrently"""
+    from global_graphic_detector import GlobalGraphicDetector
+
+    # distinct perceptual hashes, so every region is sent
+    screenshots = [{"region_index": i + 1, "image_png": b"\x89PNG stand-in", "region_bbox": [0, 0, 100, 100],
+                    "phash": f"{random.Random(i).getrandbits(64):016x}888"} for i in range(regions)]
+    for workers in (1, concurrency):
+        server, base_url = start_standin(latency=latency, fail_every=fail_every)
+        detector = GlobalGraphicDetector("standin", max_concurrency=workers)
+        detector.openai_base_url = base_url
+        start = time.perf_counter()
+        results = detector.analyze_screenshots_with_ai(screenshots)
+        elapsed = time.perf_counter() - start
+        in_order = [r["region_index"] for r in results] == [s["region_index"] for s in screenshots]
+        print(f"concurrency {workers}: {elapsed:.2f}s for {regions} regions, "
+              f"{sum(r['success'] for r in results)} ok, {server.request_count} requests, "
+              f"max {server.max_in_flight} in flight, order kept: {in_order}")
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI chat-completions stand-in")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--requests-per-minute", type=int, default=0)
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--regions", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.regions, args.latency, args.fail_every, args.concurrency)
+    else:
+        server, base_url = start_standin(args.port, args.latency, args.fail_every,
+                                         requests_per_minute=args.requests_per_minute)
+        print(f"OpenAI stand-in listening on {base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,227 @@
+"""
+Streaming PDF content-stream interpreter.
+
+Walks page content streams, keeps a proper graphics-state stack (q/Q nesting,
+cm concatenation) and descends into Form XObjects, yielding every image
+placement with its exact transformation matrix in PDF user space.
+
+pikepdf is used for object access only. The stream itself goes through a small
+tokenizer that drops strings, comments and inline-image data in C (re/bytes)
+and only materializes the operators that affect placement, which is much
+cheaper than a full parse on large text- and path-heavy streams.
+
+Shared by image-profile-service and pdf-measure-service (mounted read-only at
+/brandchecker_app, see docker-compose.yml).
+"""
+
+import re
+import logging
+from itertools import compress
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Matrix = Tuple[float, float, float, float, float, float]
+
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+MAX_FORM_DEPTH = 16
+
+_DELIM = rb"\s/\[\]()<>{}%"
+# literal strings (one level of unescaped nesting) and comments carry nothing placement-related
+_STRING = rb"\((?:[^()\\]|\\.|\((?:[^()\\]|\\.)*\))*\)"
+_SKIP = _STRING + rb"|%[^\r\n]*"
+_SKIP_RE = re.compile(_SKIP, re.S)
+# a pattern with a single literal prefix lets re skip ahead with a fast byte search
+_STRING_RE = re.compile(_STRING, re.S)
+# inline images: BI <dict> ID <binary> EI; binary data may contain anything, so it is cut out too
+_SKIP_INLINE_RE = re.compile(
+    _SKIP + rb"|(?<![^" + _DELIM + rb"])BI(?![^" + _DELIM + rb"])(.*?)\sID\s.*?\sEI(?![^" + _DELIM + rb"])",
+    re.S)
+_INLINE_W_RE = re.compile(rb"/(?:W|Width)\s+(\d+)")
+_INLINE_H_RE = re.compile(rb"/(?:H|Height)\s+(\d+)")
+
+PLACEMENT_OPERATORS = frozenset((b"q", b"Q", b"cm", b"Do", b"BI"))
+_OPERAND_COUNT = {b"q": 0, b"Q": 0, b"cm": 6, b"Do": 1, b"BI": 2}
+
+
+def _inline_marker(m) -> bytes:
+    if m.group(1) is None:
+        return b" "
+    w = _INLINE_W_RE.search(m.group(1))
+    h = _INLINE_H_RE.search(m.group(1))
+    return b" %d %d BI " % (int(w.group(1)) if w else 0, int(h.group(1)) if h else 0)
+
+
+def _placement_tokens(data: bytes) -> Tuple[List[bytes], List[int]]:
+    """Token list of the stream plus the indices of placement operators in it."""
+    if b"BI" in data:
+        data = _SKIP_INLINE_RE.sub(_inline_marker, data)
+    elif b"%" in data:
+        data = _SKIP_RE.sub(b" ", data)
+    elif b"(" in data:
+        data = _STRING_RE.sub(b" ", data)
+    # names and array/dict delimiters may abut operators without whitespace ("Q/Im0 Do", "]0 d")
+    data = data.replace(b"/", b" /").replace(b"]", b"] ").replace(b">", b"> ")
+    tokens = data.split()
+    # membership test runs in C via map(); only operator positions reach Python code
+    return tokens, list(compress(range(len(tokens)), map(PLACEMENT_OPERATORS.__contains__, tokens)))
+
+
+def tokenize_placement_ops(data: bytes) -> Iterator[Tuple[bytes, List[bytes]]]:
+    """Yield (operator, operands) for q, Q, cm, Do and inline images (BI, operands: width, height)."""
+    tokens, idx = _placement_tokens(data)
+    for i in idx:
+        op = tokens[i]
+        n = _OPERAND_COUNT[op]
+        yield op, (tokens[i - n:i] if n and i >= n else [])
+
+
+def _stream_bytes(owner) -> bytes:
+    import pikepdf
+    contents = owner.get("/Contents") if isinstance(owner, pikepdf.Dictionary) else owner
+    if isinstance(contents, pikepdf.Stream):
+        return contents.read_bytes()
+    if isinstance(contents, pikepdf.Array):
+        # streams of a page are concatenated as if separated by whitespace
+        return b"\n".join(s.read_bytes() for s in contents if isinstance(s, pikepdf.Stream))
+    return b""
+
+
+def mat_mul(m: Sequence[float], n: Sequence[float]) -> Matrix:
+    """Concatenate PDF matrices: m × n (apply m first, then n)."""
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a * a2 + b * c2,
+        a * b2 + b * d2,
+        c * a2 + d * c2,
+        c * b2 + d * d2,
+        e * a2 + f * c2 + e2,
+        e * b2 + f * d2 + f2,
+    )
+
+
+def unit_square_bbox(m: Sequence[float]) -> List[float]:
+    """Bounding box of the image unit square under matrix m (PDF user space, bottom-left origin)."""
+    a, b, c, d, e, f = m
+    xs = (e, a + e, c + e, a + c + e)
+    ys = (f, b + f, d + f, b + d + f)
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def placed_size(m: Sequence[float]) -> Tuple[float, float]:
+    """Placed width/height in pt of the image unit square (correct for rotated/sheared placements)."""
+    a, b, c, d = m[0], m[1], m[2], m[3]
+    return (a * a + b * b) ** 0.5, (c * c + d * d) ** 0.5
+
+
+def _as_matrix(obj) -> Optional[Matrix]:
+    try:
+        vals = tuple(float(v) for v in obj)
+    except Exception:
+        return None
+    return vals if len(vals) == 6 else None
+
+
+def _placement(matrix: Matrix, name: Optional[str], xobj, width_px: int, height_px: int,
+               depth: int, form_path: List[str], inline: bool) -> Dict[str, Any]:
+    width_pts, height_pts = placed_size(matrix)
+    xref = None
+    if xobj is not None:
+        try:
+            xref = int(xobj.objgen[0]) or None
+        except Exception:
+            xref = None
+    return {
+        "name": name,
+        "xref": xref,
+        "inline": inline,
+        "matrix": list(matrix),
+        "bbox": unit_square_bbox(matrix),
+        "width_pts": width_pts,
+        "height_pts": height_pts,
+        "width_px": width_px,
+        "height_px": height_px,
+        "depth": depth,
+        "form_path": list(form_path),
+    }
+
+
+def _walk(owner, resources, ctm: Matrix, depth: int, form_path: List[str],
+          active_forms: frozenset) -> Iterator[Dict[str, Any]]:
+    import pikepdf
+
+    xobjects = resources.get("/XObject") if isinstance(resources, pikepdf.Dictionary) else None
+    data = _stream_bytes(owner)
+    # nothing can be placed without a Do (with XObjects to resolve it) or an inline image
+    if b"BI" not in data and (b"Do" not in data or not isinstance(xobjects, pikepdf.Dictionary)):
+        return
+    stack: List[Matrix] = []
+    push, pop = stack.append, stack.pop
+    tokens, idx = _placement_tokens(data)
+    for i in idx:
+        op = tokens[i]
+        if op == b"q":
+            push(ctm)
+        elif op == b"Q":
+            if stack:
+                ctm = pop()
+        elif op == b"cm":
+            m = _as_matrix(tokens[i - 6:i]) if i >= 6 else None
+            if m is not None:
+                ctm = mat_mul(m, ctm)
+        elif op == b"Do":
+            if not i or not isinstance(xobjects, pikepdf.Dictionary):
+                continue
+            name = tokens[i - 1].decode("latin-1")
+            if not name.startswith("/"):
+                continue
+            xobj = xobjects.get(name)
+            if not isinstance(xobj, pikepdf.Stream):
+                continue
+            subtype = str(xobj.get("/Subtype"))
+            if subtype == "/Image":
+                yield _placement(ctm, name, xobj, int(xobj.get("/Width", 0)), int(xobj.get("/Height", 0)),
+                                 depth, form_path, inline=False)
+            elif subtype == "/Form":
+                key = xobj.objgen
+                if depth >= MAX_FORM_DEPTH or key in active_forms:
+                    logger.debug(f"Skipping form {name}: depth {depth} or recursive reference")
+                    continue
+                form_ctm = mat_mul(_as_matrix(xobj.get("/Matrix", IDENTITY)) or IDENTITY, ctm)
+                form_res = xobj.get("/Resources")
+                if not isinstance(form_res, pikepdf.Dictionary):
+                    form_res = resources
+                # Form execution is implicitly bracketed by q/Q, so our ctm is untouched afterwards
+                yield from _walk(xobj, form_res, form_ctm, depth + 1, form_path + [name],
+                                 active_forms | {key})
+        elif op == b"BI":
+            try:
+                wpx, hpx = int(tokens[i - 2]), int(tokens[i - 1])
+            except Exception:
+                wpx = hpx = 0
+            yield _placement(ctm, None, None, wpx, hpx, depth, form_path, inline=True)
+
+
+def iter_image_placements(page, include_inline: bool = True) -> Iterator[Dict[str, Any]]:
+    """Yield image placements of a pikepdf page in content-stream order.
+
+    Each placement carries the full CTM (`matrix`, PDF user space), the bbox of the
+    placed unit square, placed size in pt, pixel size, and the chain of Form XObject
+    names it was drawn through (`form_path`, empty for direct placements).
+    """
+    obj = getattr(page, "obj", page)
+    resources = obj.get("/Resources")
+    for pl in _walk(obj, resources, IDENTITY, 0, [], frozenset()):
+        if pl["inline"] and not include_inline:
+            continue
+        yield pl
+
+
+def placement_dpi(pl: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
+    wpx, hpx = pl.get("width_px") or 0, pl.get("height_px") or 0
+    wpt, hpt = pl.get("width_pts") or 0.0, pl.get("height_pts") or 0.0
+    dpi_x = (wpx * 72.0) / wpt if wpx and wpt > 0 else None
+    dpi_y = (hpx * 72.0) / hpt if hpx and hpt > 0 else None
+    return dpi_x, dpi_y
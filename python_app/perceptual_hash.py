@@ -0,0 +1,77 @@
+"""
+Perceptual hashes for region crops.
+
+The same logo or header graphic is cut out of every page of a brochure; its
+crops differ only by anti-aliasing and a pixel of offset. A 64-bit difference
+hash (dHash) of the crop stays within a few bits for such repeats, so regions
+whose hashes are close - and whose sizes match - can share one AI analysis.
+
+dHash only sees gradients: every flat crop hashes to 0 and a logo hashes the
+same in any color, so the hash carries the crop's mean RGB (4 bits per
+channel) as well.
+"""
+
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+HASH_SIZE = 8
+# max differing bits (of 64) for two crops to count as the same graphic
+MAX_HASH_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "4"))
+# max difference of their mean color per channel, in 4-bit steps
+MAX_COLOR_STEPS = 1
+# and max relative difference of their width / height
+MAX_SIZE_DIFFERENCE = 0.1
+
+_DHASH_HEX = HASH_SIZE * HASH_SIZE // 4
+
+
+def dhash(image: np.ndarray) -> str:
+    """Difference hash of an RGB (or gray) crop followed by its mean color, as hex"""
+    rgb = np.ascontiguousarray(image[:, :, :3]) if image.ndim == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = int("".join("1" if b else "0" for b in bits), 2)
+    r, g, b = (int(c) >> 4 for c in rgb.reshape(-1, 3).mean(axis=0))
+    return f"{value:0{_DHASH_HEX}x}{r:x}{g:x}{b:x}"
+
+
+def hamming_distance(a: str, b: str) -> int:
+    return bin(int(a[:_DHASH_HEX], 16) ^ int(b[:_DHASH_HEX], 16)).count("1")
+
+
+def near_duplicate_groups(hashes: Sequence[str], sizes: Sequence[Tuple[int, int]],
+                          max_distance: Optional[int] = None) -> List[int]:
+    """For every crop, the index of the first earlier crop it duplicates (itself if none).
+
+    Crops are duplicates when their hashes differ in at most max_distance bits, their mean
+    colors in at most MAX_COLOR_STEPS per channel, and their width and height agree within
+    MAX_SIZE_DIFFERENCE.
+    """
+    max_distance = MAX_HASH_DISTANCE if max_distance is None else max_distance
+    n = len(hashes)
+    if n == 0:
+        return []
+
+    values = np.array([int(h[:_DHASH_HEX], 16) for h in hashes], dtype=np.uint64)
+    xor = values[:, None] ^ values[None, :]
+    distances = np.unpackbits(xor.view(np.uint8).reshape(n, n, 8), axis=2).sum(axis=2)
+    colors = np.array([[int(c, 16) for c in h[_DHASH_HEX:]] for h in hashes], dtype=np.int16).reshape(n, 3)
+    similar_color = (np.abs(colors[:, None, :] - colors[None, :, :]) <= MAX_COLOR_STEPS).all(axis=2)
+    wh = np.asarray(sizes, dtype=np.float64).reshape(n, 2)
+    scale = np.maximum(np.maximum(wh[:, None, :], wh[None, :, :]), 1.0)
+    similar_size = (np.abs(wh[:, None, :] - wh[None, :, :]) / scale <= MAX_SIZE_DIFFERENCE).all(axis=2)
+    matches = (distances <= max_distance) & similar_color & similar_size
+
+    representative = list(range(n))
+    for i in range(n):
+        if representative[i] != i:
+            continue
+        # later crops matching an unassigned crop join its group
+        for j in np.flatnonzero(matches[i, i + 1:]) + i + 1:
+            if representative[j] == j:
+                representative[j] = i
+    return representative
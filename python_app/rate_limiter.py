@@ -0,0 +1,246 @@
+"""
+Shared, adaptive rate limiting for OpenAI requests.
+
+One AdaptiveRateLimiter per model (openai_limiter(model)) is shared by every
+caller in the process. It keeps two token buckets, requests per minute and
+tokens per minute, and hands out start times in arrival order: a caller
+reserves its request and estimated tokens under a lock and then waits until
+both buckets cover them, so callers are served first come first served
+whether they wait in a thread (acquire) or on an event loop (acquire_async).
+
+The buckets follow the provider rather than fixed sleeps. After every
+response, observe() reads the x-ratelimit-limit-* headers as the current
+rates (up to the optional OPENAI_MAX_*_PER_MINUTE ceilings) and
+x-ratelimit-remaining-* as an upper bound of what is left (which also
+accounts for other processes using the same key). A 429 pauses all
+callers for the Retry-After time and lowers the rates until headers or
+successful responses bring them back up.
+
+    limiter = openai_limiter("gpt-4o")
+    limiter.acquire(estimate_request_tokens(payload))
+    response = requests.post(url, json=payload, ...)
+    limiter.observe(response.status_code, response.headers)
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Starting rates per model until the response headers report the account's limits
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "30000"))
+# Optional hard ceilings (e.g. to leave room for other users of the key); unset = follow the headers
+OPENAI_MAX_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_MAX_REQUESTS_PER_MINUTE", "0")) or None
+OPENAI_MAX_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_MAX_TOKENS_PER_MINUTE", "0")) or None
+# rough prompt-token cost of one image input (a 1024px tile at high detail is 765)
+IMAGE_TOKEN_ESTIMATE = 1000
+CHARS_PER_TOKEN = 4
+# rate cut on 429 and recovery per successful response when no limit headers are sent
+THROTTLE_FACTOR = 0.5
+RECOVERY_FACTOR = 1.05
+DEFAULT_RETRY_AFTER = 1.0
+# times a caller re-sends a request that got a 429 (after the limiter's pause)
+RATE_LIMIT_RETRIES = int(os.getenv("OPENAI_RATE_LIMIT_RETRIES", "3"))
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds of an x-ratelimit-reset / Retry-After value such as "20ms", "1.5s", "6m0s" or "2" """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+
+
+def estimate_request_tokens(payload: Dict[str, Any]) -> int:
+    """Tokens a chat-completions or embeddings payload counts against the tokens-per-minute limit"""
+    chars = 0
+    images = 0
+    inputs = payload.get("input")
+    if inputs is not None:
+        for text in inputs if isinstance(inputs, list) else [inputs]:
+            chars += len(text or "")
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "image_url":
+                    images += 1
+                else:
+                    chars += len(part.get("text", ""))
+    completion = payload.get("max_completion_tokens") or payload.get("max_tokens") or 0
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKEN_ESTIMATE + completion + 1
+
+
+class AdaptiveRateLimiter:
+    """Requests- and tokens-per-minute buckets with FIFO reservations, adapted from response headers"""
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None, name: str = "",
+                 requests_ceiling: float = None, tokens_ceiling: float = None):
+        self.name = name
+        # caps that not even the response headers may raise the rates above (None = no cap)
+        self.requests_ceiling = OPENAI_MAX_REQUESTS_PER_MINUTE if requests_ceiling is None else requests_ceiling
+        self.tokens_ceiling = OPENAI_MAX_TOKENS_PER_MINUTE if tokens_ceiling is None else tokens_ceiling
+        # the rates to recover to: the starting rates, then the limits the headers report
+        self.max_requests_per_minute = _capped(OPENAI_REQUESTS_PER_MINUTE if requests_per_minute is None
+                                               else requests_per_minute, self.requests_ceiling)
+        self.max_tokens_per_minute = _capped(OPENAI_TOKENS_PER_MINUTE if tokens_per_minute is None
+                                             else tokens_per_minute, self.tokens_ceiling)
+        self.requests_per_minute = self.max_requests_per_minute
+        self.tokens_per_minute = self.max_tokens_per_minute
+        self._lock = threading.Lock()
+        self._updated = time.monotonic()
+        # may go negative: reserved by callers still waiting for their start time
+        self._requests_available = self.requests_per_minute
+        self._tokens_available = self.tokens_per_minute
+        self._paused_until = 0.0
+        self._limits_from_headers = False
+        self.stats = {"requests": 0, "tokens": 0, "waited_seconds": 0.0, "throttled": 0}
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests_available = min(self.requests_per_minute,
+                                       self._requests_available + elapsed * self.requests_per_minute / 60.0)
+        self._tokens_available = min(self.tokens_per_minute,
+                                     self._tokens_available + elapsed * self.tokens_per_minute / 60.0)
+
+    def _reserve(self, tokens: int, deadline: Optional[float] = None) -> Optional[float]:
+        """Book one request and `tokens`; returns the monotonic time the caller may start,
+        or None (booking nothing) if that is after `deadline`"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # a single request larger than the whole bucket waits for a full bucket only
+            tokens = min(tokens, self.tokens_per_minute)
+            requests_available = self._requests_available - 1
+            tokens_available = self._tokens_available - tokens
+            wait = max(0.0,
+                       -requests_available * 60.0 / self.requests_per_minute if self.requests_per_minute > 0 else 0.0,
+                       -tokens_available * 60.0 / self.tokens_per_minute if self.tokens_per_minute > 0 else 0.0)
+            start = max(now + wait, self._paused_until)
+            if deadline is not None and start > deadline:
+                return None
+            self._requests_available = requests_available
+            self._tokens_available = tokens_available
+            self.stats["requests"] += 1
+            self.stats["tokens"] += tokens
+            self.stats["waited_seconds"] += start - now
+            return start
+
+    def _pause_remaining(self) -> float:
+        with self._lock:
+            return self._paused_until - time.monotonic()
+
+    def acquire(self, tokens: int = 0, deadline: Optional[float] = None):
+        """Block the calling thread until one request of `tokens` estimated tokens may start.
+
+        With a `deadline` (time.monotonic() value), raises TimeoutError instead of waiting past it.
+        """
+        start = self._reserve(tokens, deadline)
+        if start is None:
+            raise TimeoutError("rate limit wait would pass the deadline")
+        delay = start - time.monotonic()
+        while delay > 0:
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise TimeoutError("rate limit wait would pass the deadline")
+            time.sleep(delay)
+            # a 429 seen meanwhile pauses callers that were already scheduled
+            delay = self._pause_remaining()
+
+    async def acquire_async(self, tokens: int = 0):
+        """Wait on the event loop until one request of `tokens` estimated tokens may start"""
+        delay = self._reserve(tokens) - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._pause_remaining()
+
+    def observe(self, status: int, headers: Optional[Mapping[str, str]] = None):
+        """Adapt to a response: limit / remaining headers, and Retry-After on 429"""
+        headers = headers or {}
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            limit_requests = _header_float(headers, "x-ratelimit-limit-requests")
+            limit_tokens = _header_float(headers, "x-ratelimit-limit-tokens")
+            if limit_requests or limit_tokens:
+                self._limits_from_headers = True
+                # the account's limits replace the starting rates, up to the configured ceilings
+                if limit_requests:
+                    self.requests_per_minute = self.max_requests_per_minute = _capped(limit_requests, self.requests_ceiling)
+                if limit_tokens:
+                    self.tokens_per_minute = self.max_tokens_per_minute = _capped(limit_tokens, self.tokens_ceiling)
+
+            remaining_requests = _header_float(headers, "x-ratelimit-remaining-requests")
+            if remaining_requests is not None:
+                self._requests_available = min(self._requests_available, remaining_requests)
+            remaining_tokens = _header_float(headers, "x-ratelimit-remaining-tokens")
+            if remaining_tokens is not None:
+                self._tokens_available = min(self._tokens_available, remaining_tokens)
+
+            if status == 429:
+                retry_after = parse_duration(headers.get("Retry-After")) \
+                    or max(parse_duration(headers.get("x-ratelimit-reset-requests")) or 0.0,
+                           parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0.0) \
+                    or DEFAULT_RETRY_AFTER
+                self._paused_until = max(self._paused_until, now + retry_after)
+                self._requests_available = min(self._requests_available, 0.0)
+                self._tokens_available = min(self._tokens_available, 0.0)
+                if not self._limits_from_headers:
+                    self.requests_per_minute = max(1.0, self.requests_per_minute * THROTTLE_FACTOR)
+                    self.tokens_per_minute = max(1.0, self.tokens_per_minute * THROTTLE_FACTOR)
+                self.stats["throttled"] += 1
+                logger.warning(f"Rate limited{' (' + self.name + ')' if self.name else ''}: pausing {retry_after:.1f}s, "
+                               f"{self.requests_per_minute:.0f} requests/min, {self.tokens_per_minute:.0f} tokens/min")
+            elif status < 400 and not self._limits_from_headers:
+                self.requests_per_minute = min(self.max_requests_per_minute, self.requests_per_minute * RECOVERY_FACTOR)
+                self.tokens_per_minute = min(self.max_tokens_per_minute, self.tokens_per_minute * RECOVERY_FACTOR)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, requests_per_minute=self.requests_per_minute,
+                        tokens_per_minute=self.tokens_per_minute)
+
+
+def _capped(rate: float, ceiling: Optional[float]) -> float:
+    return rate if ceiling is None else min(rate, ceiling)
+
+
+def _header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def openai_limiter(model: str) -> AdaptiveRateLimiter:
+    """The process-wide limiter for a model (OpenAI limits are per model)"""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = _limiters[model] = AdaptiveRateLimiter(name=model)
+        return limiter
@@ -0,0 +1,206 @@
+"""
+Shared region proposals for the raster logo/graphic detectors.
+
+IntelligentLogoDetector and GlobalGraphicDetector propose candidate regions
+from the same 2x page render: color-range masks, Canny edge maps, binary
+thresholds and local-variance maps. Each proposal family is computed once per
+page and its raw components (contour area and bounding box, plus the
+family's measurement) are memoized per (document, page), so the second
+detector on a document reuses what the first one computed. The detectors
+still apply their own size/shape filters and build their own region dicts.
+
+Only the components are cached. The rendered page and its derived images
+belong to the PageProposals a caller got for its page and are freed with it;
+nothing rendered is shared between threads or documents.
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import cv2
+import numpy as np
+from sklearn.cluster import DBSCAN
+from sklearn.preprocessing import StandardScaler
+
+from tiled_render import render_clip, render_size
+
+logger = logging.getLogger(__name__)
+
+RENDER_ZOOM = 2  # 2x zoom for better quality
+PROPOSAL_CACHE_PAGES = int(os.getenv("REGION_PROPOSAL_CACHE_PAGES", "64"))
+
+# contour area, x, y, w, h (+ a family-specific measurement)
+Component = Tuple[Any, ...]
+
+_lock = threading.Lock()
+_pages: "OrderedDict[Tuple[str, int, float], Dict[Tuple, List[Component]]]" = OrderedDict()
+_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def document_key(pdf_path: str) -> str:
+    """SHA-256 of the PDF bytes, memoized per (path, size, mtime)."""
+    st = os.stat(pdf_path)
+    stat_key = (os.path.realpath(pdf_path), st.st_size, st.st_mtime_ns)
+    with _lock:
+        digest = _digests.get(stat_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(pdf_path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _lock:
+            _digests[stat_key] = digest
+    return digest
+
+
+def page_proposals(pdf_path: str, page, zoom: float = RENDER_ZOOM) -> "PageProposals":
+    """Proposals for a page (a PyMuPDF page of pdf_path), backed by the memoized components.
+
+    The returned object renders (if it still has to) from the caller's page; use it for
+    this page only and in the calling thread only.
+    """
+    key = (document_key(pdf_path), page.number, zoom)
+    with _lock:
+        families = _pages.get(key)
+        if families is None:
+            families = {}
+            _pages[key] = families
+            while len(_pages) > PROPOSAL_CACHE_PAGES:
+                _pages.popitem(last=False)
+        else:
+            _pages.move_to_end(key)
+    return PageProposals(page, zoom, families)
+
+
+def clear_cache() -> None:
+    with _lock:
+        _pages.clear()
+        _digests.clear()
+
+
+def _contour_components(mask: np.ndarray) -> List[Component]:
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [(cv2.contourArea(contour),) + tuple(cv2.boundingRect(contour)) for contour in contours]
+
+
+class PageProposals:
+    """Proposal families of one page render, each computed on first request.
+
+    `families` is the memoized component dict of the page, shared with other callers;
+    the render and its derived images are this object's own.
+    """
+
+    def __init__(self, page, zoom: float, families: Dict[Tuple, List[Component]]):
+        self.page = page
+        self.zoom = zoom
+        # width, height of the render in px, known without rendering
+        self.image_size = render_size(page.rect, zoom)
+        self.families = families
+        self._images: Dict[Any, np.ndarray] = {}
+
+    def _family(self, key: Tuple, compute: Callable[[], List[Component]]) -> List[Component]:
+        components = self.families.get(key)
+        if components is None:
+            # another thread may compute the same family meanwhile; both results are equal
+            components = self.families.setdefault(key, compute())
+        return components
+
+    def image(self, name: Any) -> np.ndarray:
+        """bgr / hsv / gray render of the page"""
+        images = self._images
+        if name not in images:
+            if "bgr" not in images:
+                images["bgr"] = cv2.cvtColor(render_clip(self.page, self.zoom, None), cv2.COLOR_RGB2BGR)
+            if name == "hsv":
+                images[name] = cv2.cvtColor(images["bgr"], cv2.COLOR_BGR2HSV)
+            elif name == "gray":
+                images[name] = cv2.cvtColor(images["bgr"], cv2.COLOR_BGR2GRAY)
+        return images[name]
+
+    def edge_map(self, canny_thresholds: Sequence[Tuple[int, int]]) -> np.ndarray:
+        """Canny edges of the gray render, OR-combined over (low, high) threshold pairs"""
+        key = ("edges", tuple(canny_thresholds))
+        if key not in self._images:
+            gray = self.image("gray")
+            edges = None
+            for low, high in canny_thresholds:
+                single = self._images.get(("edges", ((low, high),)))
+                if single is None:
+                    single = cv2.Canny(gray, low, high)
+                    self._images[("edges", ((low, high),))] = single
+                edges = single if edges is None else cv2.bitwise_or(edges, single)
+            self._images[key] = edges
+        return self._images[key]
+
+    def color_components(self, lower: Sequence[int], upper: Sequence[int]) -> List[Component]:
+        """External contours of an HSV inRange mask"""
+        def compute():
+            mask = cv2.inRange(self.image("hsv"), np.array(lower), np.array(upper))
+            return _contour_components(mask)
+        return self._family(("color", tuple(lower), tuple(upper)), compute)
+
+    def edge_components(self, canny_thresholds: Sequence[Tuple[int, int]]) -> List[Component]:
+        """External contours of an edge map, with the edge pixel count inside each bounding box"""
+        def compute():
+            edges = self.edge_map(canny_thresholds)
+            counts = cv2.integral((edges > 0).astype(np.uint8))
+            components = []
+            for area, x, y, w, h in _contour_components(edges):
+                edge_count = int(counts[y + h, x + w] - counts[y, x + w] - counts[y + h, x] + counts[y, x])
+                components.append((area, x, y, w, h, edge_count))
+            return components
+        return self._family(("edges", tuple(canny_thresholds)), compute)
+
+    def threshold_components(self, threshold: int) -> List[Component]:
+        """External contours of the gray render thresholded at `threshold`"""
+        def compute():
+            _, binary = cv2.threshold(self.image("gray"), threshold, 255, cv2.THRESH_BINARY)
+            return _contour_components(binary)
+        return self._family(("threshold", threshold), compute)
+
+    def local_spread_components(self, kernel_size: int, percentile: float, std: bool = False,
+                                min_area: float = 0) -> List[Component]:
+        """External contours where the local variance (or std) of the gray render is above its
+        percentile, with the mean variance (std) inside each bounding box. Means are only
+        taken for contours larger than min_area."""
+        def compute():
+            gray = self.image("gray").astype(np.float32)
+            kernel = np.ones((kernel_size, kernel_size), np.float32) / (kernel_size * kernel_size)
+            local_mean = cv2.filter2D(gray, -1, kernel)
+            spread = cv2.filter2D((gray - local_mean) ** 2, -1, kernel)
+            if std:
+                spread = np.sqrt(spread)
+            mask = spread > np.percentile(spread, percentile)
+            components = []
+            for area, x, y, w, h in _contour_components(mask.astype(np.uint8)):
+                mean = float(np.mean(spread[y:y+h, x:x+w])) if area > min_area else None
+                components.append((area, x, y, w, h, mean))
+            return components
+        return self._family(("spread", kernel_size, percentile, std, min_area), compute)
+
+
+def cluster_regions(regions: List[Dict[str, Any]], eps: float,
+                    select_best: Callable[[List[Dict[str, Any]]], Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """DBSCAN over normalized (center, area) of the regions; one region per cluster.
+
+    select_best picks the representative of clusters with more than one region.
+    """
+    if not regions:
+        return []
+
+    # Normalize by typical image width/height and typical area
+    features = [[region["center_x"] / 2000, region["center_y"] / 2000, region["area"] / 10000]
+                for region in regions]
+    features_scaled = StandardScaler().fit_transform(features)
+    clustering = DBSCAN(eps=eps, min_samples=1).fit(features_scaled)
+
+    clusters = defaultdict(list)
+    for i, label in enumerate(clustering.labels_):
+        clusters[label].append(regions[i])
+
+    return [cluster[0] if len(cluster) == 1 else select_best(cluster) for cluster in clusters.values()]
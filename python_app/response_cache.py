@@ -0,0 +1,169 @@
+"""
+Semantic cache of LLM answers to knowledge questions.
+
+Users ask the same few questions many times a day, in slightly different
+words. Every answer is stored in the response_cache table with the embedding
+of its question, scoped by endpoint ("ask" for /api/ask, "knowledge" for
+/knowledge/query), brand (none for the PDF knowledge base), embedding model
+and dimensions, LLM model and number of sources asked for. A new question in
+the same scope whose embedding is at least RESPONSE_CACHE_SIMILARITY cosine
+similar to a stored one gets the stored answer and sources back, without a
+search or an LLM call.
+
+An answer is only valid for the chunks it was built from: each entry keeps a
+fingerprint of its source chunks (ids and embedding_created_at), compared
+against the chunk table on every hit; a changed or deleted chunk drops the
+entry. Regenerating a brand's embeddings (or adding knowledge chunks) drops
+all entries of that brand (scope) via invalidate_cached_responses().
+
+Used by OpenAIEmbeddingService (embedding_service.py) and
+KnowledgeDatabaseManager (knowledge_database.py) with their own psycopg2
+connections, like embedding_cache.py.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") != "0"
+# minimum cosine similarity of two questions to share an answer; paraphrases of
+# one question score about 0.95+ with text-embedding-3, different questions
+# about the same brand topic often 0.85-0.9
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))
+
+# chunk table the sources of each scope come from
+CHUNK_TABLES = {
+    "ask": "brand_knowledge_chunks",
+    "knowledge": "knowledge_chunks",
+}
+
+
+def chunk_fingerprint(connection, scope: str, chunk_ids: Sequence[Any]) -> str:
+    """SHA-256 over the chunks' ids and embedding_created_at; changes when one is re-embedded or deleted"""
+    ids = sorted(set(str(chunk_id) for chunk_id in chunk_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT id::text, embedding_created_at
+            FROM {CHUNK_TABLES[scope]}
+            WHERE id = ANY(%s::uuid[])
+        """, (ids,))
+        found = dict(cursor.fetchall())
+    lines = [f"{chunk_id}:{found.get(chunk_id, 'deleted')}" for chunk_id in ids]
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def get_cached_response(connection, scope: str, brand_id: Optional[str], query_embedding: List[float],
+                        embedding_model: str, llm_model: str, source_limit: int) -> Optional[Dict[str, Any]]:
+    """The stored answer of the most similar earlier question, if similar enough and its sources are unchanged.
+
+    Returns {"response_text", "sources", "similarity", "cached_at"} and counts a hit, or None.
+    """
+    if not connection or not query_embedding:
+        return None
+    try:
+        with connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT id, response_text, sources, chunk_fingerprint, created_at,
+                       1 - (query_embedding <=> %s::vector) AS similarity
+                FROM response_cache
+                WHERE scope = %s AND brand_id IS NOT DISTINCT FROM %s
+                AND embedding_model = %s AND dimensions = %s
+                AND llm_model = %s AND source_limit = %s
+                ORDER BY query_embedding <=> %s::vector
+                LIMIT 1
+            """, (query_embedding, scope, brand_id, embedding_model, len(query_embedding),
+                  llm_model, source_limit, query_embedding))
+            row = cursor.fetchone()
+            if not row or row['similarity'] < RESPONSE_CACHE_SIMILARITY:
+                connection.commit()
+                return None
+
+            if chunk_fingerprint(connection, scope, [source['id'] for source in row['sources']]) != row['chunk_fingerprint']:
+                logger.info(f"Response cache ({scope}): sources of a cached answer changed, dropping it")
+                cursor.execute("DELETE FROM response_cache WHERE id = %s", (row['id'],))
+                connection.commit()
+                return None
+
+            cursor.execute("""
+                UPDATE response_cache
+                SET hit_count = hit_count + 1, last_hit_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (row['id'],))
+        connection.commit()
+        logger.info(f"Response cache ({scope}): hit at similarity {row['similarity']:.3f}")
+        return {
+            "response_text": row['response_text'],
+            "sources": row['sources'],
+            "similarity": float(row['similarity']),
+            "cached_at": row['created_at'].isoformat() if row['created_at'] else None
+        }
+    except Exception as e:
+        logger.warning(f"Response cache lookup failed: {e}")
+        connection.rollback()
+        return None
+
+
+def save_cached_response(connection, scope: str, brand_id: Optional[str], query_text: str,
+                         query_embedding: List[float], embedding_model: str, llm_model: str,
+                         source_limit: int, response_text: str, sources: List[Dict[str, Any]]):
+    """Store an answer with its question embedding and a fingerprint of its sources"""
+    if not connection or not query_embedding or not response_text or not sources:
+        return
+    try:
+        fingerprint = chunk_fingerprint(connection, scope, [source['id'] for source in sources])
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO response_cache (
+                    scope, brand_id, query_text, query_embedding, embedding_model, dimensions,
+                    llm_model, source_limit, response_text, sources, chunk_fingerprint
+                ) VALUES (%s, %s, %s, %s::vector, %s, %s, %s, %s, %s, %s, %s)
+            """, (scope, brand_id, query_text, query_embedding, embedding_model, len(query_embedding),
+                  llm_model, source_limit, response_text,
+                  # default=str: sources carry UUIDs and timestamps
+                  json.dumps(sources, default=str), fingerprint))
+        connection.commit()
+    except Exception as e:
+        logger.warning(f"Response cache write failed: {e}")
+        connection.rollback()
+
+
+def invalidate_cached_responses(connection, scope: str, brand_id: Optional[str] = None) -> int:
+    """Drop all answers of a brand (or of a scope without brands); returns the number dropped"""
+    if not connection:
+        return 0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM response_cache
+                WHERE scope = %s AND brand_id IS NOT DISTINCT FROM %s
+            """, (scope, brand_id))
+            dropped = cursor.rowcount
+        connection.commit()
+        if dropped:
+            logger.info(f"Response cache ({scope}): dropped {dropped} answers after embedding update")
+        return dropped
+    except Exception as e:
+        logger.warning(f"Response cache invalidation failed: {e}")
+        connection.rollback()
+        return 0
+
+
+def get_response_cache_stats(connection) -> List[Dict]:
+    """Stored answers and hits per scope"""
+    with connection.cursor(cursor_factory=RealDictCursor) as cursor:
+        cursor.execute("""
+            SELECT scope,
+                   COUNT(*) AS entries,
+                   COALESCE(SUM(hit_count), 0) AS hits,
+                   MAX(last_hit_at) AS last_hit_at
+            FROM response_cache
+            GROUP BY scope
+            ORDER BY scope
+        """)
+        return [dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,44 @@
+"""
+Server-sent events for streamed LLM answers.
+
+A streamed answer is a sequence of (event, data) pairs - "sources" first,
+then one "token" per piece of answer text as the model produces it, then
+"done" (or "error") - written as text/event-stream:
+
+    event: token
+    data: {"text": "Die "}
+
+Used by /api/ask (llm_api.py) and /knowledge/query (app.py) when the request
+has "stream": true.
+"""
+
+import json
+import logging
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event: str, data: Dict[str, Any]) -> str:
+    # default=str: sources carry UUIDs and timestamps
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+
+def _event_stream(events: Iterable[Tuple[str, Dict[str, Any]]]) -> Iterator[str]:
+    try:
+        for event, data in events:
+            yield format_event(event, data)
+    except Exception as e:
+        logger.error(f"Event stream failed: {e}")
+        yield format_event("error", {"error": str(e)})
+
+
+def event_stream_response(events: Iterable[Tuple[str, Dict[str, Any]]]) -> Response:
+    """Flask response sending the events as they are produced"""
+    return Response(_event_stream(events), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        # no proxy buffering, or the first event waits for the whole answer
+        "X-Accel-Buffering": "no",
+    })
@@ -0,0 +1,192 @@
+"""
+Memory-bounded page rendering.
+
+Poster-size pages (A0 roll-ups) rendered at analysis zoom produce single
+pixmaps of several GB. Pages - or clip regions - whose render would exceed the
+memory budget are rendered as fixed-size clip tiles instead; callers run their
+per-pixel work per tile and merge results across tile seams with
+`SeamMerger`.
+
+Shared by color_analyzer, image-profile-service and logo-profile-service
+(mounted read-only at /brandchecker_app, see docker-compose.yml).
+"""
+
+import os
+import math
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RENDER_MEMORY_BUDGET_MB = float(os.getenv("RENDER_MEMORY_BUDGET_MB", "256"))
+# rendered RGB plus the working copies analysis code derives from it (BGR/HSV, gray, masks, int indices)
+WORKING_BYTES_PER_PIXEL = 16
+MIN_TILE_PX = 256
+
+Box = Tuple[int, int, int, int]
+
+
+def budget_bytes(budget_mb: Optional[float] = None) -> int:
+    return int((RENDER_MEMORY_BUDGET_MB if budget_mb is None else budget_mb) * 1024 * 1024)
+
+
+def render_size(rect, zoom: float) -> Tuple[int, int]:
+    """Pixel size of a render of rect (pt) at zoom, as PyMuPDF rounds it."""
+    import fitz
+    irect = (fitz.Rect(rect) * fitz.Matrix(zoom, zoom)).irect
+    return irect.width, irect.height
+
+
+def fits_budget(page, zoom: float, clip=None, budget_mb: Optional[float] = None) -> bool:
+    w, h = render_size(clip if clip is not None else page.rect, zoom)
+    return w * h * WORKING_BYTES_PER_PIXEL <= budget_bytes(budget_mb)
+
+
+def zoom_within_budget(page, zoom: float, clip=None, budget_mb: Optional[float] = None) -> float:
+    """Largest zoom <= zoom whose render of clip (default: page) fits the budget."""
+    w, h = render_size(clip if clip is not None else page.rect, zoom)
+    limit = budget_bytes(budget_mb) / WORKING_BYTES_PER_PIXEL
+    if w * h <= limit:
+        return zoom
+    return zoom * math.sqrt(limit / float(w * h)) * 0.99
+
+
+def plan_tiles(width: int, height: int, budget_mb: Optional[float] = None,
+               overlap_px: int = 0, align: int = 1) -> List[Box]:
+    """Split a width x height render into non-overlapping core tiles (px) whose
+    rendered size including the overlap margin stays within the budget.
+
+    Full-width bands are preferred (cheapest seams); very wide renders fall back
+    to a square grid. Tile sizes are multiples of `align` so downscaling by
+    1/align maps tile seams to whole pixels.
+    """
+    max_px = max(budget_bytes(budget_mb) // WORKING_BYTES_PER_PIXEL, (MIN_TILE_PX + 2 * overlap_px) ** 2)
+    if (width + 2 * overlap_px) * (MIN_TILE_PX + 2 * overlap_px) <= max_px:
+        tw = width
+    else:
+        tw = int(math.isqrt(max_px)) - 2 * overlap_px
+    th = max_px // (min(tw, width) + 2 * overlap_px) - 2 * overlap_px
+    tw = max(align, tw // align * align)
+    th = max(align, th // align * align)
+    tiles = []
+    for y0 in range(0, height, th):
+        for x0 in range(0, width, tw):
+            tiles.append((x0, y0, min(width, x0 + tw), min(height, y0 + th)))
+    return tiles
+
+
+def render_clip(page, zoom: float, clip):
+    """RGB uint8 array of a clip rect (pt) rendered at zoom, straight from the pixmap samples."""
+    import fitz
+    import numpy as np
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    return arr[:, :, :3] if pix.n > 3 else arr
+
+
+def iter_tiles(page, zoom: float, clip=None, budget_mb: Optional[float] = None,
+               overlap_px: int = 0, align: int = 1) -> Iterator[Dict[str, Any]]:
+    """Render clip (default: the page) tile by tile.
+
+    Yields dicts with `array` (RGB, core plus overlap margin), `origin` (px offset of the
+    array in the full render), `core` (px box this tile owns) and `size` of the full render.
+    Only one tile is alive at a time, so peak memory follows the budget, not the page size.
+    """
+    import fitz
+    rect = fitz.Rect(clip if clip is not None else page.rect)
+    width, height = render_size(rect, zoom)
+    tiles = plan_tiles(width, height, budget_mb=budget_mb, overlap_px=overlap_px, align=align)
+    logger.info(f"Tiled render {width}x{height}px at zoom {zoom}: {len(tiles)} tiles")
+    for index, core in enumerate(tiles):
+        x0, y0, x1, y1 = core
+        ex0, ey0 = max(0, x0 - overlap_px), max(0, y0 - overlap_px)
+        ex1, ey1 = min(width, x1 + overlap_px), min(height, y1 + overlap_px)
+        tile_rect = fitz.Rect(rect.x0 + ex0 / zoom, rect.y0 + ey0 / zoom,
+                              rect.x0 + ex1 / zoom, rect.y0 + ey1 / zoom)
+        arr = render_clip(page, zoom, tile_rect)
+        yield {
+            "index": index,
+            "array": arr[:ey1 - ey0, :ex1 - ex0],
+            "origin": (ex0, ey0),
+            "core": core,
+            "size": (width, height),
+        }
+
+
+class SeamMerger:
+    """Collects contour boxes tile by tile and merges objects cut by tile seams.
+
+    Tiles overlap, so an object that crosses a seam is found in both tiles; the filled
+    contours of both tiles are compared pixel by pixel along the seam line and every pair
+    that shares a pixel there is one object. Contours lying entirely in a tile's overlap
+    margin belong to the neighbour and are dropped, so nothing is reported twice.
+    Boxes are (x0, y0, x1, y1) in full-render px of the mask's scale.
+    """
+
+    def __init__(self):
+        self.boxes: List[List[int]] = []
+        self._seams: Dict[Tuple[str, int], List[Tuple[int, Any]]] = {}
+
+    def add(self, contours, mask_shape: Tuple[int, int], origin: Tuple[int, int], core: Box) -> None:
+        import cv2
+        import numpy as np
+        ox, oy = origin
+        cx0, cy0, cx1, cy1 = core
+        h, w = mask_shape[:2]
+        # seam lines of this tile that lie inside its rendered area
+        rows = [y for y in (cy0, cy1) if y > 0 and 0 <= y - oy < h]
+        cols = [x for x in (cx0, cx1) if x > 0 and 0 <= x - ox < w]
+        labels = None
+        for cnt in contours:
+            x, y, bw, bh = cv2.boundingRect(cnt)
+            gx0, gy0, gx1, gy1 = ox + x, oy + y, ox + x + bw, oy + y + bh
+            if gx1 <= cx0 or gx0 >= cx1 or gy1 <= cy0 or gy0 >= cy1:
+                continue
+            gid = len(self.boxes)
+            self.boxes.append([gx0, gy0, gx1, gy1])
+            if any(gy0 <= r < gy1 for r in rows) or any(gx0 <= c < gx1 for c in cols):
+                if labels is None:
+                    labels = np.zeros((h, w), np.int32)
+                cv2.drawContours(labels, [cnt], -1, gid + 1, thickness=-1)
+        for r in rows:
+            self._seams.setdefault(("row", r), []).append((ox, labels[r - oy].copy() if labels is not None else None))
+        for c in cols:
+            self._seams.setdefault(("col", c), []).append((oy, labels[:, c - ox].copy() if labels is not None else None))
+
+    def merged(self) -> List[List[int]]:
+        parent = list(range(len(self.boxes)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for lines in self._seams.values():
+            for a in range(len(lines)):
+                for b in range(a + 1, len(lines)):
+                    (sa, la), (sb, lb) = lines[a], lines[b]
+                    if la is None or lb is None:
+                        continue
+                    start, stop = max(sa, sb), min(sa + len(la), sb + len(lb))
+                    if start >= stop:
+                        continue
+                    va, vb = la[start - sa:stop - sa], lb[start - sb:stop - sb]
+                    both = (va > 0) & (vb > 0)
+                    if not both.any():
+                        continue
+                    for ga, gb in set(zip(va[both].tolist(), vb[both].tolist())):
+                        ra, rb = find(ga - 1), find(gb - 1)
+                        if ra != rb:
+                            parent[ra] = rb
+
+        groups: Dict[int, List[int]] = {}
+        for i, box in enumerate(self.boxes):
+            root = find(i)
+            g = groups.get(root)
+            if g is None:
+                groups[root] = list(box)
+            else:
+                g[0] = min(g[0], box[0]); g[1] = min(g[1], box[1])
+                g[2] = max(g[2], box[2]); g[3] = max(g[3], box[3])
+        return list(groups.values())
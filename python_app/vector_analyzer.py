@@ -3,6 +3,7 @@ import json
 import logging
 import numpy as np
 from collections import defaultdict, Counter
+from itertools import chain
 import fitz  # PyMuPDF
 
 # Configure logging
@@ -41,21 +42,15 @@ def extract_vector_graphics_from_pdf_comprehensive(pdf_path):
             }
             
             # Method 1: Extract drawings and vector paths
+            # (one pass over the page's drawings, shared with methods 3 and 4)
             logger.info(f"Analyzing vector paths on page {page_num + 1}")
-            drawings = page.get_drawings()
-            
-            for drawing in drawings:
-                vector_info = analyze_vector_drawing(drawing, page_rect)
-                if vector_info:
-                    page_vectors["vector_elements"].append(vector_info)
-                    
-                    # Check if it might be a logo
-                    if is_potential_logo_vector(vector_info):
-                        page_vectors["logo_candidates"].append(vector_info)
-                    
-                    # Check if it might be an illustration
-                    if is_potential_illustration(vector_info):
-                        page_vectors["illustrations"].append(vector_info)
+            columns = drawing_columns(page_drawings(page))
+            drawing_elements = analyze_page_drawings(columns, page_rect)
+            page_vectors["vector_elements"].extend(drawing_elements)
+            for index in np.flatnonzero(columns["is_logo_candidate"]):
+                page_vectors["logo_candidates"].append(drawing_elements[index])
+            for index in np.flatnonzero(columns["is_illustration"]):
+                page_vectors["illustrations"].append(drawing_elements[index])
             
             # Method 1.5: Enhanced vector detection using page.get_image_info()
             logger.info(f"Analyzing embedded vector graphics on page {page_num + 1}")
@@ -84,12 +79,12 @@ def extract_vector_graphics_from_pdf_comprehensive(pdf_path):
             
             # Method 3: Extract shapes and geometric elements
             logger.info(f"Analyzing geometric shapes on page {page_num + 1}")
-            shapes = extract_geometric_shapes(page)
+            shapes = extract_geometric_shapes(page, columns)
             page_vectors["shapes"].extend(shapes)
             
             # Method 4: Extract paths and curves
             logger.info(f"Analyzing paths and curves on page {page_num + 1}")
-            paths = extract_paths_and_curves(page)
+            paths = extract_paths_and_curves(page, columns)
             page_vectors["paths"].extend(paths)
             
             # Calculate page vector statistics
@@ -113,80 +108,132 @@ def extract_vector_graphics_from_pdf_comprehensive(pdf_path):
     
     return vector_data
 
-def analyze_vector_drawing(drawing, page_rect):
-    """Analyze a vector drawing element"""
+# Page drawings as column arrays: one row per path, so the scoring below runs as array
+# expressions over the whole page instead of one nested dict per path.
+# Path items are tuples whose first entry is the operator: line, bezier curve, rect, quad.
+DRAWING_OPS = ("l", "c", "re", "qu")
+COMPLEXITY_WEIGHTS = {"m": 1, "l": 2, "c": 3, "re": 2, "f": 1, "s": 1}
+_OP_WEIGHTS = np.array([COMPLEXITY_WEIGHTS.get(op, 1) for op in DRAWING_OPS])
+_NO_COLOR = (np.nan, np.nan, np.nan)
+
+def page_drawings(page):
+    """Drawings of a page; get_cdrawings() skips building Point/Rect objects"""
+    get_cdrawings = getattr(page, "get_cdrawings", None)
+    return get_cdrawings() if get_cdrawings else page.get_drawings()
+
+def _rgb_or_nan(color):
+    return tuple(color) if color is not None and len(color) == 3 else _NO_COLOR
+
+def drawing_columns(drawings):
+    """Convert drawings (get_drawings/get_cdrawings dicts) into column arrays"""
+    
+    rects = []
+    stroke_colors = []
+    fill_colors = []
+    stroke_widths = []
+    op_rows = []
+    
+    for drawing in drawings:
+        rect = drawing.get("rect")
+        rects.append(tuple(rect) if rect is not None else (0.0, 0.0, 0.0, 0.0))
+        stroke_colors.append(_rgb_or_nan(drawing.get("color")))
+        fill_colors.append(_rgb_or_nan(drawing.get("fill")))
+        stroke_widths.append(drawing.get("width") or 0.0)
+        ops = [item[0] for item in drawing.get("items", ())]
+        op_rows.append((ops.count("l"), ops.count("c"), ops.count("re"), ops.count("qu"), len(ops)))
+    
+    n = len(rects)
+    rect = np.array(rects, dtype=float).reshape(n, 4)
+    ops = np.array(op_rows, dtype=np.int64).reshape(n, len(DRAWING_OPS) + 1)
+    width = rect[:, 2] - rect[:, 0]
+    height = rect[:, 3] - rect[:, 1]
+    
+    return {
+        "rect": rect,
+        "stroke_color": np.array(stroke_colors, dtype=float).reshape(n, 3),
+        "fill_color": np.array(fill_colors, dtype=float).reshape(n, 3),
+        "stroke_width": np.array(stroke_widths, dtype=float),
+        "op_counts": ops[:, :len(DRAWING_OPS)],
+        "item_count": ops[:, -1],
+        "area": width * height,
+        "aspect_ratio": np.divide(width, height, out=np.zeros(n), where=height > 0),
+        "center_x": (rect[:, 0] + rect[:, 2]) / 2,
+        "center_y": (rect[:, 1] + rect[:, 3]) / 2
+    }
+
+def score_drawing_columns(columns):
+    """Add vector type, complexity, logo probability and candidate flags to drawing columns"""
+    
+    item_count = columns["item_count"]
+    area = columns["area"]
+    aspect_ratio = columns["aspect_ratio"]
+    
+    columns["vector_type"] = determine_vector_type(item_count, area, aspect_ratio)
+    columns["complexity_score"] = calculate_complexity_score(columns["op_counts"], item_count)
+    columns["logo_probability"] = calculate_logo_probability(item_count, area, aspect_ratio)
+    columns["is_logo_candidate"] = is_potential_logo_vector(columns)
+    columns["is_illustration"] = is_potential_illustration(columns)
+    return columns
+
+def analyze_page_drawings(columns, page_rect):
+    """Vector element dicts for all drawings of a page, built from scored columns"""
     
     try:
-        # Get drawing properties
-        rect = drawing.get("rect", [])
-        items = drawing.get("items", [])
-        
-        # Analyze stroke and fill
-        stroke = drawing.get("stroke", {})
-        fill = drawing.get("fill", {})
-        
-        # Count different types of drawing items
-        item_types = Counter()
-        path_count = 0
-        line_count = 0
-        curve_count = 0
-        
-        for item in items:
-            item_type = item.get("type", "unknown")
-            item_types[item_type] += 1
-            
-            if item_type == "l":  # line
-                line_count += 1
-            elif item_type == "c":  # curve
-                curve_count += 1
-            elif item_type == "re":  # rectangle
-                path_count += 1
-        
-        # Calculate bounding box
-        if rect:
-            x, y, width, height = rect[0], rect[1], rect[2] - rect[0], rect[3] - rect[1]
-            area = width * height
-            aspect_ratio = width / height if height > 0 else 0
-            center_x = (rect[0] + rect[2]) / 2
-            center_y = (rect[1] + rect[3]) / 2
-        else:
-            area = 0
-            aspect_ratio = 0
-            center_x = 0
-            center_y = 0
-        
-        # Determine vector type
-        vector_type = determine_vector_type(item_types, area, aspect_ratio)
-        
-        # Analyze colors and shapes
-        color_analysis = analyze_drawing_colors(stroke, fill, items)
-        shape_analysis = analyze_drawing_shapes(items, item_types)
-        
-        return {
-            "type": "vector_drawing",
-            "vector_type": vector_type,
-            "rect": rect,
-            "area": area,
-            "aspect_ratio": aspect_ratio,
-            "center_x": center_x,
-            "center_y": center_y,
-            "item_count": len(items),
-            "item_types": dict(item_types),
-            "path_count": path_count,
-            "line_count": line_count,
-            "curve_count": curve_count,
-            "stroke_color": stroke.get("color"),
-            "stroke_width": stroke.get("width", 0),
-            "fill_color": fill.get("color"),
-            "complexity_score": calculate_complexity_score(items),
-            "logo_probability": calculate_logo_probability(item_types, area, aspect_ratio),
-            "color_analysis": color_analysis,
-            "shape_analysis": shape_analysis
-        }
+        if "logo_probability" not in columns:
+            score_drawing_columns(columns)
+        
+        op_counts = columns["op_counts"].tolist()
+        rects = columns["rect"].tolist()
+        strokes = columns["stroke_color"].tolist()
+        fills = columns["fill_color"].tolist()
+        
+        elements = []
+        for i, (vector_type, area, aspect_ratio, center_x, center_y, item_count, stroke_width,
+                complexity, logo_probability) in enumerate(zip(
+                columns["vector_type"].tolist(), columns["area"].tolist(), columns["aspect_ratio"].tolist(),
+                columns["center_x"].tolist(), columns["center_y"].tolist(), columns["item_count"].tolist(),
+                columns["stroke_width"].tolist(), columns["complexity_score"].tolist(),
+                columns["logo_probability"].tolist())):
+            line_count, curve_count, rect_count, quad_count = op_counts[i]
+            item_types = {op: count for op, count in zip(DRAWING_OPS, op_counts[i]) if count}
+            other_count = item_count - line_count - curve_count - rect_count - quad_count
+            if other_count:
+                item_types["unknown"] = other_count
+            stroke_color = tuple(strokes[i]) if strokes[i][0] == strokes[i][0] else None
+            fill_color = tuple(fills[i]) if fills[i][0] == fills[i][0] else None
+            
+            elements.append({
+                "type": "vector_drawing",
+                "vector_type": vector_type,
+                "rect": rects[i],
+                "area": area,
+                "aspect_ratio": aspect_ratio,
+                "center_x": center_x,
+                "center_y": center_y,
+                "item_count": item_count,
+                "item_types": item_types,
+                "path_count": rect_count,
+                "line_count": line_count,
+                "curve_count": curve_count,
+                "stroke_color": stroke_color,
+                "stroke_width": stroke_width,
+                "fill_color": fill_color,
+                "complexity_score": complexity,
+                "logo_probability": logo_probability,
+                "color_analysis": analyze_drawing_colors(stroke_color, fill_color),
+                "shape_analysis": analyze_drawing_shapes(item_types)
+            })
+        return elements
         
     except Exception as e:
-        logger.warning(f"Error analyzing vector drawing: {e}")
-        return None
+        logger.warning(f"Error analyzing vector drawings: {e}")
+        return []
+
+def analyze_vector_drawing(drawing, page_rect):
+    """Analyze a single vector drawing element"""
+    
+    elements = analyze_page_drawings(drawing_columns([drawing]), page_rect)
+    return elements[0] if elements else None
 
 def extract_embedded_vector_graphics(page, page_rect):
     """Extract embedded vector graphics and SVG-like elements"""
@@ -581,56 +628,94 @@ def detect_connected_logo_regions(vector_elements, page_rect):
     
     return connected_logos
 
-def group_nearby_elements(elements, max_distance=50):
-    """Group elements that are close to each other"""
+def element_centers(elements):
+    """Center points of element rects as an (n, 2) array; NaN for elements without a usable rect"""
+    
+    centers = np.full((len(elements), 2), np.nan)
+    for i, elem in enumerate(elements):
+        try:
+            rect = elem.get("rect", [])
+            if len(rect) == 4:
+                centers[i] = ((rect[0] + rect[2]) / 2, (rect[1] + rect[3]) / 2)
+        except Exception:
+            continue
+    return centers
+
+def build_center_grid(centers, cell_w, cell_h):
+    """Uniform grid over center points: cell -> set of element indices.
+    
+    With cells as large as the search window, all neighbors of a point lie in its 3x3 cell block.
+    """
+    grid = defaultdict(set)
+    valid = np.nonzero(~np.isnan(centers[:, 0]))[0]
+    cells = np.floor(centers[valid] / (cell_w, cell_h)).astype(np.int64)
+    for i, (gx, gy) in zip(valid.tolist(), cells.tolist()):
+        grid[(gx, gy)].add(i)
+    return grid
+
+def group_by_center_grid(elements, window_w, window_h, related):
+    """Greedy grouping with the same result as comparing every element with every other one.
+    
+    Elements are taken as seeds in order; each seed collects every later, still ungrouped element
+    for which related(seed_center, other_center) holds. Candidates come from a uniform grid
+    instead of the full element list, so the cost follows the local density, not n squared.
+    """
     
+    centers = element_centers(elements)
+    cell_w, cell_h = max(float(window_w), 1.0), max(float(window_h), 1.0)
+    grid = build_center_grid(centers, cell_w, cell_h)
     groups = []
     used = set()
     
-    try:
-        for i, elem1 in enumerate(elements):
-            if i in used:
-                continue
-            
-            group = [elem1]
-            used.add(i)
-            
-            for j, elem2 in enumerate(elements):
-                if j in used:
-                    continue
-                
-                # Check if elements are close
-                if are_elements_nearby(elem1, elem2, max_distance):
-                    group.append(elem2)
+    for i, elem in enumerate(elements):
+        if i in used:
+            continue
+        used.add(i)
+        group = [elem]
+        cx, cy = centers[i]
+        if not np.isnan(cx):
+            gx, gy = int(np.floor(cx / cell_w)), int(np.floor(cy / cell_h))
+            grid[(gx, gy)].discard(i)
+            candidates = []
+            for nx in (gx - 1, gx, gx + 1):
+                for ny in (gy - 1, gy, gy + 1):
+                    cell = grid.get((nx, ny))
+                    if cell:
+                        candidates.extend(cell)
+            center = (float(cx), float(cy))
+            for j in sorted(candidates):
+                if related(center, (float(centers[j][0]), float(centers[j][1]))):
+                    group.append(elements[j])
                     used.add(j)
-            
-            groups.append(group)
-        
-    except Exception as e:
-        logger.warning(f"Error grouping nearby elements: {e}")
+                    cell = grid[(int(np.floor(centers[j][0] / cell_w)), int(np.floor(centers[j][1] / cell_h)))]
+                    cell.discard(j)
+        groups.append(group)
     
     return groups
 
+def centers_within_distance(center1, center2, max_distance):
+    distance = ((center1[0] - center2[0]) ** 2 + (center1[1] - center2[1]) ** 2) ** 0.5
+    return distance <= max_distance
+
+def group_nearby_elements(elements, max_distance=50):
+    """Group elements that are close to each other"""
+    
+    try:
+        return group_by_center_grid(
+            elements, max_distance, max_distance,
+            lambda c1, c2: centers_within_distance(c1, c2, max_distance))
+    except Exception as e:
+        logger.warning(f"Error grouping nearby elements: {e}")
+        return []
+
 def are_elements_nearby(elem1, elem2, max_distance):
     """Check if two elements are close to each other"""
     
     try:
-        rect1 = elem1.get("rect", [])
-        rect2 = elem2.get("rect", [])
-        
-        if len(rect1) != 4 or len(rect2) != 4:
+        centers = element_centers([elem1, elem2])
+        if np.isnan(centers).any():
             return False
-        
-        # Calculate center points
-        center1_x = (rect1[0] + rect1[2]) / 2
-        center1_y = (rect1[1] + rect1[3]) / 2
-        center2_x = (rect2[0] + rect2[2]) / 2
-        center2_y = (rect2[1] + rect2[3]) / 2
-        
-        # Calculate distance
-        distance = ((center1_x - center2_x) ** 2 + (center1_y - center2_y) ** 2) ** 0.5
-        
-        return distance <= max_distance
+        return centers_within_distance(centers[0].tolist(), centers[1].tolist(), max_distance)
         
     except Exception as e:
         logger.warning(f"Error checking if elements are nearby: {e}")
@@ -806,8 +891,8 @@ def analyze_vector_shapes(vector_elements):
     
     return shape_analysis
 
-def analyze_drawing_colors(stroke, fill, items):
-    """Analyze colors in a vector drawing"""
+def analyze_drawing_colors(stroke_color, fill_color):
+    """Analyze colors in a vector drawing (RGB tuples or None)"""
     
     color_analysis = {
         "colors": [],
@@ -820,28 +905,14 @@ def analyze_drawing_colors(stroke, fill, items):
     try:
         colors = []
         
-        # Extract stroke color
-        if stroke and "color" in stroke:
-            stroke_color = stroke["color"]
+        if stroke_color is not None:
             colors.append(stroke_color)
             color_analysis["stroke_colors"].append(stroke_color)
         
-        # Extract fill color
-        if fill and "color" in fill:
-            fill_color = fill["color"]
+        if fill_color is not None:
             colors.append(fill_color)
             color_analysis["fill_colors"].append(fill_color)
         
-        # Extract colors from drawing items
-        for item in items:
-            if "color" in item:
-                item_color = item["color"]
-                colors.append(item_color)
-                if item.get("type") == "stroke":
-                    color_analysis["stroke_colors"].append(item_color)
-                elif item.get("type") == "fill":
-                    color_analysis["fill_colors"].append(item_color)
-        
         # Remove duplicates
         unique_colors = list(set(colors))
         color_analysis["colors"] = unique_colors
@@ -856,7 +927,7 @@ def analyze_drawing_colors(stroke, fill, items):
     
     return color_analysis
 
-def analyze_drawing_shapes(items, item_types):
+def analyze_drawing_shapes(item_types):
     """Analyze shapes in a vector drawing"""
     
     shape_analysis = {
@@ -1233,245 +1304,202 @@ def detect_specific_logo_patterns(vector_elements, page_rect):
     
     return specific_logos
 
-def detect_bosch_logo(vector_elements, page_rect):
+def logo_feature_matrix(vector_elements, page_rect):
+    """Per-page feature columns for the logo heuristics, one pass over the elements.
+    
+    Only elements with a rect get a row; `index` maps rows back to vector_elements.
+    `area`/`aspect_ratio` are the element's own fields, `rect_area`/`rect_aspect_ratio`
+    are recomputed from its rect (the heuristics use both).
+    """
+    
+    index = [i for i, elem in enumerate(vector_elements) if elem.get("rect")]
+    elements = [vector_elements[i] for i in index]
+    n = len(index)
+    
+    # flat fromiter fills are much cheaper than np.array over lists of per-element tuples
+    rect = np.fromiter(chain.from_iterable(elem["rect"][:4] for elem in elements),
+                       dtype=float, count=4 * n).reshape(n, 4)
+    area = np.fromiter((elem.get("area", 0) for elem in elements), dtype=float, count=n)
+    aspect_ratio = np.fromiter((elem.get("aspect_ratio", 0) for elem in elements), dtype=float, count=n)
+    logo_probability = np.fromiter((elem.get("logo_probability", 0) for elem in elements), dtype=float, count=n)
+    
+    # type flags per distinct (type, vector_type); pages only use a handful
+    type_codes = {}
+    codes = np.fromiter((type_codes.setdefault((elem.get("type", ""), elem.get("vector_type", "")), len(type_codes))
+                         for elem in elements), dtype=np.int64, count=n)
+    type_flags = np.zeros((len(type_codes), 4), dtype=bool)
+    for (elem_type, vector_type), code in type_codes.items():
+        lowered_type = elem_type.lower()
+        type_flags[code] = (
+            elem_type == "vector_drawing",
+            elem_type in ("vector_text", "vector_special_text") or "text" in vector_type.lower(),
+            "image" in lowered_type,
+            "drawing" in lowered_type
+        )
+    flags = type_flags[codes]
+    width = rect[:, 2] - rect[:, 0]
+    height = rect[:, 3] - rect[:, 1]
+    
+    return {
+        "index": np.array(index, dtype=np.int64),
+        "page_width": page_rect.width,
+        "page_height": page_rect.height,
+        "x": rect[:, 0],
+        "y": rect[:, 1],
+        "width": width,
+        "height": height,
+        "area": area,
+        "aspect_ratio": aspect_ratio,
+        "logo_probability": logo_probability,
+        "rect_area": width * height,
+        "rect_aspect_ratio": np.divide(width, height, out=np.zeros(n), where=height > 0),
+        "is_drawing": flags[:, 0],
+        "is_text": flags[:, 1],
+        "is_image_type": flags[:, 2],
+        "is_drawing_type": flags[:, 3]
+    }
+
+def circle_flags(vector_elements, features, rows):
+    """Circle flag (a drawing whose shape analysis mentions a circle) for the given feature rows,
+    checked once per row"""
+    
+    is_circle = np.zeros(len(features["index"]), dtype=bool)
+    unique_rows = np.unique(rows)
+    for row in unique_rows[features["is_drawing"][unique_rows]].tolist():
+        elem = vector_elements[features["index"][row]]
+        is_circle[row] = "circle" in str(elem.get("shape_analysis", {})).lower()
+    return is_circle
+
+def _rows_in_order(*conditions):
+    """Rows matching each condition, appended per row in condition order (a row can repeat),
+    as the per-element loops with several independent `if ...: append` checks built them."""
+    hits = np.stack(conditions, axis=1)
+    return np.repeat(np.arange(hits.shape[0]), hits.shape[1])[hits.ravel()]
+
+def _combined_logo(elements, logo_probability, detection_method):
+    """Bosch logo entry spanning a list of elements"""
+    
+    min_x = min(elem["rect"][0] for elem in elements if elem.get("rect"))
+    min_y = min(elem["rect"][1] for elem in elements if elem.get("rect"))
+    max_x = max(elem["rect"][2] for elem in elements if elem.get("rect"))
+    max_y = max(elem["rect"][3] for elem in elements if elem.get("rect"))
+    width = max_x - min_x
+    height = max_y - min_y
+    
+    return {
+        "type": "vector_specific_logo",
+        "vector_type": "logo",
+        "logo_type": "bosch",
+        "rect": [min_x, min_y, max_x, max_y],
+        "area": width * height,
+        "aspect_ratio": width / height if height > 0 else 0,
+        "center_x": (min_x + max_x) / 2,
+        "center_y": (min_y + max_y) / 2,
+        "logo_probability": logo_probability,
+        "source": "specific_pattern_detection",
+        "element_count": len(elements),
+        "combined_elements": [elem.get("type", "unknown") for elem in elements],
+        "color_analysis": analyze_vector_colors(elements),
+        "shape_analysis": analyze_vector_shapes(elements),
+        "detection_method": detection_method
+    }
+
+def _single_element_logo(elem, area, logo_probability, element_type, logo_type, source, detection_method):
+    """Logo entry for one element"""
+    
+    rect = elem["rect"]
+    width = rect[2] - rect[0]
+    height = rect[3] - rect[1]
+    
+    return {
+        "type": element_type,
+        "vector_type": "logo",
+        "logo_type": logo_type,
+        "rect": rect,
+        "area": area,
+        "aspect_ratio": width / height if height > 0 else 0,
+        "center_x": (rect[0] + rect[2]) / 2,
+        "center_y": (rect[1] + rect[3]) / 2,
+        "logo_probability": logo_probability,
+        "source": source,
+        "element_count": 1,
+        "combined_elements": [elem.get("type", "unknown")],
+        "color_analysis": analyze_vector_colors([elem]),
+        "shape_analysis": analyze_vector_shapes([elem]),
+        "detection_method": detection_method
+    }
+
+def detect_bosch_logo(vector_elements, page_rect, features=None):
     """Detect Bosch logo pattern: circle + text in top-right corner"""
     
     try:
-        page_width = page_rect.width
-        page_height = page_rect.height
+        if features is None:
+            features = logo_feature_matrix(vector_elements, page_rect)
+        page_width = features["page_width"]
+        page_height = features["page_height"]
+        x, y = features["x"], features["y"]
+        area, aspect_ratio = features["area"], features["aspect_ratio"]
+        
+        def elements_at(rows):
+            return [vector_elements[i] for i in features["index"][rows].tolist()]
+        
+        # Top-right corner (last 30% of width, top 20% of height),
+        # and a wider top-right area (last 25% of width, top 25% of height)
+        in_top_right = (x > page_width * 0.7) & (y < page_height * 0.2)
+        in_wide_top_right = (x > page_width * 0.75) & (y < page_height * 0.25)
+        top_right_rows = _rows_in_order(in_top_right, in_wide_top_right)
+        
+        # Bosch logo area: very top-right (15% / 10%), with margin (20% / 15%),
+        # wider (25% / 30%), and anything in the top 40% of the page
+        bosch_area_rows = _rows_in_order(
+            (x > page_width * 0.85) & (y < page_height * 0.1),
+            (x > page_width * 0.8) & (y < page_height * 0.15),
+            (x > page_width * 0.75) & (y < page_height * 0.3),
+            y < page_height * 0.4
+        )
         
-        # Look for elements in top-right corner (Bosch logo position)
-        top_right_elements = []
+        all_top_right_rows = np.concatenate([top_right_rows, bosch_area_rows])
         
-        for elem in vector_elements:
-            if not elem.get("rect"):
-                continue
-            
-            rect = elem["rect"]
-            x, y = rect[0], rect[1]
-            
-            # Check if element is in top-right area (last 30% of width, top 20% of height)
-            if x > page_width * 0.7 and y < page_height * 0.2:
-                top_right_elements.append(elem)
-            
-            # Also check for elements in a wider top-right area (last 25% of width, top 25% of height)
-            if x > page_width * 0.75 and y < page_height * 0.25:
-                top_right_elements.append(elem)
-        
-        # Also look for any elements that might be part of the Bosch logo
-        # The Bosch logo is typically in the very top-right corner
-        bosch_area_elements = []
-        for elem in vector_elements:
-            if not elem.get("rect"):
-                continue
-            
-            rect = elem["rect"]
-            x, y = rect[0], rect[1]
-            
-            # More specific Bosch logo area (last 15% of width, top 10% of height)
-            if x > page_width * 0.85 and y < page_height * 0.1:
-                bosch_area_elements.append(elem)
-            
-            # Also look for Bosch logo with some margin (last 20% of width, top 15% of height)
-            if x > page_width * 0.8 and y < page_height * 0.15:
-                bosch_area_elements.append(elem)
-            
-            # Look for Bosch logo in a wider area (last 25% of width, top 30% of height)
-            if x > page_width * 0.75 and y < page_height * 0.3:
-                bosch_area_elements.append(elem)
-            
-            # Look for any elements that might be logos in the top area
-            if y < page_height * 0.4:
-                bosch_area_elements.append(elem)
-        
-        # Combine both sets
-        all_top_right_elements = top_right_elements + bosch_area_elements
-        
-        if len(all_top_right_elements) >= 1:
-            # Look for circle + text pattern
-            circles = []
-            text_elements = []
-            small_elements = []
-            
-            for elem in all_top_right_elements:
-                elem_type = elem.get("type", "")
-                vector_type = elem.get("vector_type", "")
-                
-                # Look for circular elements
-                if (elem_type == "vector_drawing" and 
-                    "circle" in str(elem.get("shape_analysis", {})).lower()):
-                    circles.append(elem)
-                
-                # Look for text elements
-                if (elem_type == "vector_text" or 
-                    elem_type == "vector_special_text" or
-                    "text" in vector_type.lower()):
-                    text_elements.append(elem)
-                
-                # Look for small geometric elements that might be the "H" symbol
-                if (elem_type == "vector_drawing" and 
-                    elem.get("area", 0) < 500 and
-                    elem.get("aspect_ratio", 0) > 0.5 and
-                    elem.get("aspect_ratio", 0) < 2.0):
-                    small_elements.append(elem)
-                
-                # Look for any small elements in the Bosch area
-                if elem.get("area", 0) < 1000:
-                    small_elements.append(elem)
+        if len(all_top_right_rows):
+            # Circle + text pattern, plus small geometric elements that might be the "H" symbol
+            # and any small elements in the Bosch area
+            is_circle = circle_flags(vector_elements, features, all_top_right_rows)
+            circle_rows = all_top_right_rows[is_circle[all_top_right_rows]]
+            text_rows = all_top_right_rows[features["is_text"][all_top_right_rows]]
+            small_symbol = (features["is_drawing"] & (area < 500) &
+                            (aspect_ratio > 0.5) & (aspect_ratio < 2.0))
+            small_rows = all_top_right_rows[_rows_in_order(
+                small_symbol[all_top_right_rows], area[all_top_right_rows] < 1000)]
             
             # Create Bosch logo from any combination of elements in the area
-            if small_elements or circles or text_elements:
-                # Combine all elements into one logo
-                all_elements = circles + text_elements + small_elements
-                
-                # Calculate combined bounding box
-                min_x = min(elem["rect"][0] for elem in all_elements if elem.get("rect"))
-                min_y = min(elem["rect"][1] for elem in all_elements if elem.get("rect"))
-                max_x = max(elem["rect"][2] for elem in all_elements if elem.get("rect"))
-                max_y = max(elem["rect"][3] for elem in all_elements if elem.get("rect"))
-                
-                combined_rect = [min_x, min_y, max_x, max_y]
-                width = max_x - min_x
-                height = max_y - min_y
-                area = width * height
-                aspect_ratio = width / height if height > 0 else 0
-                center_x = (min_x + max_x) / 2
-                center_y = (min_y + max_y) / 2
-                
-                # High probability for Bosch logo pattern
-                logo_probability = 0.95
-                
-                # Analyze colors and shapes
-                color_analysis = analyze_vector_colors(all_elements)
-                shape_analysis = analyze_vector_shapes(all_elements)
-                
-                return {
-                    "type": "vector_specific_logo",
-                    "vector_type": "logo",
-                    "logo_type": "bosch",
-                    "rect": combined_rect,
-                    "area": area,
-                    "aspect_ratio": aspect_ratio,
-                    "center_x": center_x,
-                    "center_y": center_y,
-                    "logo_probability": logo_probability,
-                    "source": "specific_pattern_detection",
-                    "element_count": len(all_elements),
-                    "combined_elements": [elem.get("type", "unknown") for elem in all_elements],
-                    "color_analysis": color_analysis,
-                    "shape_analysis": shape_analysis,
-                    "detection_method": "bosch_pattern"
-                }
-            
-            # If we found circle + text pattern, create Bosch logo
-            if circles and text_elements:
-                # Combine all elements into one logo
-                all_elements = circles + text_elements
-                
-                # Calculate combined bounding box
-                min_x = min(elem["rect"][0] for elem in all_elements if elem.get("rect"))
-                min_y = min(elem["rect"][1] for elem in all_elements if elem.get("rect"))
-                max_x = max(elem["rect"][2] for elem in all_elements if elem.get("rect"))
-                max_y = max(elem["rect"][3] for elem in all_elements if elem.get("rect"))
-                
-                combined_rect = [min_x, min_y, max_x, max_y]
-                width = max_x - min_x
-                height = max_y - min_y
-                area = width * height
-                aspect_ratio = width / height if height > 0 else 0
-                center_x = (min_x + max_x) / 2
-                center_y = (min_y + max_y) / 2
-                
-                # High probability for Bosch logo pattern
-                logo_probability = 0.9
-                
-                # Analyze colors and shapes
-                color_analysis = analyze_vector_colors(all_elements)
-                shape_analysis = analyze_vector_shapes(all_elements)
-                
-                return {
-                    "type": "vector_specific_logo",
-                    "vector_type": "logo",
-                    "logo_type": "bosch",
-                    "rect": combined_rect,
-                    "area": area,
-                    "aspect_ratio": aspect_ratio,
-                    "center_x": center_x,
-                    "center_y": center_y,
-                    "logo_probability": logo_probability,
-                    "source": "specific_pattern_detection",
-                    "element_count": len(all_elements),
-                    "combined_elements": [elem.get("type", "unknown") for elem in all_elements],
-                    "color_analysis": color_analysis,
-                    "shape_analysis": shape_analysis,
-                    "detection_method": "bosch_pattern"
-                }
+            if len(small_rows) or len(circle_rows) or len(text_rows):
+                all_elements = elements_at(np.concatenate([circle_rows, text_rows, small_rows]))
+                return _combined_logo(all_elements, 0.95, "bosch_pattern")
         
         # Also look for any large element in top-right that might be a logo
-        for elem in top_right_elements:
-            if (elem.get("area", 0) > 200 and 
-                elem.get("logo_probability", 0) > 0.3):
-                
-                # Boost probability for top-right positioning
-                boosted_probability = min(elem.get("logo_probability", 0) + 0.4, 1.0)
-                
-                # Create enhanced logo entry
-                enhanced_logo = elem.copy()
-                enhanced_logo["logo_probability"] = boosted_probability
-                enhanced_logo["vector_type"] = "logo"
-                enhanced_logo["logo_type"] = "top_right_corner"
-                enhanced_logo["detection_method"] = "top_right_position"
-                
-                return enhanced_logo
+        large_top_right = (in_top_right | in_wide_top_right) & (area > 200) & (features["logo_probability"] > 0.3)
+        if large_top_right.any():
+            elem = elements_at(np.flatnonzero(large_top_right)[:1])[0]
+            
+            # Boost probability for top-right positioning
+            enhanced_logo = elem.copy()
+            enhanced_logo["logo_probability"] = min(elem.get("logo_probability", 0) + 0.4, 1.0)
+            enhanced_logo["vector_type"] = "logo"
+            enhanced_logo["logo_type"] = "top_right_corner"
+            enhanced_logo["detection_method"] = "top_right_position"
+            return enhanced_logo
         
         # Fallback: Create a Bosch logo from all elements in the Bosch area
-        if bosch_area_elements:
-            # Calculate combined bounding box for all Bosch area elements
-            min_x = min(elem["rect"][0] for elem in bosch_area_elements if elem.get("rect"))
-            min_y = min(elem["rect"][1] for elem in bosch_area_elements if elem.get("rect"))
-            max_x = max(elem["rect"][2] for elem in bosch_area_elements if elem.get("rect"))
-            max_y = max(elem["rect"][3] for elem in bosch_area_elements if elem.get("rect"))
-            
-            combined_rect = [min_x, min_y, max_x, max_y]
-            width = max_x - min_x
-            height = max_y - min_y
-            area = width * height
-            aspect_ratio = width / height if height > 0 else 0
-            center_x = (min_x + max_x) / 2
-            center_y = (min_y + max_y) / 2
-            
-            # High probability for Bosch logo in this area
-            logo_probability = 0.9
-            
-            # Analyze colors and shapes
-            color_analysis = analyze_vector_colors(bosch_area_elements)
-            shape_analysis = analyze_vector_shapes(bosch_area_elements)
-            
-            return {
-                "type": "vector_specific_logo",
-                "vector_type": "logo",
-                "logo_type": "bosch",
-                "rect": combined_rect,
-                "area": area,
-                "aspect_ratio": aspect_ratio,
-                "center_x": center_x,
-                "center_y": center_y,
-                "logo_probability": logo_probability,
-                "source": "specific_pattern_detection",
-                "element_count": len(bosch_area_elements),
-                "combined_elements": [elem.get("type", "unknown") for elem in bosch_area_elements],
-                "color_analysis": color_analysis,
-                "shape_analysis": shape_analysis,
-                "detection_method": "bosch_area_fallback"
-            }
+        if len(bosch_area_rows):
+            return _combined_logo(elements_at(bosch_area_rows), 0.9, "bosch_area_fallback")
         
         # Extended logo detection: Look for any logo-like elements in the top area
-        extended_logos = detect_extended_logo_elements(vector_elements, page_rect)
+        extended_logos = detect_extended_logo_elements(vector_elements, page_rect, features)
         if extended_logos:
             return extended_logos
         
         # Universal logo detection: Analyze all vector elements for logo characteristics
-        universal_logos = detect_universal_logo_elements(vector_elements, page_rect)
+        universal_logos = detect_universal_logo_elements(vector_elements, page_rect, features)
         if universal_logos:
             return universal_logos
         
@@ -1509,63 +1537,38 @@ def detect_common_logo_patterns(vector_elements, page_rect):
     
     return common_logos
 
+# Header elements belong to one logo when horizontally close and at a similar vertical position
+HEADER_MAX_HORIZONTAL_DISTANCE = 100  # points
+HEADER_MAX_VERTICAL_DISTANCE = 30     # points
+
+def header_centers_related(center1, center2):
+    # Check horizontal proximity (logos are usually horizontally aligned)
+    horizontal_distance = abs(center1[0] - center2[0])
+    vertical_distance = abs(center1[1] - center2[1])
+    return (horizontal_distance <= HEADER_MAX_HORIZONTAL_DISTANCE and 
+            vertical_distance <= HEADER_MAX_VERTICAL_DISTANCE)
+
 def group_header_elements(elements, page_rect):
     """Group elements in header area that might form logos"""
     
-    groups = []
-    used = set()
-    
     try:
-        for i, elem1 in enumerate(elements):
-            if i in used:
-                continue
-            
-            group = [elem1]
-            used.add(i)
-            
-            for j, elem2 in enumerate(elements):
-                if j in used:
-                    continue
-                
-                # Check if elements are close and in similar vertical position
-                if are_header_elements_related(elem1, elem2, page_rect):
-                    group.append(elem2)
-                    used.add(j)
-            
-            if len(group) >= 2:
-                groups.append(group)
+        groups = group_by_center_grid(
+            elements, HEADER_MAX_HORIZONTAL_DISTANCE, HEADER_MAX_VERTICAL_DISTANCE,
+            header_centers_related)
+        return [group for group in groups if len(group) >= 2]
         
     except Exception as e:
         logger.warning(f"Error grouping header elements: {e}")
-    
-    return groups
+        return []
 
 def are_header_elements_related(elem1, elem2, page_rect):
     """Check if two header elements might be part of the same logo"""
     
     try:
-        rect1 = elem1.get("rect", [])
-        rect2 = elem2.get("rect", [])
-        
-        if len(rect1) != 4 or len(rect2) != 4:
+        centers = element_centers([elem1, elem2])
+        if np.isnan(centers).any():
             return False
-        
-        # Calculate centers
-        center1_x = (rect1[0] + rect1[2]) / 2
-        center1_y = (rect1[1] + rect1[3]) / 2
-        center2_x = (rect2[0] + rect2[2]) / 2
-        center2_y = (rect2[1] + rect2[3]) / 2
-        
-        # Check horizontal proximity (logos are usually horizontally aligned)
-        horizontal_distance = abs(center1_x - center2_x)
-        vertical_distance = abs(center1_y - center2_y)
-        
-        # Elements should be close horizontally and at similar vertical position
-        max_horizontal_distance = 100  # 100 points
-        max_vertical_distance = 30     # 30 points
-        
-        return (horizontal_distance <= max_horizontal_distance and 
-                vertical_distance <= max_vertical_distance)
+        return header_centers_related(centers[0].tolist(), centers[1].tolist())
         
     except Exception as e:
         logger.warning(f"Error checking header element relation: {e}")
@@ -1663,128 +1666,51 @@ def calculate_group_logo_probability(group, rect, page_rect):
         logger.warning(f"Error calculating group logo probability: {e}")
         return 0.5
 
-def detect_extended_logo_elements(vector_elements, page_rect):
+def detect_extended_logo_elements(vector_elements, page_rect, features=None):
     """Detect extended logo elements in various positions"""
     
     try:
-        page_width = page_rect.width
-        page_height = page_rect.height
-        
-        # Look for logo-like elements in the top area with margin
-        top_area_elements = []
-        
-        for elem in vector_elements:
-            if not elem.get("rect"):
-                continue
-            
-            rect = elem["rect"]
-            x, y = rect[0], rect[1]
-            width = rect[2] - rect[0]
-            height = rect[3] - rect[1]
-            area = width * height
-            
-            # Check for elements in top area with margin (top 30% of height)
-            if y < page_height * 0.3:
-                # Look for logo-like characteristics
-                if (area > 100 and area < 10000 and  # Reasonable logo size
-                    width > 20 and height > 10):     # Minimum dimensions
-                    
-                    # Boost probability for right-side positioning
-                    logo_probability = 0.3
-                    
-                    # Right-side boost
-                    if x > page_width * 0.6:
-                        logo_probability += 0.3
-                    
-                    # Top area boost
-                    if y < page_height * 0.2:
-                        logo_probability += 0.2
-                    
-                    # Size boost for medium-sized elements
-                    if 500 < area < 5000:
-                        logo_probability += 0.2
-                    
-                    # If probability is high enough, create logo entry
-                    if logo_probability > 0.6:
-                        # Analyze colors and shapes
-                        color_analysis = analyze_vector_colors([elem])
-                        shape_analysis = analyze_vector_shapes([elem])
-                        
-                        return {
-                            "type": "vector_extended_logo",
-                            "vector_type": "logo",
-                            "logo_type": "extended_detection",
-                            "rect": rect,
-                            "area": area,
-                            "aspect_ratio": width / height if height > 0 else 0,
-                            "center_x": (rect[0] + rect[2]) / 2,
-                            "center_y": (rect[1] + rect[3]) / 2,
-                            "logo_probability": logo_probability,
-                            "source": "extended_detection",
-                            "element_count": 1,
-                            "combined_elements": [elem.get("type", "unknown")],
-                            "color_analysis": color_analysis,
-                            "shape_analysis": shape_analysis,
-                            "detection_method": "extended_logo_detection"
-                        }
-        
-        # Also look for any large elements that might be logos
-        large_elements = []
-        for elem in vector_elements:
-            if not elem.get("rect"):
-                continue
-            
-            rect = elem["rect"]
-            area = (rect[2] - rect[0]) * (rect[3] - rect[1])
-            
-            # Look for large elements that might be logos
-            if area > 1000 and area < 20000:
-                large_elements.append((elem, area))
-        
-        # Sort by area and check the largest elements
-        large_elements.sort(key=lambda x: x[1], reverse=True)
-        
-        for elem, area in large_elements[:3]:  # Check top 3 largest elements
-            rect = elem["rect"]
-            x, y = rect[0], rect[1]
-            
-            # Check if it's in a logo-like position
-            logo_probability = 0.2
-            
-            # Right-side boost
-            if x > page_width * 0.5:
-                logo_probability += 0.3
-            
-            # Top area boost
-            if y < page_height * 0.3:
-                logo_probability += 0.3
-            
-            # Size boost
-            if 2000 < area < 15000:
-                logo_probability += 0.2
-            
-            if logo_probability > 0.6:
-                # Analyze colors and shapes
-                color_analysis = analyze_vector_colors([elem])
-                shape_analysis = analyze_vector_shapes([elem])
-                
-                return {
-                    "type": "vector_extended_logo",
-                    "vector_type": "logo",
-                    "logo_type": "large_element",
-                    "rect": rect,
-                    "area": area,
-                    "aspect_ratio": (rect[2] - rect[0]) / (rect[3] - rect[1]) if (rect[3] - rect[1]) > 0 else 0,
-                    "center_x": (rect[0] + rect[2]) / 2,
-                    "center_y": (rect[1] + rect[3]) / 2,
-                    "logo_probability": logo_probability,
-                    "source": "extended_detection",
-                    "element_count": 1,
-                    "combined_elements": [elem.get("type", "unknown")],
-                    "color_analysis": color_analysis,
-                    "shape_analysis": shape_analysis,
-                    "detection_method": "large_element_detection"
-                }
+        if features is None:
+            features = logo_feature_matrix(vector_elements, page_rect)
+        page_width = features["page_width"]
+        page_height = features["page_height"]
+        x, y = features["x"], features["y"]
+        width, height = features["width"], features["height"]
+        area = features["rect_area"]
+        
+        # Logo-like elements in the top area with margin (top 30% of height):
+        # reasonable logo size and minimum dimensions
+        top_area = ((y < page_height * 0.3) & (area > 100) & (area < 10000) &
+                    (width > 20) & (height > 10))
+        
+        # Base 0.3, right-side, top area and medium size boosts
+        logo_probability = 0.3 + np.where(x > page_width * 0.6, 0.3, 0.0)
+        logo_probability = logo_probability + np.where(y < page_height * 0.2, 0.2, 0.0)
+        logo_probability = logo_probability + np.where((500 < area) & (area < 5000), 0.2, 0.0)
+        
+        hits = np.flatnonzero(top_area & (logo_probability > 0.6))
+        if len(hits):
+            row = hits[0]
+            return _single_element_logo(
+                vector_elements[features["index"][row]], float(area[row]), float(logo_probability[row]),
+                "vector_extended_logo", "extended_detection", "extended_detection", "extended_logo_detection")
+        
+        # Also look for any large elements that might be logos: check the 3 largest
+        large_rows = np.flatnonzero((area > 1000) & (area < 20000))
+        large_rows = large_rows[np.argsort(-area[large_rows], kind="stable")][:3]
+        
+        # Base 0.2, right-side, top area and size boosts
+        logo_probability = 0.2 + np.where(x[large_rows] > page_width * 0.5, 0.3, 0.0)
+        logo_probability = logo_probability + np.where(y[large_rows] < page_height * 0.3, 0.3, 0.0)
+        large_area = area[large_rows]
+        logo_probability = logo_probability + np.where((2000 < large_area) & (large_area < 15000), 0.2, 0.0)
+        
+        hits = np.flatnonzero(logo_probability > 0.6)
+        if len(hits):
+            row = large_rows[hits[0]]
+            return _single_element_logo(
+                vector_elements[features["index"][row]], float(area[row]), float(logo_probability[hits[0]]),
+                "vector_extended_logo", "large_element", "extended_detection", "large_element_detection")
         
         return None
         
@@ -1792,95 +1718,42 @@ def detect_extended_logo_elements(vector_elements, page_rect):
         logger.warning(f"Error detecting extended logo elements: {e}")
         return None
 
-def detect_universal_logo_elements(vector_elements, page_rect):
+def detect_universal_logo_elements(vector_elements, page_rect, features=None):
     """Detect logo elements by analyzing all vector elements"""
     
     try:
-        page_width = page_rect.width
-        page_height = page_rect.height
-        
-        # Analyze all vector elements for logo characteristics
-        logo_candidates = []
-        
-        for elem in vector_elements:
-            if not elem.get("rect"):
-                continue
-            
-            rect = elem["rect"]
-            x, y = rect[0], rect[1]
-            width = rect[2] - rect[0]
-            height = rect[3] - rect[1]
-            area = width * height
-            
-            # Calculate logo probability based on various factors
-            logo_probability = 0.0
-            
-            # Position-based scoring
-            if y < page_height * 0.2:  # Top 20%
-                logo_probability += 0.3
-            elif y < page_height * 0.4:  # Top 40%
-                logo_probability += 0.2
-            
-            # Right-side positioning
-            if x > page_width * 0.7:  # Right 30%
-                logo_probability += 0.3
-            elif x > page_width * 0.5:  # Right 50%
-                logo_probability += 0.2
-            
-            # Size-based scoring
-            if 100 < area < 1000:  # Small logos
-                logo_probability += 0.2
-            elif 1000 < area < 5000:  # Medium logos
-                logo_probability += 0.3
-            elif 5000 < area < 20000:  # Large logos
-                logo_probability += 0.2
-            
-            # Aspect ratio scoring
-            aspect_ratio = width / height if height > 0 else 0
-            if 0.5 < aspect_ratio < 3.0:  # Reasonable logo proportions
-                logo_probability += 0.1
-            
-            # Type-based scoring
-            elem_type = elem.get("type", "")
-            if "image" in elem_type.lower():
-                logo_probability += 0.1
-            if "drawing" in elem_type.lower():
-                logo_probability += 0.1
-            
-            # If probability is high enough, consider it a logo
-            if logo_probability > 0.5:
-                logo_candidates.append((elem, logo_probability))
-        
-        # Sort by probability and return the best candidates
-        logo_candidates.sort(key=lambda x: x[1], reverse=True)
-        
-        for elem, probability in logo_candidates[:3]:  # Return top 3 candidates
-            rect = elem["rect"]
-            width = rect[2] - rect[0]
-            height = rect[3] - rect[1]
-            area = width * height
-            
-            # Analyze colors and shapes
-            color_analysis = analyze_vector_colors([elem])
-            shape_analysis = analyze_vector_shapes([elem])
-            
-            return {
-                "type": "vector_universal_logo",
-                "vector_type": "logo",
-                "logo_type": "universal_detection",
-                "rect": rect,
-                "area": area,
-                "aspect_ratio": width / height if height > 0 else 0,
-                "center_x": (rect[0] + rect[2]) / 2,
-                "center_y": (rect[1] + rect[3]) / 2,
-                "logo_probability": probability,
-                "source": "universal_detection",
-                "element_count": 1,
-                "combined_elements": [elem.get("type", "unknown")],
-                "color_analysis": color_analysis,
-                "shape_analysis": shape_analysis,
-                "detection_method": "universal_logo_detection"
-            }
+        if features is None:
+            features = logo_feature_matrix(vector_elements, page_rect)
+        page_width = features["page_width"]
+        page_height = features["page_height"]
+        x, y = features["x"], features["y"]
+        area = features["rect_area"]
+        aspect_ratio = features["rect_aspect_ratio"]
+        
+        # Position-based scoring: top 20% / top 40%, right 30% / right 50%
+        logo_probability = 0.0 + np.where(y < page_height * 0.2, 0.3, np.where(y < page_height * 0.4, 0.2, 0.0))
+        logo_probability = logo_probability + np.where(
+            x > page_width * 0.7, 0.3, np.where(x > page_width * 0.5, 0.2, 0.0))
+        
+        # Size-based scoring: small, medium and large logos
+        logo_probability = logo_probability + np.select(
+            [(100 < area) & (area < 1000), (1000 < area) & (area < 5000), (5000 < area) & (area < 20000)],
+            [0.2, 0.3, 0.2], default=0.0)
+        
+        # Reasonable logo proportions
+        logo_probability = logo_probability + np.where((0.5 < aspect_ratio) & (aspect_ratio < 3.0), 0.1, 0.0)
+        
+        # Type-based scoring
+        logo_probability = logo_probability + np.where(features["is_image_type"], 0.1, 0.0)
+        logo_probability = logo_probability + np.where(features["is_drawing_type"], 0.1, 0.0)
+        
+        # Return the best candidate above 0.5 (first one on ties)
+        candidates = logo_probability > 0.5
+        if candidates.any():
+            row = int(np.argmax(np.where(candidates, logo_probability, -np.inf)))
+            return _single_element_logo(
+                vector_elements[features["index"][row]], float(area[row]), float(logo_probability[row]),
+                "vector_universal_logo", "universal_detection", "universal_detection", "universal_logo_detection")
         
         return None
         
@@ -2212,112 +2085,120 @@ def extract_text_as_vectors(page):
     
     return text_vectors
 
-def extract_geometric_shapes(page):
-    """Extract geometric shapes from page"""
+def extract_geometric_shapes(page, columns=None):
+    """Extract geometric shapes from page (drawing columns are reused when given)"""
     
     shapes = []
     
     try:
-        # Get drawings and analyze for geometric shapes
-        drawings = page.get_drawings()
-        
-        for drawing in drawings:
-            items = drawing.get("items", [])
-            
-            # Analyze for rectangles, circles, triangles
-            shape_info = analyze_geometric_shape(items, drawing.get("rect", []))
-            if shape_info:
-                shapes.append(shape_info)
+        if columns is None:
+            columns = drawing_columns(page_drawings(page))
+        
+        item_count = columns["item_count"]
+        line_count, curve_count, rect_count = (columns["op_counts"][:, i] for i in range(3))
+        is_rectangle = (item_count > 0) & (rect_count > 0)
+        # closed paths made only of bezier curves
+        is_circle = (item_count > 0) & ~is_rectangle & (curve_count == item_count)
+        
+        rects = columns["rect"]
+        areas = columns["area"]
+        for index in np.flatnonzero(is_rectangle | is_circle):
+            shapes.append({
+                "type": "rectangle" if is_rectangle[index] else "circle",
+                "rect": rects[index].tolist(),
+                "area": float(areas[index])
+            })
         
     except Exception as e:
         logger.warning(f"Error extracting geometric shapes: {e}")
     
     return shapes
 
-def extract_paths_and_curves(page):
-    """Extract paths and curves from page"""
+def extract_paths_and_curves(page, columns=None):
+    """Extract paths and curves from page (drawing columns are reused when given)"""
     
     paths = []
     
     try:
-        drawings = page.get_drawings()
-        
-        for drawing in drawings:
-            items = drawing.get("items", [])
-            
-            # Analyze for complex paths and curves
-            path_info = analyze_complex_path(items, drawing.get("rect", []))
-            if path_info:
-                paths.append(path_info)
+        if columns is None:
+            columns = drawing_columns(page_drawings(page))
+        
+        op_counts = columns["op_counts"]
+        item_count = columns["item_count"]
+        rects = columns["rect"]
+        for index in np.flatnonzero(item_count > 0):
+            line_count = int(op_counts[index, 0])
+            curve_count = int(op_counts[index, 1])
+            paths.append({
+                "type": "complex_path",
+                "rect": rects[index].tolist(),
+                "curve_count": curve_count,
+                "line_count": line_count,
+                "total_segments": int(item_count[index]),
+                "complexity": curve_count + line_count
+            })
         
     except Exception as e:
         logger.warning(f"Error extracting paths and curves: {e}")
     
     return paths
 
+def _total_items(item_types):
+    """Item total from an item-type Counter/dict, or item counts as they are (scalar or array)"""
+    if isinstance(item_types, dict):
+        return sum(item_types.values())
+    return np.asarray(item_types)
+
+def _scalar_or_array(values):
+    return values.item() if values.ndim == 0 else values
+
 def determine_vector_type(item_types, area, aspect_ratio):
-    """Determine the type of vector element"""
-    
-    total_items = sum(item_types.values())
-    
-    # Logo characteristics
-    if (total_items <= 20 and 
-        area > 100 and area < 10000 and 
-        0.5 <= aspect_ratio <= 2.0):
-        return "logo"
-    
-    # Icon characteristics
-    if (total_items <= 10 and 
-        area < 1000 and 
-        0.8 <= aspect_ratio <= 1.2):
-        return "icon"
-    
-    # Illustration characteristics
-    if (total_items > 20 and 
-        area > 1000):
-        return "illustration"
-    
-    # Decorative element
-    if total_items <= 5:
-        return "decorative"
-    
-    return "complex_vector"
+    """Determine the type of vector element (scalars, or arrays over a page's drawings)"""
+    
+    total_items = _total_items(item_types)
+    area = np.asarray(area, dtype=float)
+    aspect_ratio = np.asarray(aspect_ratio, dtype=float)
+    
+    vector_type = np.select([
+        # Logo characteristics
+        (total_items <= 20) & (area > 100) & (area < 10000) & (0.5 <= aspect_ratio) & (aspect_ratio <= 2.0),
+        # Icon characteristics
+        (total_items <= 10) & (area < 1000) & (0.8 <= aspect_ratio) & (aspect_ratio <= 1.2),
+        # Illustration characteristics
+        (total_items > 20) & (area > 1000),
+        # Decorative element
+        total_items <= 5
+    ], ["logo", "icon", "illustration", "decorative"], default="complex_vector")
+    
+    return _scalar_or_array(vector_type)
 
 def is_potential_logo_vector(vector_info):
-    """Check if vector element is likely a logo"""
-    
-    logo_indicators = 0
+    """Check if vector element is likely a logo (an element dict, or scored drawing columns)"""
     
     # Size indicators
-    area = vector_info.get("area", 0)
-    if 100 <= area <= 10000:
-        logo_indicators += 1
+    area = np.asarray(vector_info.get("area", 0))
+    logo_indicators = ((100 <= area) & (area <= 10000)).astype(int)
     
     # Aspect ratio
-    aspect_ratio = vector_info.get("aspect_ratio", 0)
-    if 0.5 <= aspect_ratio <= 2.0:
-        logo_indicators += 1
+    aspect_ratio = np.asarray(vector_info.get("aspect_ratio", 0))
+    logo_indicators += (0.5 <= aspect_ratio) & (aspect_ratio <= 2.0)
     
     # Complexity (logos are usually simple)
-    item_count = vector_info.get("item_count", 0)
-    if item_count <= 20:
-        logo_indicators += 1
+    logo_indicators += np.asarray(vector_info.get("item_count", 0)) <= 20
     
     # Logo probability score
-    logo_prob = vector_info.get("logo_probability", 0)
-    if logo_prob > 0.6:
-        logo_indicators += 1
+    logo_indicators += np.asarray(vector_info.get("logo_probability", 0)) > 0.6
     
-    return logo_indicators >= 3
+    return _scalar_or_array(logo_indicators >= 3)
 
 def is_potential_illustration(vector_info):
-    """Check if vector element is likely an illustration"""
+    """Check if vector element is likely an illustration (an element dict, or drawing columns)"""
     
     # Illustrations are usually more complex
-    item_count = vector_info.get("item_count", 0)
-    area = vector_info.get("area", 0)
+    item_count = np.asarray(vector_info.get("item_count", 0))
+    area = np.asarray(vector_info.get("area", 0))
     
-    return item_count > 20 and area > 1000
+    return _scalar_or_array((item_count > 20) & (area > 1000))
 
 def is_potential_logo_text(span):
     """Check if text might be a logo"""
@@ -2367,100 +2248,31 @@ def calculate_text_logo_probability(span):
     
     return min(probability, 1.0)
 
-def calculate_complexity_score(items):
-    """Calculate complexity score of vector element"""
+def calculate_complexity_score(op_counts, item_count):
+    """Weighted operator count per drawing; op_counts columns follow DRAWING_OPS, other operators weigh 1"""
     
-    if not items:
-        return 0
-    
-    # Count different types of operations
-    operation_types = Counter()
-    
-    for item in items:
-        op_type = item.get("type", "unknown")
-        operation_types[op_type] += 1
-    
-    # Weight different operations
-    weights = {
-        "m": 1,    # move
-        "l": 2,    # line
-        "c": 3,    # curve
-        "re": 2,   # rectangle
-        "f": 1,    # fill
-        "s": 1     # stroke
-    }
-    
-    complexity = sum(weights.get(op, 1) * count for op, count in operation_types.items())
-    
-    return complexity
+    op_counts = np.asarray(op_counts)
+    weighted = op_counts @ _OP_WEIGHTS
+    return weighted + (np.asarray(item_count) - op_counts.sum(axis=-1))
 
 def calculate_logo_probability(item_types, area, aspect_ratio):
-    """Calculate probability that vector element is a logo"""
+    """Calculate probability that vector element is a logo (scalars, or arrays over a page's drawings)"""
     
-    probability = 0.0
+    area = np.asarray(area, dtype=float)
+    aspect_ratio = np.asarray(aspect_ratio, dtype=float)
+    total_items = _total_items(item_types)
     
     # Size factor
-    if 100 <= area <= 10000:
-        probability += 0.3
-    elif 50 <= area <= 50000:
-        probability += 0.2
+    probability = np.where((100 <= area) & (area <= 10000), 0.3,
+                           np.where((50 <= area) & (area <= 50000), 0.2, 0.0))
     
     # Aspect ratio factor
-    if 0.5 <= aspect_ratio <= 2.0:
-        probability += 0.2
+    probability = probability + np.where((0.5 <= aspect_ratio) & (aspect_ratio <= 2.0), 0.2, 0.0)
     
     # Complexity factor (logos are usually simple)
-    total_items = sum(item_types.values())
-    if total_items <= 10:
-        probability += 0.3
-    elif total_items <= 20:
-        probability += 0.2
+    probability = probability + np.where(total_items <= 10, 0.3, np.where(total_items <= 20, 0.2, 0.0))
     
-    return min(probability, 1.0)
-
-def analyze_geometric_shape(items, rect):
-    """Analyze geometric shape from drawing items"""
-    
-    if not items:
-        return None
-    
-    # Count different operations
-    operations = [item.get("type", "") for item in items]
-    
-    # Detect shape type
-    if "re" in operations:
-        return {
-            "type": "rectangle",
-            "rect": rect,
-            "area": (rect[2] - rect[0]) * (rect[3] - rect[1]) if len(rect) == 4 else 0
-        }
-    elif all(op in ["m", "c"] for op in operations):
-        return {
-            "type": "circle",
-            "rect": rect,
-            "area": (rect[2] - rect[0]) * (rect[3] - rect[1]) if len(rect) == 4 else 0
-        }
-    
-    return None
-
-def analyze_complex_path(items, rect):
-    """Analyze complex path from drawing items"""
-    
-    if not items:
-        return None
-    
-    # Count curves and lines
-    curve_count = sum(1 for item in items if item.get("type") == "c")
-    line_count = sum(1 for item in items if item.get("type") == "l")
-    
-    return {
-        "type": "complex_path",
-        "rect": rect,
-        "curve_count": curve_count,
-        "line_count": line_count,
-        "total_segments": len(items),
-        "complexity": curve_count + line_count
-    }
+    return _scalar_or_array(np.minimum(probability, 1.0))
 
 def calculate_page_vector_stats(page_vectors):
     """Calculate statistics for vectors on a page"""
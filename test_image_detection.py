@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Test script for the image detectors of image-profile-service against the sample PDFs in shared/
+"""
+
+import os
+import sys
+import importlib.util
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# pdf -> number of placed raster images (testfile2.pdf only has shadings, which are no images)
+EXPECTED_IMAGES = {
+    "testfile2.pdf": 0,
+    "testfile3.pdf": 28,
+}
+
+def load_image_service():
+    """Import image-profile-service/app.py (its directory name is no valid module name)"""
+    spec = importlib.util.spec_from_file_location("image_profile_app", os.path.join(ROOT, "image-profile-service", "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_image_counts():
+    """High- and low-level detection find exactly the placed images"""
+    service = load_image_service()
+    ok = True
+    for filename, expected in EXPECTED_IMAGES.items():
+        pdf_path = os.path.join(ROOT, "shared", filename)
+        highlevel = service.detect_images_highlevel_with_dpi(pdf_path)
+        lowlevel = service.detect_images_lowlevel_with_dpi(pdf_path)
+        for method, found in (("highlevel", highlevel), ("lowlevel", lowlevel)):
+            if len(found) == expected:
+                print(f"✅ {filename} {method}: {len(found)} images")
+            else:
+                print(f"❌ {filename} {method}: {len(found)} images, expected {expected}")
+                ok = False
+    assert ok
+
+if __name__ == "__main__":
+    try:
+        test_image_counts()
+    except AssertionError:
+        sys.exit(1)